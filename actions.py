@@ -0,0 +1,44 @@
+# Реестр отслеживаемых действий. Чтобы добавить новый тип действия,
+# достаточно указать его семейство здесь и действие журнала аудита в audit.py;
+# для нового семейства также нужна колонка лимита (миграция в migrations.py).
+
+# Семейство действия: действия одного семейства считаются в общий лимит
+ACTION_FAMILIES = {
+    "role_create": "role",
+    "role_delete": "role",
+    "channel_create": "channel",
+    "channel_delete": "channel",
+    "webhook_create": "webhook",
+    "webhook_delete": "webhook",
+    "ban": "ban",
+    "kick": "kick",
+    "emoji_create": "emoji",
+    "emoji_delete": "emoji",
+    "role_update": "permission",
+    "overwrite_create": "permission",
+    "overwrite_update": "permission",
+    "overwrite_delete": "permission",
+}
+
+# Семейство -> (колонка лимита в action_limits, лимит по умолчанию, название для уведомления)
+FAMILIES = {
+    "role": ("role_limit", 5, "роли"),
+    "channel": ("channel_limit", 5, "каналы"),
+    "webhook": ("webhook_limit", 3, "вебхуки"),
+    "ban": ("ban_limit", 3, "баны"),
+    "kick": ("kick_limit", 3, "кики"),
+    "emoji": ("emoji_limit", 10, "эмодзи"),
+    "permission": ("permission_limit", 5, "права"),
+}
+
+# Лимиты по умолчанию для нового сервера
+DEFAULT_LIMITS = {limit_key: default for limit_key, default, _ in FAMILIES.values()}
+
+# Компактные коды семейств для массивов истории действий (counters.py, policy.py)
+FAMILY_CODES = {family: code for code, family in enumerate(FAMILIES)}
+ACTION_CODES = {action_type: FAMILY_CODES[family] for action_type, family in ACTION_FAMILIES.items()}
+
+# Постоянные коды типов действий для журнала событий (journal.py): код —
+# номер в ACTION_FAMILIES, поэтому новые типы добавляются только в конец
+ACTION_TYPES = tuple(ACTION_FAMILIES)
+ACTION_TYPE_CODES = {action_type: code for code, action_type in enumerate(ACTION_TYPES)}
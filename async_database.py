@@ -0,0 +1,252 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import Database, ActionLogQueue
+from config_cache import GuildConfig, GuildConfigCache
+from policy import validate_rule
+from metrics import Histogram
+
+DB_QUERY_SECONDS = Histogram(
+    "antiraid_db_query_seconds", "Время запроса к базе по методам Database", ["method"]
+)
+
+
+class AsyncDatabase:
+    """Асинхронный доступ к базе данных
+
+    Чтение выполняется параллельно в пуле потоков, у каждого потока свое
+    соединение только для чтения (WAL). Все записи идут через один поток
+    писателя с собственным соединением, поэтому они строго упорядочены
+    и никогда не блокируют цикл событий.
+    """
+
+    def __init__(self, db_path='database.db', readers=4, flush_size=100, flush_interval=1.0, cache_size=10000):
+        self.db_path = db_path
+        # Кэш настроек серверов (статус, лимиты, доверенные лица)
+        self.config_cache = GuildConfigCache(max_guilds=cache_size)
+        self.writer = None
+        self._reader_dbs = []
+        self._reader_local = threading.local()
+        self._reader_lock = threading.Lock()
+        self._read_pool = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        self._write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        # Соединение писателя создается первым: оно создает таблицы и включает WAL.
+        # Открытие и миграции идут в потоке писателя параллельно с запуском бота;
+        # записи встают в очередь за ними, читатели ждут их завершения
+        self._opened = self._write_pool.submit(self._open_writer)
+        # Отложенная запись действий тоже проходит через поток писателя
+        self.action_log = ActionLogQueue(self._write_actions, flush_size=flush_size, flush_interval=flush_interval)
+        self.action_log.start()
+
+    def _open_writer(self):
+        self.writer = Database(self.db_path, check_same_thread=False)
+
+    async def open(self):
+        """Ожидание открытия базы и применения миграций"""
+        await asyncio.wrap_future(self._opened)
+
+    def _reader(self):
+        db = getattr(self._reader_local, "db", None)
+        if db is None:
+            self._opened.result()
+            db = Database(self.db_path, check_same_thread=False, readonly=True)
+            self._reader_local.db = db
+            with self._reader_lock:
+                self._reader_dbs.append(db)
+        return db
+
+    def _read_in_thread(self, method, args):
+        return getattr(self._reader(), method)(*args)
+
+    async def _read(self, method, *args):
+        loop = asyncio.get_running_loop()
+        with DB_QUERY_SECONDS.labels(method).time():
+            return await loop.run_in_executor(self._read_pool, self._read_in_thread, method, args)
+
+    def _write_in_thread(self, method, args, kwargs):
+        # Метод писателя берется уже в его потоке: до этого база может еще открываться
+        return getattr(self.writer, method)(*args, **kwargs)
+
+    async def _write(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with DB_QUERY_SECONDS.labels(method).time():
+            return await loop.run_in_executor(self._write_pool, self._write_in_thread, method, args, kwargs)
+
+    def _write_actions(self, records):
+        with DB_QUERY_SECONDS.labels("log_actions").time():
+            return self._write_pool.submit(self._write_in_thread, "log_actions", (records,), {}).result()
+
+    def close(self):
+        """Запись очереди действий и закрытие всех соединений"""
+        self.action_log.close()
+        self._read_pool.shutdown(wait=True)
+        self._write_pool.shutdown(wait=True)
+        for db in self._reader_dbs:
+            db.close()
+        if self.writer is not None:
+            self.writer.close()
+
+    # Настройки сервера читаются из кэша, записи обновляют кэш (write-through)
+    async def get_guild_config(self, guild_id):
+        """Настройки сервера из кэша, при промахе — одним запросом к базе"""
+        config = self.config_cache.get(guild_id)
+        if config is None:
+            # Запрос через писателя: при отсутствии записей создаются значения по умолчанию
+            data = await self._write("get_guild_config", guild_id)
+            config = self.config_cache.put(guild_id, GuildConfig(**data))
+        return config
+
+    async def warm_config_cache(self, shard_count=None, shard_ids=None):
+        """Загрузка в кэш настроек защищенных серверов; возвращает их число
+
+        Запрос идет через писателя: записи настроек, поставленные в очередь
+        до него, уже видны, а поставленные после обновят кэш после загрузки.
+        """
+        configs = await self._write(
+            "get_protected_guild_configs", self.config_cache.max_guilds, shard_count, shard_ids
+        )
+        for guild_id, data in configs.items():
+            if self.config_cache.peek(guild_id) is None:
+                self.config_cache.put(guild_id, GuildConfig(**data))
+        return len(configs)
+
+    # Состояние защиты
+    async def get_protection_status(self, guild_id):
+        return (await self.get_guild_config(guild_id)).protection_enabled
+
+    async def set_protection_status(self, guild_id, status):
+        success = await self._write("set_protection_status", guild_id, status)
+        if success:
+            self.config_cache.set_protection_status(guild_id, status)
+        return success
+
+    # Лимиты действий
+    async def get_action_limits(self, guild_id):
+        return dict((await self.get_guild_config(guild_id)).limits)
+
+    async def set_action_limits(self, guild_id, role_limit, channel_limit, **extra_limits):
+        success = await self._write("set_action_limits", guild_id, role_limit, channel_limit, **extra_limits)
+        if success:
+            limits = {"role_limit": role_limit, "channel_limit": channel_limit, **extra_limits}
+            self.config_cache.set_action_limits(guild_id, limits)
+        return success
+
+    # Правила политики обнаружения
+    async def get_policy_rules(self, guild_id):
+        return dict((await self.get_guild_config(guild_id)).policy_rules)
+
+    async def set_policy_rule(self, guild_id, family, window, limit):
+        validate_rule(family, window, limit)
+        success = await self._write("set_policy_rule", guild_id, family, window, limit)
+        if success:
+            self.config_cache.set_policy_rule(guild_id, family, window, limit)
+        return success
+
+    async def remove_policy_rule(self, guild_id, family, window):
+        success = await self._write("remove_policy_rule", guild_id, family, window)
+        if success:
+            self.config_cache.remove_policy_rule(guild_id, family, window)
+        return success
+
+    # Доверенные лица
+    async def add_trusted_user(self, guild_id, user_id):
+        success = await self._write("add_trusted_user", guild_id, user_id)
+        if success:
+            self.config_cache.add_trusted_user(guild_id, user_id)
+        return success
+
+    async def remove_trusted_user(self, guild_id, user_id):
+        success = await self._write("remove_trusted_user", guild_id, user_id)
+        if success:
+            self.config_cache.remove_trusted_user(guild_id, user_id)
+        return success
+
+    async def add_trusted_users(self, guild_id, user_ids):
+        user_ids = list(user_ids)
+        added = await self._write("add_trusted_users", guild_id, user_ids)
+        if added:
+            self.config_cache.add_trusted_users(guild_id, user_ids)
+        return added
+
+    async def remove_trusted_users(self, guild_id, user_ids):
+        user_ids = list(user_ids)
+        removed = await self._write("remove_trusted_users", guild_id, user_ids)
+        if removed:
+            self.config_cache.remove_trusted_users(guild_id, user_ids)
+        return removed
+
+    async def is_trusted_user(self, guild_id, user_id):
+        return user_id in (await self.get_guild_config(guild_id)).trusted_users
+
+    async def get_trusted_count(self, guild_id):
+        return len((await self.get_guild_config(guild_id)).trusted_users)
+
+    async def get_trusted_users(self, guild_id):
+        return await self._read("get_trusted_users", guild_id)
+
+    async def get_trusted_users_page(self, guild_id, after=0, limit=25):
+        return await self._read("get_trusted_users_page", guild_id, after, limit)
+
+    # Действия пользователей
+    # Экспорт и импорт настроек: файл читается и пишется в потоке базы
+    async def export_config(self, guild_id, path, fmt="csv"):
+        return await self._read("export_config", guild_id, path, fmt)
+
+    async def import_config(self, guild_id, path, fmt="csv", replace=False):
+        try:
+            return await self._write("import_config", guild_id, path, fmt, replace=replace)
+        finally:
+            # Настройки перечитываются из базы при следующем обращении
+            self.config_cache.invalidate(guild_id)
+
+    async def log_action(self, guild_id, user_id, action_type):
+        """Постановка действия в очередь записи (не ждет записи на диск)"""
+        self.action_log.put(guild_id, user_id, action_type)
+        return True
+
+    async def log_actions(self, records):
+        """Постановка пачки действий (guild_id, user_id, action_type, timestamp) в очередь записи"""
+        for record in records:
+            self.action_log.put(*record)
+        return True
+
+    async def flush_actions(self):
+        """Ожидание записи всех действий из очереди на диск"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.action_log.flush)
+
+    async def count_family_actions(self, guild_id, user_id, action_types, hours=24):
+        return await self._read("count_family_actions", guild_id, user_id, tuple(action_types), hours)
+
+    async def count_user_actions(self, guild_id, user_id, action_type, hours=24):
+        return await self._read("count_user_actions", guild_id, user_id, action_type, hours)
+
+    async def get_user_actions(self, guild_id, user_id, since):
+        return await self._read("get_user_actions", guild_id, user_id, since)
+
+    async def get_recent_actions(self, hours=24):
+        return await self._read("get_recent_actions", hours)
+
+    # Хранение и сжатие журнала действий
+    async def purge_actions_chunk(self, before, chunk_size=500):
+        return await self._write("purge_actions_chunk", before, chunk_size)
+
+    async def incremental_vacuum(self, pages=1000):
+        return await self._write("incremental_vacuum", pages)
+
+    async def get_daily_stats(self, guild_id, days=30):
+        return await self._read("get_daily_stats", guild_id, days)
+
+    # Служебные значения бота
+    async def get_meta(self, key):
+        return await self._read("get_meta", key)
+
+    async def set_meta(self, key, value):
+        return await self._write("set_meta", key, value)
+
+    # Изображения серверов
+    async def set_server_image(self, guild_id, image_url):
+        return await self._write("set_server_image", guild_id, image_url)
+
+    async def get_server_image(self, guild_id):
+        return await self._read("get_server_image", guild_id)
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import discord
+import logging
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+AUDIT_FETCH_SECONDS = Histogram("antiraid_audit_log_fetch_seconds", "Время чтения журнала аудита")
+AUDIT_UNMATCHED_TOTAL = Counter("antiraid_audit_log_unmatched_total", "События без найденной записи журнала аудита")
+
+# Действия журнала аудита, которые отслеживает защита (типы — в actions.py)
+AUDITED_ACTIONS = {
+    discord.AuditLogAction.role_create: "role_create",
+    discord.AuditLogAction.role_delete: "role_delete",
+    discord.AuditLogAction.channel_create: "channel_create",
+    discord.AuditLogAction.channel_delete: "channel_delete",
+    discord.AuditLogAction.webhook_create: "webhook_create",
+    discord.AuditLogAction.webhook_delete: "webhook_delete",
+    discord.AuditLogAction.ban: "ban",
+    discord.AuditLogAction.kick: "kick",
+    discord.AuditLogAction.emoji_create: "emoji_create",
+    discord.AuditLogAction.emoji_delete: "emoji_delete",
+    discord.AuditLogAction.role_update: "role_update",
+    discord.AuditLogAction.overwrite_create: "overwrite_create",
+    discord.AuditLogAction.overwrite_update: "overwrite_update",
+    discord.AuditLogAction.overwrite_delete: "overwrite_delete",
+}
+
+
+def action_type_for(entry):
+    """Тип отслеживаемого действия для записи журнала аудита или None"""
+    action_type = AUDITED_ACTIONS.get(entry.action)
+    if action_type == "role_update" and getattr(entry.after, "permissions", None) is None:
+        # Изменение роли учитывается, только если менялись права
+        return None
+    return action_type
+
+
+class AuditLogFallback:
+    """Пакетное чтение журнала аудита, если поток записей недоступен
+
+    События одного типа на сервере собираются в течение delay секунд,
+    затем журнал читается одним запросом, и записи сопоставляются с
+    объектами по target.id — так каждое действие приписывается своему
+    автору даже при одновременных рейдах. Найденные записи передаются
+    в callback, как если бы они пришли через on_audit_log_entry_create.
+    """
+
+    def __init__(self, callback, delay=0.5, retries=1, max_entries=100):
+        self.callback = callback
+        self.delay = delay
+        self.retries = retries
+        self.max_entries = max_entries
+        self.pending = {}
+        self._tasks = set()
+        self.rest_calls = 0
+        self.unmatched_total = 0
+
+    def notify(self, guild, action, target_id, attempt=0):
+        """Регистрация события сервера, автор которого еще неизвестен"""
+        key = (guild.id, action, attempt)
+        targets = self.pending.get(key)
+        if targets is None:
+            targets = self.pending[key] = set()
+            task = asyncio.create_task(self._flush(guild, action, attempt))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        targets.add(target_id)
+
+    async def _flush(self, guild, action, attempt):
+        await asyncio.sleep(self.delay)
+        targets = self.pending.pop((guild.id, action, attempt))
+        limit = min(max(len(targets) * 2, 10), self.max_entries)
+
+        try:
+            self.rest_calls += 1
+            started = time.perf_counter()
+            entries = [entry async for entry in guild.audit_logs(limit=limit, action=action)]
+            AUDIT_FETCH_SECONDS.observe(time.perf_counter() - started)
+            for entry in entries:
+                target_id = getattr(entry.target, "id", None)
+                if target_id in targets:
+                    targets.discard(target_id)
+                    await self.callback(entry)
+                    if not targets:
+                        break
+        except discord.Forbidden:
+            logger.warning("Нет доступа к журналу аудита на %s", guild.name, extra={"guild_id": guild.id})
+            return
+        except Exception as e:
+            logger.error("Ошибка чтения журнала аудита: %s", e, extra={"guild_id": guild.id})
+
+        if targets:
+            # Запись могла еще не появиться в журнале — повторяем позже
+            if attempt < self.retries:
+                for target_id in targets:
+                    self.notify(guild, action, target_id, attempt + 1)
+            else:
+                self.unmatched_total += len(targets)
+                AUDIT_UNMATCHED_TOTAL.inc(len(targets))
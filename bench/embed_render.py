@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import discord
+
+from embeds import (
+    EMOJI, EMBED_COLOR, HELP, SETTINGS, RAID_ALERT, OFFENCE_FIELD, SERVER_FIELD, ACTIONS_FIELD, status_values
+)
+
+# Время и память на вывод embed: сборка на месте (discord.Embed, f-строки
+# и add_field) против шаблонов embeds.py (str.format и тот же публичный
+# API discord.Embed). speedup < 1 — цена шаблона. Для сравнения с тем,
+# что уходит в Discord, замеряется и to_dict().
+#
+#   python bench/embed_render.py --renders 100000 --output embeds.json
+
+ICON = "https://cdn.discordapp.com/icons/1/icon.png"
+LIMITS = {"role_limit": 5, "channel_limit": 5}
+OFFENCES = [(f"raider{index}", "роли", 6, 5) for index in range(5)]
+
+
+def legacy_help():
+    embed = discord.Embed(
+        title=f"{EMOJI['shield']} Anti Raid Bot",
+        description="Система защиты от рейдов и несанкционированных изменений",
+        color=EMBED_COLOR,
+        timestamp=datetime.now()
+    )
+    embed.add_field(
+        name=f"{EMOJI['info']} Доступные команды",
+        value=(
+            f"**{EMOJI['help']} /help** - Показать справку\n"
+            f"**{EMOJI['settings']} /settings** - Настроить защиту (владелец)\n"
+            f"**{EMOJI['shield']} /status** - Текущий статус защиты\n"
+            f"**{EMOJI['trusted']} /trusted** - Управление доверенными лицами\n"
+            f"**{EMOJI['limit']} /policy** - Правила обнаружения (владелец)"
+        ),
+        inline=False
+    )
+    embed.add_field(
+        name=f"{EMOJI['shield']} Возможности",
+        value=(
+            f"**{EMOJI['roles']} Контроль ролей**\n"
+            f"**{EMOJI['channels']} Контроль каналов**\n"
+            f"**{EMOJI['alert']} Автоматическая защита**\n"
+            f"**{EMOJI['warning']} Уведомления владельца**"
+        ),
+        inline=False
+    )
+    embed.add_field(
+        name=f"{EMOJI['warning']} Важно",
+        value=(
+            "Доверенные лица могут обходить защиту.\n"
+            "Добавляйте только проверенных пользователей!"
+        ),
+        inline=False
+    )
+    embed.set_footer(text="Anti Raid Bot • Справка")
+    embed.set_thumbnail(url=ICON)
+    return embed
+
+
+def legacy_settings():
+    protection_status, limits, trusted_count = True, LIMITS, 12
+    status_emoji = EMOJI['lock'] if protection_status else EMOJI['unlock']
+    status_text = "АКТИВНА" if protection_status else "ОТКЛЮЧЕНА"
+    embed = discord.Embed(
+        title=f"{EMOJI['settings']} Настройки защиты",
+        description="Выберите параметр для настройки:",
+        color=EMBED_COLOR,
+        timestamp=datetime.now()
+    )
+    embed.add_field(name=f"{EMOJI['shield']} Статус", value=f"**{status_emoji} Защита {status_text}**", inline=False)
+    embed.add_field(
+        name=f"{EMOJI['limit']} Лимиты",
+        value=(
+            f"**{EMOJI['roles']} Роли:** {limits['role_limit']} действий/24ч\n"
+            f"**{EMOJI['channels']} Каналы:** {limits['channel_limit']} действий/24ч"
+        ),
+        inline=False
+    )
+    embed.add_field(name=f"{EMOJI['trusted']} Доверенные", value=f"Всего: **{trusted_count}** пользователей", inline=False)
+    embed.set_footer(text="Anti Raid Bot • Настройки")
+    embed.set_thumbnail(url=ICON)
+    return embed
+
+
+def legacy_alert():
+    embed = discord.Embed(
+        title=f"{EMOJI['alert']} Обнаружен рейд!",
+        description=f"**{len(OFFENCES)}** пользователей превысили лимит действий!",
+        color=0xFF4500,
+        timestamp=datetime.now()
+    )
+    for name, action_type, count, limit in OFFENCES:
+        embed.add_field(
+            name=f"{EMOJI['user']} {name}",
+            value=(
+                f"**{EMOJI['roles'] if action_type.startswith('роли') else EMOJI['channels']} Тип:** {action_type}\n"
+                f"**{EMOJI['limit']} Действий:** {count}\n"
+                f"**{EMOJI['limit']} Лимит:** {limit}"
+            ),
+            inline=True
+        )
+    embed.add_field(name=f"{EMOJI['server']} Сервер", value="guild", inline=False)
+    embed.add_field(name=f"{EMOJI['shield']} Действия", value="Все роли нарушителей сняты.", inline=False)
+    embed.set_footer(text="Anti Raid Bot • Уведомление")
+    embed.set_thumbnail(url=ICON)
+    return embed
+
+
+def template_help():
+    return HELP.render(ICON)
+
+
+def template_settings():
+    return SETTINGS.render(ICON, **status_values(True), **LIMITS, trusted_count=12)
+
+
+def template_alert():
+    fields = [
+        OFFENCE_FIELD.render({
+            "name": name, "type_emoji": EMOJI['roles'] if action_type.startswith('роли') else EMOJI['channels'],
+            "action_type": action_type, "count": count, "limit": limit,
+        })
+        for name, action_type, count, limit in OFFENCES
+    ]
+    fields.append(SERVER_FIELD.render({"guild_name": "guild"}))
+    fields.append(ACTIONS_FIELD.render({"actions": "Все роли нарушителей сняты."}))
+    return RAID_ALERT.render(ICON, fields, summary=f"**{len(OFFENCES)}** пользователей превысили лимит действий!")
+
+
+CASES = {
+    "help": (legacy_help, template_help),
+    "settings": (legacy_settings, template_settings),
+    "notify_owner": (legacy_alert, template_alert),
+}
+
+
+def measure(render, renders, payload):
+    """Микросекунды на вывод и выделенные байты/блоки на вывод"""
+    call = (lambda: render().to_dict()) if payload else render
+    call()
+    started = time.perf_counter()
+    for _ in range(renders):
+        call()
+    seconds = time.perf_counter() - started
+
+    # Память: результаты сохраняются, чтобы учесть все выделения
+    sample = min(renders, 10000)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [call() for _ in range(sample)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    allocated = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    del kept
+    return {
+        "us_per_render": seconds * 1e6 / renders,
+        "bytes_per_render": allocated / sample,
+        "blocks_per_render": blocks / sample,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость и память вывода embed: шаблоны против сборки с нуля")
+    parser.add_argument("--renders", type=int, default=100_000, help="выводов каждого embed")
+    parser.add_argument("--payload", action="store_true", help="замерять вместе с to_dict() (как при отправке)")
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    result = {"config": vars(args), "discord_version": getattr(discord, "__version__", None), "cases": {}}
+    for name, (legacy, template) in CASES.items():
+        before = measure(legacy, args.renders, args.payload)
+        after = measure(template, args.renders, args.payload)
+        result["cases"][name] = {
+            "legacy": before,
+            "template": after,
+            "speedup": before["us_per_render"] / after["us_per_render"],
+        }
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
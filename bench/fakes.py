@@ -0,0 +1,250 @@
+import asyncio
+import itertools
+
+# Заглушки объектов Discord для бенчмарков: сервер, участники, роли,
+# каналы, записи журнала аудита и REST-вызовы с настраиваемой задержкой.
+
+_ids = itertools.count(10 ** 17)
+
+
+def next_id():
+    return next(_ids)
+
+
+class FakeRest:
+    """Счетчик REST-вызовов с искусственной задержкой"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = {}
+
+    async def call(self, route):
+        self.calls[route] = self.calls.get(route, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+class FakePermissions:
+    def __init__(self, value=0):
+        self.value = value
+
+
+# Право administrator (как в discord.Permissions)
+ADMINISTRATOR = 1 << 3
+
+
+class FakeColour:
+    def __init__(self, value=0):
+        self.value = value
+
+
+class FakeOverwrite:
+    def __init__(self, allow=0, deny=0):
+        self.allow = allow
+        self.deny = deny
+
+    def pair(self):
+        return FakePermissions(self.allow), FakePermissions(self.deny)
+
+
+class FakeRole:
+    def __init__(self, guild, name, default=False, managed=False, position=0, permissions=0, colour=0):
+        self.id = guild.id if default else next_id()
+        self.guild = guild
+        self.name = name
+        self.managed = managed
+        self.position = position
+        self.permissions = FakePermissions(permissions)
+        self.colour = FakeColour(colour)
+        self.hoist = False
+        self.mentionable = False
+        self._default = default
+        # Время изменения прав (loop.time()) — для подсчета времени блокировки
+        self.locked_at = None
+
+    def is_default(self):
+        return self._default
+
+    def __lt__(self, other):
+        return self.position < other.position
+
+    def __ge__(self, other):
+        return self.position >= other.position
+
+    async def edit(self, permissions=None, reason=None):
+        await self.guild.rest.call("role_edit")
+        if permissions is not None:
+            self.permissions = permissions
+        if self.locked_at is None:
+            self.locked_at = asyncio.get_running_loop().time()
+
+
+class FakeChannel:
+    def __init__(self, guild, name, position=0, type=0, category=None, overwrites=None, topic=None):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.position = position
+        # Значение discord.ChannelType: 0 — текстовый, 2 — голосовой, 4 — категория
+        self.type = type
+        self.category_id = category.id if category is not None else None
+        self.overwrites = overwrites or {}
+        self.topic = topic
+        self.slowmode_delay = 0
+        self.nsfw = False
+        self.bitrate = 64000 if type == 2 else 0
+        self.user_limit = 0
+
+
+class FakeUser:
+    def __init__(self, user_id=None, name=None, rest=None):
+        self.id = user_id or next_id()
+        self.name = name or f"user{self.id % 100000}"
+        self.mention = f"<@{self.id}>"
+        self.rest = rest
+        self.dms = 0
+
+    async def send(self, embed=None, **kwargs):
+        self.dms += 1
+        await self.rest.call("dm")
+
+
+class FakeMember(FakeUser):
+    def __init__(self, guild, roles=(), **kwargs):
+        super().__init__(rest=guild.rest, **kwargs)
+        self.guild = guild
+        self.roles = [guild.default_role, *roles]
+        # Время снятия ролей (loop.time()) — для подсчета time-to-mitigation
+        self.stripped_at = None
+
+    async def edit(self, roles=None, reason=None):
+        await self.rest.call("member_edit")
+        if roles is not None:
+            self.roles = list(roles)
+        if self.stripped_at is None:
+            self.stripped_at = asyncio.get_running_loop().time()
+
+
+class FakeAuditEntry:
+    def __init__(self, guild, action, user, target):
+        self.id = next_id()
+        self.guild = guild
+        self.action = action
+        self.user = user
+        self.user_id = user.id
+        self.target = target
+        self.after = None
+
+
+class FakeGuild:
+    def __init__(self, rest, name=None, owner=None):
+        self.id = next_id()
+        self.name = name or f"guild{self.id % 100000}"
+        self.rest = rest
+        self.icon = None
+        self.default_role = FakeRole(self, "@everyone", default=True)
+        self.members = {}
+        self.roles = [self.default_role]
+        self.channels = []
+        self.audit_log = []
+        self.owner = owner or FakeUser(rest=rest)
+        self.owner_id = self.owner.id
+        # Бот: его высшая роль выше всех ролей сервера
+        self.me = FakeMember(self, roles=[FakeRole(self, "Anti Raid Bot", managed=True, position=10 ** 6)])
+        self.me.top_role = self.me.roles[-1]
+        # Общая роль администраторов (создается при первом администраторе)
+        self.admin_role = None
+        self.bitrate_limit = 96000.0
+
+    def add_member(self, role_count=3, admin=False):
+        roles = []
+        for index in range(role_count):
+            role = FakeRole(self, f"role{index}", position=len(self.roles))
+            self.roles.append(role)
+            roles.append(role)
+        if admin:
+            if self.admin_role is None:
+                self.admin_role = FakeRole(self, "Admin", position=len(self.roles), permissions=ADMINISTRATOR)
+                self.roles.append(self.admin_role)
+            roles.append(self.admin_role)
+        member = FakeMember(self, roles=roles)
+        self.members[member.id] = member
+        return member
+
+    def get_member(self, user_id):
+        # Владелец — тоже участник сервера
+        if user_id == self.owner_id:
+            return self.owner
+        return self.members.get(user_id)
+
+    def get_role(self, role_id):
+        for role in self.roles:
+            if role.id == role_id:
+                return role
+        return None
+
+    def get_channel(self, channel_id):
+        for channel in self.channels:
+            if channel.id == channel_id:
+                return channel
+        return None
+
+    async def create_role(self, name, permissions=None, colour=None, hoist=False, mentionable=False, reason=None):
+        await self.rest.call("role_create")
+        role = FakeRole(self, name, position=1, permissions=permissions.value if permissions else 0)
+        role.colour = colour or FakeColour()
+        role.hoist, role.mentionable = hoist, mentionable
+        self.roles.append(role)
+        return role
+
+    async def edit_role_positions(self, positions, reason=None):
+        await self.rest.call("role_positions")
+        for role, position in positions.items():
+            role.position = position
+
+    async def _create_channel(self, name, type, category=None, position=0, overwrites=None, **options):
+        await self.rest.call("channel_create")
+        channel = FakeChannel(
+            self, name, position=position, type=type, category=category, topic=options.get("topic"),
+            overwrites={target: FakeOverwrite(*(value.value for value in overwrite.pair())) for target, overwrite in (overwrites or {}).items()},
+        )
+        self.channels.append(channel)
+        return channel
+
+    async def create_category(self, name, **options):
+        return await self._create_channel(name, 4, **options)
+
+    async def create_text_channel(self, name, **options):
+        return await self._create_channel(name, 0, **options)
+
+    async def create_voice_channel(self, name, **options):
+        return await self._create_channel(name, 2, **options)
+
+    async def fetch_member(self, user_id):
+        await self.rest.call("member_fetch")
+        return self.members[user_id]
+
+    async def audit_logs(self, limit=100, action=None):
+        """Асинхронный итератор журнала аудита (новые записи первыми)"""
+        await self.rest.call("audit_logs")
+        returned = 0
+        for entry in reversed(self.audit_log):
+            if action is not None and entry.action != action:
+                continue
+            yield entry
+            returned += 1
+            if returned >= limit:
+                break
+
+
+def percentile(values, q):
+    """Перцентиль q (0..100) по отсортированной копии values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
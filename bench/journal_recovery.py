@@ -0,0 +1,114 @@
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from actions import ACTION_FAMILIES
+from counters import TimelineStore
+from database import Database
+from journal import EventJournal
+from policy import HORIZON
+
+# Восстановление счетчиков за 24 часа при запуске: выборка user_actions из
+# SQLite и TimelineStore.load_actions (как раньше) против чтения сегментов
+# журнала событий и TimelineStore.load_records. Действия — за 72 часа
+# (срок хранения обоих журналов), равномерно по времени. Отдельно
+# измеряется только чтение: запрос к SQLite против прохода по сегментам.
+#
+#   python bench/journal_recovery.py --events 300000 --output journal.json
+
+
+def generate(events, guilds, users, seed):
+    rng = random.Random(seed)
+    now = time.time()
+    action_types = tuple(ACTION_FAMILIES)
+    start = now - 72 * 3600
+    step = 72 * 3600 / events
+    return [
+        (rng.randrange(1, guilds + 1) << 22, rng.randrange(1, users + 1) << 22, rng.choice(action_types), start + index * step)
+        for index in range(events)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Восстановление счетчиков: SQLite против журнала событий")
+    parser.add_argument("--events", type=int, default=300_000, help="действий за 72 часа")
+    parser.add_argument("--guilds", type=int, default=1000, help="число серверов")
+    parser.add_argument("--users", type=int, default=20, help="активных пользователей на сервере")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов восстановления (берется лучший)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="journal-bench-")
+    try:
+        actions = generate(args.events, args.guilds, args.users, args.seed)
+        db = Database(os.path.join(workdir, "bench.db"))
+        for offset in range(0, len(actions), 100_000):
+            db.log_actions([
+                (guild_id, user_id, action_type, int(ts)) for guild_id, user_id, action_type, ts in actions[offset:offset + 100_000]
+            ])
+
+        journal = EventJournal(os.path.join(workdir, "journal"))
+        started = time.perf_counter()
+        for guild_id, user_id, action_type, ts in actions:
+            journal.append_many(guild_id, ((user_id, action_type, ts),))
+        append_us = (time.perf_counter() - started) * 1e6 / len(actions)
+        journal.close()
+        journal_bytes = sum(os.path.getsize(path) for path in journal.segments())
+        del actions
+        gc.collect()
+
+        def read_sqlite():
+            return len(db.get_recent_actions(HORIZON / 3600)), None
+
+        def read_journal():
+            return sum(1 for _ in journal.scan(time.time() - HORIZON)), None
+
+        def recover_sqlite():
+            store = TimelineStore()
+            return store.load_actions(db.get_recent_actions(HORIZON / 3600)), store
+
+        def recover_journal():
+            store = TimelineStore()
+            return store.load_records(journal.scan(time.time() - HORIZON)), store
+
+        result = {"config": vars(args), "append_us_per_event": append_us, "journal_bytes": journal_bytes, "modes": {}}
+        modes = (
+            ("sqlite_read", read_sqlite), ("journal_read", read_journal),
+            ("sqlite", recover_sqlite), ("journal", recover_journal),
+        )
+        for name, recover in modes:
+            best = None
+            for _ in range(args.repeat):
+                gc.collect()
+                started = time.perf_counter()
+                loaded, store = recover()
+                seconds = time.perf_counter() - started
+                best = seconds if best is None else min(best, seconds)
+            result["modes"][name] = {"seconds": best, "events_loaded": loaded}
+            if store is not None:
+                result["modes"][name]["timelines"] = len(store)
+        result["read_speedup"] = result["modes"]["sqlite_read"]["seconds"] / result["modes"]["journal_read"]["seconds"]
+        result["speedup"] = result["modes"]["sqlite"]["seconds"] / result["modes"]["journal"]["seconds"]
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import discord
+from discord.state import ConnectionState
+
+from members import MemberLRU
+
+# Память кэша discord.py в режимах BOT_MEMBER_CACHE=full и lean: настоящие
+# объекты Guild/Member строятся из данных в формате шлюза (GUILD_CREATE
+# с полным списком участников, как после chunk). В режиме lean участники
+# не кэшируются, а в LRU лежат только недавно полученные.
+#
+#   python bench/member_mem.py --guilds 20 --members 5000 --output members.json
+
+
+def member_payload(user_id, role_ids):
+    return {
+        "user": {
+            "id": str(user_id),
+            "username": f"user{user_id % 1000000}",
+            "global_name": f"User {user_id % 1000000}",
+            "discriminator": "0",
+            "avatar": "a" * 32,
+        },
+        "roles": [str(role_id) for role_id in role_ids],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def guild_payload(guild_id, members, roles, channels):
+    role_ids = [guild_id + 1 + index for index in range(roles)]
+    return {
+        "id": str(guild_id),
+        "name": f"guild{guild_id}",
+        "owner_id": str(guild_id + 10 ** 9),
+        "member_count": members,
+        "roles": [
+            {"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False}
+        ] + [
+            {"id": str(role_id), "name": f"role{index}", "permissions": "8", "position": index + 1, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False}
+            for index, role_id in enumerate(role_ids)
+        ],
+        "channels": [
+            {"id": str(guild_id + 10 ** 6 + index), "name": f"channel{index}", "type": 0, "position": index,
+             "permission_overwrites": []}
+            for index in range(channels)
+        ],
+        "members": [
+            member_payload(guild_id + 10 ** 7 + index, role_ids[index % roles:index % roles + 2])
+            for index in range(members)
+        ],
+    }
+
+
+def new_state(flags):
+    intents = discord.Intents.default()
+    intents.members = True
+    return ConnectionState(
+        dispatch=lambda *args: None, handlers={}, hooks={}, http=None,
+        intents=intents, member_cache_flags=flags, chunk_guilds_at_startup=False,
+    )
+
+
+def traced(build):
+    """Байты, оставшиеся занятыми после build() (результат удерживается)"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return current, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память кэша участников: full против lean")
+    parser.add_argument("--guilds", type=int, default=20, help="число серверов")
+    parser.add_argument("--members", type=int, default=5000, help="участников на сервере")
+    parser.add_argument("--roles", type=int, default=30, help="ролей на сервере")
+    parser.add_argument("--channels", type=int, default=50, help="каналов на сервере")
+    parser.add_argument("--lru", type=int, default=10000, help="размер LRU участников в режиме lean")
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    guild_ids = [(index + 1) << 32 for index in range(args.guilds)]
+    result = {"config": vars(args), "discord_version": discord.__version__, "modes": {}}
+    for mode, flags in (("full", discord.MemberCacheFlags.all()), ("lean", discord.MemberCacheFlags.none())):
+        state = new_state(flags)
+        payloads = [guild_payload(guild_id, args.members, args.roles, args.channels) for guild_id in guild_ids]
+        allocated, guilds = traced(lambda: [discord.Guild(data=payload, state=state) for payload in payloads])
+        result["modes"][mode] = {
+            "bytes_total": allocated,
+            "bytes_per_guild": allocated / args.guilds,
+            "cached_members": sum(len(guild.members) for guild in guilds),
+        }
+        if mode == "lean":
+            # Недавно полученные участники: нарушители и доверенные лица
+            guild = guilds[0]
+            member_payloads = [member_payload(10 ** 15 + index, ()) for index in range(args.lru)]
+            lru_bytes, lru = traced(lambda: _fill_lru(guild, state, member_payloads, args.lru))
+            result["modes"][mode]["lru_bytes"] = lru_bytes
+            result["modes"][mode]["lru_bytes_per_member"] = lru_bytes / max(1, len(lru))
+        del guilds, payloads, state
+        gc.collect()
+
+    full, lean = result["modes"]["full"], result["modes"]["lean"]
+    members = args.guilds * args.members
+    result["bytes_per_member"] = (full["bytes_total"] - lean["bytes_total"]) / members
+    result["saved_ratio"] = 1 - (lean["bytes_total"] + lean["lru_bytes"]) / full["bytes_total"]
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+
+
+def _fill_lru(guild, state, payloads, capacity):
+    lru = MemberLRU(capacity=capacity)
+    for data in payloads:
+        lru.put(discord.Member(data=data, guild=guild, state=state))
+    return lru
+
+
+if __name__ == "__main__":
+    main()
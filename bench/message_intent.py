@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import discord
+
+# Цена событий MESSAGE_CREATE на загруженных серверах для бота, которому
+# сообщения не нужны. Прежде (интенты messages и message_content) каждое
+# сообщение приходило с текстом, разбиралось discord.py и, пока был открыт
+# запрос «упомяните пользователя», проходило через check() в wait_for.
+# Без message_content Discord присылает событие без текста и вложений;
+# без интента messages событие не приходит вовсе — 0 байт и 0 мкс.
+#
+# Байты — сжатые, как в потоке zlib-stream шлюза; время — распаковка,
+# json.loads и разбор события discord.py (ConnectionState.parse_message_create).
+#
+#   python bench/message_intent.py --messages 50000 --output intents.json
+
+GUILD_ID = 1 << 40
+CHANNEL_ID = GUILD_ID + 1
+
+
+def message_payload(index, content_length, with_content):
+    author_id = GUILD_ID + 1000 + index % 500
+    text = "".join(random.choices(string.ascii_letters + "      ", k=content_length))
+    data = {
+        "id": str(GUILD_ID + 10 ** 6 + index),
+        "channel_id": str(CHANNEL_ID),
+        "guild_id": str(GUILD_ID),
+        "author": {
+            "id": str(author_id), "username": f"user{author_id % 100000}", "global_name": f"User {author_id % 100000}",
+            "discriminator": "0", "avatar": "a" * 32,
+        },
+        "member": {"roles": [str(GUILD_ID + 2)], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0},
+        "content": text if with_content else "",
+        "timestamp": "2024-06-01T12:00:00.000000+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+        "flags": 0,
+        "components": [],
+    }
+    if with_content and index % 10 == 0:
+        # Каждое десятое сообщение — со ссылкой и ее превью
+        data["embeds"] = [{
+            "type": "link", "url": "https://example.com/" + text[:16],
+            "title": text[:40], "description": text[:120],
+        }]
+    return {"op": 0, "t": "MESSAGE_CREATE", "s": index, "d": data}
+
+
+def gateway_frames(payloads):
+    """Сжатые кадры zlib-stream: общий контекст сжатия на все соединение"""
+    compressor = zlib.compressobj()
+    return [
+        compressor.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        for payload in payloads
+    ]
+
+
+def guild_data():
+    return {
+        "id": str(GUILD_ID), "name": "busy", "owner_id": str(GUILD_ID + 999), "member_count": 1000,
+        "roles": [
+            {"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False},
+            {"id": str(GUILD_ID + 2), "name": "member", "permissions": "0", "position": 1, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False},
+        ],
+        "channels": [{"id": str(CHANNEL_ID), "name": "general", "type": 0, "position": 0, "permission_overwrites": []}],
+    }
+
+
+async def run_mode(frames, waiting):
+    """Микросекунды на сообщение: распаковка, JSON и разбор discord.py"""
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.message_content = True
+    client = discord.Client(intents=intents)
+    # Без подключения к шлюзу: только привязка клиента к циклу событий
+    await client._async_setup_hook()
+    state = client._connection
+    state._add_guild(discord.Guild(data=guild_data(), state=state))
+    checks = 0
+    prompt = None
+    if waiting:
+        # Открытый запрос владельца: check() вызывается на каждое сообщение
+        def check(message):
+            nonlocal checks
+            checks += 1
+            return message.author.id == 1 and message.channel.id == CHANNEL_ID and len(message.mentions) > 0
+        prompt = asyncio.ensure_future(client.wait_for("message", check=check, timeout=3600))
+        await asyncio.sleep(0)
+
+    decompressor = zlib.decompressobj()
+    started = time.perf_counter()
+    for frame in frames:
+        payload = json.loads(decompressor.decompress(frame))
+        state.parse_message_create(payload["d"])
+    seconds = time.perf_counter() - started
+    if prompt is not None:
+        prompt.cancel()
+    return seconds * 1e6 / len(frames), checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Трафик шлюза и CPU на сообщение: с интентами сообщений и без")
+    parser.add_argument("--messages", type=int, default=50_000, help="сообщений в потоке")
+    parser.add_argument("--content-length", type=int, default=120, help="средняя длина текста сообщения")
+    parser.add_argument("--rate", type=float, default=500.0, help="сообщений в секунду на загруженных серверах шарда")
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+    random.seed(1)
+
+    modes = {
+        "message_content_wait_for": (True, True),
+        "message_content": (True, False),
+        "messages_without_content": (False, False),
+    }
+    result = {"config": vars(args), "discord_version": discord.__version__, "modes": {}}
+    for name, (with_content, waiting) in modes.items():
+        payloads = [message_payload(index, args.content_length, with_content) for index in range(args.messages)]
+        raw = sum(len(json.dumps(payload, separators=(",", ":"))) for payload in payloads) / args.messages
+        frames = gateway_frames(payloads)
+        compressed = sum(len(frame) for frame in frames) / args.messages
+        us, checks = asyncio.run(run_mode(frames, waiting))
+        result["modes"][name] = {
+            "raw_bytes_per_message": raw,
+            "gateway_bytes_per_message": compressed,
+            "us_per_message": us,
+            "check_calls": checks,
+            "gateway_kib_per_second": compressed * args.rate / 1024,
+            "cpu_percent": us * args.rate / 1e4,
+        }
+    # Текущий режим: интент messages выключен, события не приходят
+    result["modes"]["no_message_intents"] = {
+        "raw_bytes_per_message": 0, "gateway_bytes_per_message": 0, "us_per_message": 0.0,
+        "check_calls": 0, "gateway_kib_per_second": 0.0, "cpu_percent": 0.0,
+    }
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fakes import FakeRest, FakeGuild, FakeChannel, FakeRole, FakeAuditEntry, percentile
+from database import Database
+from log import setup_logging
+
+# Симуляция рейда на настоящих обработчиках bot.py и настоящей базе:
+# N рейдеров на K серверах создают M событий в секунду, таблица
+# user_actions заранее заполнена X строками. Результат — задержка от
+# превышения лимита до снятия ролей, пропускная способность, время базы
+# на событие и число REST-вызовов на рейдера.
+#
+#   python bench/raid_sim.py --raiders 50 --rate 500 --guilds 5 --prefill 1000000 --output bench.json
+
+
+def prefill(path, rows, chunk=100000):
+    """Заполнение user_actions случайной историей за последние 72 часа"""
+    db = Database(path)
+    now = int(time.time())
+    action_types = ("role_create", "role_delete", "channel_create", "channel_delete")
+    written = 0
+    while written < rows:
+        size = min(chunk, rows - written)
+        db.log_actions([
+            (random.randrange(1, 5000), random.randrange(1, 10 ** 6), random.choice(action_types),
+             now - random.randrange(0, 72 * 3600))
+            for _ in range(size)
+        ])
+        written += size
+    db.close()
+
+
+class DbTimer:
+    """Суммарное время обращений к базе (цикл событий и поток записи)"""
+
+    def __init__(self, db):
+        self.seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+        db._read = self._wrap_async(db._read)
+        db._write = self._wrap_async(db._write)
+        db.action_log.write_batch = self._wrap_sync(db.action_log.write_batch)
+
+    def _add(self, elapsed):
+        with self._lock:
+            self.seconds += elapsed
+            self.calls += 1
+
+    def _wrap_async(self, method):
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self._add(time.perf_counter() - started)
+        return wrapper
+
+    def _wrap_sync(self, method):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._add(time.perf_counter() - started)
+        return wrapper
+
+
+async def simulate(bot_module, args):
+    import discord
+    from actions import DEFAULT_LIMITS, ACTION_CODES
+    from counters import ActionTimeline
+    from policy import compile_policy
+
+    loop = asyncio.get_running_loop()
+    db = bot_module.db
+    pipeline = bot_module.pipeline
+    mitigation = bot_module.mitigation
+    timer = DbTimer(db)
+    rest = FakeRest(args.rest_latency)
+
+    # Миграции и открытие базы — до замеров: измеряется работа, а не запуск
+    await db.open()
+    guilds = [FakeGuild(rest) for _ in range(args.guilds)]
+    for guild in guilds:
+        await db.set_protection_status(guild.id, True)
+    # Первые --admins рейдеров — скомпрометированные администраторы с общей ролью Admin
+    raiders = [
+        (guilds[index % len(guilds)], guilds[index % len(guilds)].add_member(admin=index < args.admins))
+        for index in range(args.raiders)
+    ]
+    mitigation.strip_concurrency = args.strip_concurrency
+    mitigation.start()
+
+    # Рейдер с четным номером удаляет каналы, с нечетным — создает роли
+    kinds = [
+        (discord.AuditLogAction.channel_delete, "on_guild_channel_delete", FakeChannel, "channel_delete"),
+        (discord.AuditLogAction.role_create, "on_guild_role_create", FakeRole, "role_create"),
+    ]
+    # Момент превышения считается по той же политике, что и у бота
+    policy = compile_policy(DEFAULT_LIMITS)
+    timelines = {member.id: ActionTimeline() for _, member in raiders}
+    crossed_at = {}
+    interval = 1.0 / args.rate
+    started = loop.time()
+    next_at = started
+    events = 0
+
+    for step in range(args.events_per_raider):
+        for index, (guild, member) in enumerate(raiders):
+            action, handler, target_type, action_type = kinds[index % 2]
+            target = target_type(guild, f"raid{step}")
+            entry = FakeAuditEntry(guild, action, member, target)
+            guild.audit_log.append(entry)
+            if member.id not in crossed_at:
+                timeline = timelines[member.id]
+                now = time.time()
+                timeline.add(now, ACTION_CODES[action_type])
+                if policy.evaluate(timeline.timestamps, timeline.codes, now):
+                    # Это событие первым нарушает правило политики
+                    crossed_at[member.id] = loop.time()
+            if args.fallback:
+                await getattr(bot_module, handler)(target)
+            else:
+                await bot_module.on_audit_log_entry_create(entry)
+            events += 1
+            next_at += interval
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    # Ждем, пока конвейер обработает все события и меры будут выполнены
+    while pipeline.pending or pipeline._workers or (args.fallback and bot_module.audit_fallback.pending):
+        await asyncio.sleep(0.001)
+    processed_at = loop.time()
+    await asyncio.sleep(mitigation.summary_delay + 0.1)
+    await mitigation.join()
+
+    # Время от первого превышения на сервере до отключения прав роли Admin
+    first_crossed = {}
+    for guild, member in raiders:
+        if member.id in crossed_at:
+            first_crossed[guild.id] = min(first_crossed.get(guild.id, crossed_at[member.id]), crossed_at[member.id])
+    lockdowns = [
+        guild.admin_role.locked_at - first_crossed[guild.id]
+        for guild in guilds
+        if guild.admin_role is not None and guild.admin_role.locked_at is not None and guild.id in first_crossed
+    ]
+    stripped_at = [member.stripped_at for _, member in raiders if member.stripped_at is not None]
+
+    latencies = [
+        member.stripped_at - crossed_at[member.id]
+        for _, member in raiders
+        if member.stripped_at is not None and member.id in crossed_at
+    ]
+    elapsed = processed_at - started
+    return {
+        "config": vars(args),
+        "events": events,
+        "elapsed_seconds": elapsed,
+        "events_per_second": events / elapsed if elapsed else None,
+        "raiders_mitigated": len(latencies),
+        "time_to_mitigation_ms": {
+            "p50": _ms(percentile(latencies, 50)),
+            "p95": _ms(percentile(latencies, 95)),
+            "p99": _ms(percentile(latencies, 99)),
+            "max": _ms(max(latencies) if latencies else None),
+        },
+        "time_to_lockdown_ms": {
+            "p50": _ms(percentile(lockdowns, 50)),
+            "max": _ms(max(lockdowns) if lockdowns else None),
+        },
+        # Время от первого превышения до снятия ролей с последнего рейдера
+        "raid_mitigated_ms": _ms(max(stripped_at) - min(crossed_at.values()) if stripped_at and crossed_at else None),
+        "db_ms_per_event": timer.seconds * 1000 / events if events else None,
+        "db_calls": timer.calls,
+        "rest_calls": dict(rest.calls),
+        "rest_calls_per_raider": rest.total / args.raiders if args.raiders else None,
+        "mitigation": dict(mitigation.stats),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция рейда для замера скорости реакции бота")
+    parser.add_argument("--raiders", type=int, default=20, help="число рейдеров (N)")
+    parser.add_argument("--rate", type=float, default=200.0, help="событий в секунду (M)")
+    parser.add_argument("--guilds", type=int, default=5, help="число серверов (K)")
+    parser.add_argument("--prefill", type=int, default=0, help="строк в user_actions до начала (X)")
+    parser.add_argument("--events-per-raider", type=int, default=20)
+    parser.add_argument("--rest-latency", type=float, default=0.05, help="задержка REST-вызова, с")
+    parser.add_argument("--fallback", action="store_true", help="события сервера + чтение журнала аудита")
+    parser.add_argument("--backend", default="memory", help="хранилище счетчиков (memory/sqlite/redis)")
+    parser.add_argument("--admins", type=int, default=0, help="рейдеров с общей ролью администратора")
+    parser.add_argument("--strip-concurrency", type=int, default=8, help="параллельных REST-вызовов мер защиты")
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="raid-sim-")
+    db_path = os.path.join(workdir, "bench.db")
+    if args.prefill:
+        started = time.perf_counter()
+        prefill(db_path, args.prefill)
+        print(f"Заполнено {args.prefill} строк за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+    # Журнал бота — в stderr, чтобы не смешивать с результатами
+    listener = setup_logging(level=os.environ.get("BOT_LOG_LEVEL", "WARNING"))
+    os.environ["BOT_DB_PATH"] = db_path
+    # --backend redis без BOT_REDIS_URL — Redis в памяти процесса (LocalRedis)
+    local_redis = args.backend == "redis" and not os.environ.get("BOT_REDIS_URL")
+    os.environ["BOT_STATE_BACKEND"] = "memory" if local_redis else args.backend
+    import bot as bot_module
+    bot_module.USE_AUDIT_LOG_STREAM = not args.fallback
+    if local_redis:
+        from state_backend import LocalRedis, RedisStateBackend
+        bot_module.state = bot_module.pipeline.state = RedisStateBackend(LocalRedis())
+
+    try:
+        result = asyncio.run(simulate(bot_module, args))
+    finally:
+        bot_module.db.close()
+        listener.stop()
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from reputation import ReputationIndex
+
+# Память и скорость индекса нарушителей: N пользователей, каждый нарушил
+# правила на 1–max_guilds серверах. Для сравнения измеряется наивный
+# словарь {user_id: set(guild_id)} на выборке и пересчитывается на N.
+#
+#   python bench/reputation_mem.py --users 10000000 --output reputation.json
+
+
+def snowflake(rng):
+    return rng.randrange(10 ** 17, 10 ** 19)
+
+
+def measure_dict(users, max_guilds, seed):
+    """Память словаря множеств на users пользователей, байт"""
+    rng = random.Random(seed)
+    tracemalloc.start()
+    offenders = {}
+    for _ in range(users):
+        offenders[snowflake(rng)] = {rng.randrange(1, 10 ** 6) for _ in range(rng.randint(1, max_guilds))}
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    tracemalloc.start()
+    index = ReputationIndex(capacity=args.capacity or args.users)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    sample = {}
+    started = time.perf_counter()
+    for number in range(args.users):
+        user_id = snowflake(rng)
+        guilds = rng.randint(1, args.max_guilds)
+        for _ in range(guilds):
+            index.record_offence(user_id, rng.randrange(1, 10 ** 6))
+        if number % max(1, args.users // args.sample) == 0:
+            sample[user_id] = guilds
+    insert_seconds = time.perf_counter() - started
+
+    # Проверка известных и неизвестных пользователей (как в конвейере)
+    started = time.perf_counter()
+    exact = sum(1 for user_id, guilds in sample.items() if index.guild_count(user_id) == guilds)
+    known_check_ns = (time.perf_counter() - started) * 1e9 / len(sample)
+
+    unknown = [snowflake(rng) for _ in range(args.sample)]
+    started = time.perf_counter()
+    false_positives = sum(1 for user_id in unknown if index.guild_count(user_id))
+    unknown_check_ns = (time.perf_counter() - started) * 1e9 / len(unknown)
+    preempted = sum(1 for user_id in unknown if index.limit_scale(user_id) == 0.0)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="reputation-"), "reputation.bin")
+    started = time.perf_counter()
+    index.save(path)
+    save_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    ReputationIndex(capacity=index.capacity).load(path)
+    load_seconds = time.perf_counter() - started
+
+    dict_sample = min(args.users, args.dict_sample)
+    dict_bytes = measure_dict(dict_sample, args.max_guilds, args.seed) * args.users / dict_sample
+
+    return {
+        "config": vars(args),
+        "index_bytes": index.nbytes,
+        "index_allocated_bytes": allocated,
+        "file_bytes": os.path.getsize(path),
+        "bytes_per_user": index.nbytes / args.users,
+        "dict_bytes_estimate": int(dict_bytes),
+        "inserts_per_second": index.offences_total / insert_seconds,
+        "known_check_ns": round(known_check_ns),
+        "unknown_check_ns": round(unknown_check_ns),
+        "exact_guild_count_ratio": exact / len(sample),
+        "false_positive_ratio": false_positives / len(unknown),
+        "false_preempt_ratio": preempted / len(unknown),
+        "save_seconds": save_seconds,
+        "load_seconds": load_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память и скорость индекса нарушителей")
+    parser.add_argument("--users", type=int, default=10_000_000, help="число нарушителей")
+    parser.add_argument("--capacity", type=int, default=None, help="емкость индекса (по умолчанию --users)")
+    parser.add_argument("--max-guilds", type=int, default=3, help="максимум серверов на нарушителя")
+    parser.add_argument("--sample", type=int, default=100_000, help="проверок известных и неизвестных пользователей")
+    parser.add_argument("--dict-sample", type=int, default=200_000, help="размер выборки для оценки словаря")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    output = json.dumps(run(args), indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
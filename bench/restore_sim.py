@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fakes import FakeRest, FakeGuild, FakeChannel, FakeRole, FakeOverwrite
+from log import setup_logging
+from restore import RestoreEngine
+from snapshot import CHANNEL, ROLE, SnapshotStore
+
+# Снимок сервера с N каналами, удаление всех ролей и каналов рейдером и
+# восстановление по снимку через настоящий клиент бота (заглушки
+# Discord — в bench/fakes.py). Метрика — время восстановления.
+#
+#   python bench/restore_sim.py --channels 500 --concurrency 1,8,16 --output restore.json
+
+
+def build_guild(rest, args, rng):
+    guild = FakeGuild(rest)
+    roles = []
+    for index in range(args.roles):
+        role = FakeRole(guild, f"role{index}", position=index + 1, permissions=rng.getrandbits(40), colour=rng.getrandbits(24))
+        guild.roles.append(role)
+        roles.append(role)
+    categories = []
+    for index in range(args.categories):
+        category = FakeChannel(guild, f"category{index}", position=index, type=4)
+        guild.channels.append(category)
+        categories.append(category)
+    for index in range(args.channels - args.categories):
+        overwrites = {guild.default_role: FakeOverwrite(deny=1 << 10)}
+        for role in rng.sample(roles, min(len(roles), args.overwrites)):
+            # Право не может быть одновременно разрешено и запрещено
+            allow = rng.getrandbits(20)
+            overwrites[role] = FakeOverwrite(allow=allow, deny=rng.getrandbits(20) & ~allow)
+        guild.channels.append(FakeChannel(
+            guild, f"channel{index}", position=index, type=2 if index % 5 == 0 else 0,
+            category=categories[index % len(categories)] if categories else None,
+            overwrites=overwrites, topic=f"Тема канала {index}",
+        ))
+    return guild, roles
+
+
+def verify(guild, original):
+    """Доля восстановленных каналов с теми же именем, категорией и правами"""
+    roles_by_name = {role.name: role for role in guild.roles}
+    channels_by_name = {channel.name: channel for channel in guild.channels}
+    matched = 0
+    for name, (category_name, overwrites) in original.items():
+        channel = channels_by_name.get(name)
+        if channel is None:
+            continue
+        category = guild.get_channel(channel.category_id) if channel.category_id else None
+        restored = {
+            target.name: (overwrite.allow, overwrite.deny) for target, overwrite in channel.overwrites.items()
+        }
+        if (category.name if category else None) == category_name and restored == overwrites:
+            matched += 1
+    return matched / len(original), len(roles_by_name)
+
+
+async def restore_once(bot_module, args, concurrency, workdir):
+    rng = random.Random(args.seed)
+    rest = FakeRest(latency=args.rest_latency)
+    guild, roles = build_guild(rest, args, rng)
+    store = SnapshotStore(os.path.join(workdir, f"snapshots-{concurrency}"))
+
+    started = time.perf_counter()
+    full_bytes = store.snapshot(guild)
+    capture_ms = (time.perf_counter() - started) * 1000
+
+    # Изменение нескольких каналов: в журнал дописываются только отличия
+    for channel in rng.sample(guild.channels, args.changed):
+        channel.name += "-edited"
+    started = time.perf_counter()
+    diff_bytes = store.snapshot(guild)
+    diff_ms = (time.perf_counter() - started) * 1000
+
+    original = {
+        channel.name: (
+            guild.get_channel(channel.category_id).name if channel.category_id else None,
+            {target.name: (overwrite.allow, overwrite.deny) for target, overwrite in channel.overwrites.items()},
+        )
+        for channel in guild.channels
+    }
+
+    # Рейдер удаляет все роли и каналы
+    raider = guild.add_member(role_count=0)
+    engine = RestoreEngine(
+        store, bot_module.DiscordRestoreClient(), concurrency=concurrency,
+        create_rate=(args.create_rate, 1.0),
+    )
+    for channel in list(guild.channels):
+        engine.note_deleted(guild.id, raider.id, CHANNEL, channel.id)
+    for role in roles:
+        engine.note_deleted(guild.id, raider.id, ROLE, role.id)
+    guild.channels = []
+    guild.roles = [role for role in guild.roles if role not in roles]
+    rest.calls.clear()
+
+    started = time.perf_counter()
+    restored_roles, restored_channels = await engine.restore(guild, engine.take(guild.id, {raider.id}))
+    restore_seconds = time.perf_counter() - started
+    matched, _ = verify(guild, original)
+
+    return {
+        "concurrency": concurrency,
+        "restore_seconds": restore_seconds,
+        "restored_roles": restored_roles,
+        "restored_channels": restored_channels,
+        "channels_matched_ratio": matched,
+        "rest_calls": dict(rest.calls),
+        "snapshot_bytes": full_bytes,
+        "snapshot_capture_ms": capture_ms,
+        "incremental_bytes": diff_bytes,
+        "incremental_capture_ms": diff_ms,
+        "stats": engine.stats,
+    }
+
+
+async def simulate(bot_module, args):
+    workdir = tempfile.mkdtemp(prefix="restore-sim-")
+    runs = []
+    for concurrency in args.concurrency:
+        runs.append(await restore_once(bot_module, args, concurrency, workdir))
+    return {"config": {**vars(args)}, "runs": runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время восстановления сервера по снимку после рейда")
+    parser.add_argument("--channels", type=int, default=500, help="каналов на сервере (включая категории)")
+    parser.add_argument("--categories", type=int, default=25, help="категорий среди каналов")
+    parser.add_argument("--roles", type=int, default=50, help="ролей на сервере")
+    parser.add_argument("--overwrites", type=int, default=3, help="переопределений прав ролей на канал")
+    parser.add_argument("--changed", type=int, default=5, help="каналов, измененных между снимками")
+    parser.add_argument("--concurrency", type=lambda value: [int(item) for item in value.split(",")],
+                        default=[1, 8, 16], help="параллельных запросов (через запятую)")
+    parser.add_argument("--create-rate", type=float, default=1000.0,
+                        help="лимит запросов создания в секунду на маршрут")
+    parser.add_argument("--rest-latency", type=float, default=0.1, help="задержка REST-вызова, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="restore-sim-db-")
+    listener = setup_logging(level=os.environ.get("BOT_LOG_LEVEL", "ERROR"))
+    os.environ["BOT_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["BOT_SNAPSHOT_DIR"] = os.path.join(workdir, "snapshots")
+    import bot as bot_module
+
+    try:
+        result = asyncio.run(simulate(bot_module, args))
+    finally:
+        bot_module.db.close()
+        listener.stop()
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,139 +3,236 @@ from discord import app_commands
 from discord.ext import commands
 import asyncio
 import os
+import re
+import signal
+import tempfile
+import logging
 from datetime import datetime, timedelta
-from database import Database
+from async_database import AsyncDatabase
+from state_backend import create_state_backend
+from journal import EventJournal
+from audit import action_type_for, AuditLogFallback
+from pipeline import ActionPipeline
+from mitigation import MitigationDispatcher, RateLimited
+from retention import RetentionTask
+from reputation import ReputationIndex, ReputationTask
+from snapshot import CHANNEL, ROLE, SnapshotStore, SnapshotTask
+from restore import RestoreEngine
+from startup import Startup, sync_commands
+from members import MemberLRU
+from metrics import Gauge, start_metrics_server
+from log import setup_logging
+from policy import ALL_FAMILIES, WINDOW_CHOICES, family_label, format_window
+from actions import FAMILIES
+from config_io import FORMATS, format_for
+from embeds import (
+    EMOJI, EMBED_COLOR, SECONDARY_COLOR, HELP, SETTINGS, STATUS, PROTECTION_TOGGLED, ACCESS_DENIED,
+    RAID_ALERT, OFFENCE_FIELD, SERVER_FIELD, ACTIONS_FIELD, guild_icon, status_values
+)
+
+logger = logging.getLogger(__name__)
+
+# Этапы запуска считаются от импорта бота
+startup = Startup()
+
+# Авторы действий приходят через on_audit_log_entry_create (интент moderation).
+# Если поток недоступен, автор ищется запросом к журналу аудита (AuditLogFallback)
+USE_AUDIT_LOG_STREAM = True
 
 # Инициализация бота
 intents = discord.Intents.default()
 intents.guilds = True
 intents.members = True
-intents.message_content = True
-
-bot = commands.Bot(command_prefix='/', intents=intents)
-db = Database()
-
-# Константы
-EMBED_COLOR = 0x1E90FF  # Яркий синий цвет для современного вида
-SECONDARY_COLOR = 0x2F3136  # Темный фон для акцентов
-
-# Эмодзи для сообщений
-EMOJI = {
-    "shield": "🛡️",
-    "settings": "⚙️",
-    "warning": "⚠️",
-    "success": "✅",
-    "error": "❌",
-    "info": "ℹ️",
-    "lock": "🔒",
-    "unlock": "🔓",
-    "limit": "📊",
-    "trusted": "👥",
-    "add": "➕",
-    "remove": "➖",
-    "list": "📜",
-    "back": "⬅️",
-    "confirm": "✔️",
-    "cancel": "✖️",
-    "roles": "🎭",
-    "channels": "📣",
-    "alert": "🚨",
-    "time": "🕒",
-    "server": "🏰",
-    "user": "👤",
-    "help": "❓",
-    "image": "🖼️"
-}
-
-# Класс для кнопок настроек
-class SettingsView(discord.ui.View):
-    def __init__(self, guild_id, owner_id):
-        super().__init__(timeout=300)
+intents.moderation = USE_AUDIT_LOG_STREAM
+# Сообщения, реакции и набор текста боту не нужны (все команды — слеш-команды,
+# пользователи выбираются компонентами): шлюз не присылает эти события
+intents.messages = False
+intents.reactions = False
+intents.typing = False
+
+# Шардирование: процесс обслуживает шарды BOT_SHARD_IDS из BOT_SHARD_COUNT
+# (задаются launcher.py; без них — все шарды в одном процессе)
+SHARD_COUNT = int(os.environ["BOT_SHARD_COUNT"]) if os.environ.get("BOT_SHARD_COUNT") else None
+SHARD_IDS = [int(shard_id) for shard_id in os.environ["BOT_SHARD_IDS"].split(",")] if os.environ.get("BOT_SHARD_IDS") else None
+# Общие задачи (синхронизация команд, очистка журнала) выполняет процесс с шардом 0
+IS_PRIMARY = SHARD_IDS is None or 0 in SHARD_IDS
+
+# Кэш участников (BOT_MEMBER_CACHE): full — все участники всех серверов,
+# lean — кэш discord.py отключен, участники запрашиваются по ID, когда
+# нужны, и BOT_MEMBER_LRU_SIZE последних хранятся в LRU (members.py)
+MEMBER_CACHE = os.environ.get("BOT_MEMBER_CACHE", "full")
+if MEMBER_CACHE not in ("full", "lean"):
+    raise ValueError(f"Неизвестный режим кэша участников: {MEMBER_CACHE} (ожидались full или lean)")
+LEAN_MEMBERS = MEMBER_CACHE == "lean"
+member_lru = MemberLRU(capacity=int(os.environ.get("BOT_MEMBER_LRU_SIZE", "10000")))
+
+# Ожидание после 429 дольше этого (секунд, не меньше 30) discord.py не
+# выполняет сам, а выбрасывает discord.RateLimited: меры защиты и
+# восстановление повторяют вызов по своим лимитам маршрутов
+MAX_RATELIMIT_TIMEOUT = float(os.environ.get("BOT_MAX_RATELIMIT_TIMEOUT", "30"))
+
+bot = commands.AutoShardedBot(
+    # Текстовых команд нет; префикс-упоминание не требует message_content
+    command_prefix=commands.when_mentioned,
+    max_ratelimit_timeout=MAX_RATELIMIT_TIMEOUT,
+    intents=intents,
+    shard_count=SHARD_COUNT,
+    shard_ids=SHARD_IDS,
+    member_cache_flags=discord.MemberCacheFlags.none() if LEAN_MEMBERS else discord.MemberCacheFlags.from_intents(intents),
+    chunk_guilds_at_startup=not LEAN_MEMBERS
+)
+
+# Параметры отложенной пакетной записи действий
+ACTION_LOG_FLUSH_SIZE = 100
+ACTION_LOG_FLUSH_INTERVAL = 1.0
+
+# Асинхронная база: пул читателей и один поток писателя
+db = AsyncDatabase(
+    os.environ.get("BOT_DB_PATH", "database.db"),
+    flush_size=ACTION_LOG_FLUSH_SIZE,
+    flush_interval=ACTION_LOG_FLUSH_INTERVAL
+)
+
+# Синхронизация команд только при изменении дерева; BOT_FORCE_SYNC=1 — всегда
+FORCE_COMMAND_SYNC = os.environ.get("BOT_FORCE_SYNC", "0") == "1"
+
+# Журнал событий в файлах, отображенных в память (каталог BOT_JOURNAL_DIR,
+# пустое значение — отключить): быстрое восстановление счетчиков и выгрузка
+# для разбора инцидентов. У каждого процесса свой каталог
+JOURNAL_DIR = os.environ.get("BOT_JOURNAL_DIR", "journal" if SHARD_IDS is None else f"journal-{SHARD_IDS[0]}")
+journal = EventJournal(JOURNAL_DIR) if JOURNAL_DIR else None
+
+# Хранилище счетчиков действий: memory (один процесс), sqlite (общая база WAL) или redis
+STATE_BACKEND = os.environ.get("BOT_STATE_BACKEND", "memory")
+state = create_state_backend(STATE_BACKEND, db, redis_url=os.environ.get("BOT_REDIS_URL"), journal=journal)
+
+# Хранение журнала действий: старые записи сворачиваются в суточные агрегаты
+ACTION_RETENTION_HOURS = 72
+retention = RetentionTask(db, horizon_hours=ACTION_RETENTION_HOURS)
+
+# Индекс нарушителей по всем серверам процесса: строже лимиты для рейдеров,
+# уже наказанных на других серверах. У каждого процесса свой файл
+REPUTATION_CAPACITY = int(os.environ.get("BOT_REPUTATION_CAPACITY", "1000000"))
+REPUTATION_PATH = os.environ.get(
+    "BOT_REPUTATION_PATH",
+    "reputation.bin" if SHARD_IDS is None else f"reputation-{SHARD_IDS[0]}.bin"
+)
+reputation = ReputationIndex(capacity=REPUTATION_CAPACITY)
+reputation_task = ReputationTask(reputation, REPUTATION_PATH)
+
+# Снимки ролей и каналов защищенных серверов (каталог BOT_SNAPSHOT_DIR,
+# раз в BOT_SNAPSHOT_INTERVAL секунд): по ним восстанавливаются объекты,
+# удаленные нарушителями
+SNAPSHOT_DIR = os.environ.get("BOT_SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_INTERVAL = int(os.environ.get("BOT_SNAPSHOT_INTERVAL", "600"))
+snapshots = SnapshotStore(SNAPSHOT_DIR)
+snapshot_task = SnapshotTask(snapshots, lambda: bot.guilds, lambda guild_id: db.get_protection_status(guild_id), SNAPSHOT_INTERVAL)
+
+# Меню /settings и /trusted без состояния: действие и сервер записаны в
+# custom_id кнопки (ar:<действие>:<guild_id>), обработчики регистрируются
+# один раз при запуске (bot.add_dynamic_items). Открытые меню не занимают
+# память бота и продолжают работать после перезапуска
+class MenuButton(discord.ui.DynamicItem[discord.ui.Button], template=r"ar:(?P<action>[a-z]+):(?P<guild_id>[0-9]+)"):
+    """Кнопка меню: действие и сервер берутся из custom_id при нажатии"""
+
+    # Действие -> (подпись, эмодзи, стиль, обработчик(interaction, guild_id), отказ не-владельцу)
+    actions = {}
+
+    def __init__(self, action, guild_id):
+        label, emoji, style, _, _ = self.actions[action]
+        super().__init__(discord.ui.Button(label=label, emoji=emoji, style=style, custom_id=f"ar:{action}:{guild_id}"))
+        self.action = action
         self.guild_id = guild_id
-        self.owner_id = owner_id
-        
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        action = match["action"]
+        if action not in cls.actions:
+            raise ValueError(f"Неизвестное действие меню: {action}")
+        return cls(action, int(match["guild_id"]))
+
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
-        if interaction.user.id != self.owner_id:
-            embed = discord.Embed(
-                title=f"{EMOJI['error']} Ошибка доступа",
-                description=f"Только владелец сервера может управлять настройками!",
-                color=SECONDARY_COLOR,
-                timestamp=datetime.now()
-            )
-            embed.set_footer(text="Anti Raid Bot • Ограниченный доступ")
+        # Владелец проверяется при нажатии: после передачи сервера меню слушается нового владельца
+        guild = interaction.guild
+        if guild is None or guild.id != self.guild_id or interaction.user.id != guild.owner_id:
+            embed = ACCESS_DENIED.render(message=self.actions[self.action][4])
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return False
         return True
+
+    async def callback(self, interaction: discord.Interaction):
+        await self.actions[self.action][3](interaction, self.guild_id)
+
+def menu_action(action, label, emoji, style, denied):
+    """Регистрация обработчика кнопки меню"""
+    def decorator(handler):
+        MenuButton.actions[action] = (label, emoji, style, handler, denied)
+        return handler
+    return decorator
+
+class MenuView(discord.ui.View):
+    """Кнопки меню сервера; объект нужен только для отправки сообщения"""
+    buttons = ()
+
+    def __init__(self, guild_id):
+        super().__init__(timeout=None)
+        for action in self.buttons:
+            self.add_item(MenuButton(action, guild_id))
+
+class SettingsView(MenuView):
+    buttons = ("toggle", "limits", "trusted")
+
+class TrustedUsersView(MenuView):
+    buttons = ("add", "remove", "list", "back")
+
+SETTINGS_DENIED = "Только владелец сервера может управлять настройками!"
+TRUSTED_DENIED = "Только владелец может управлять доверенными лицами!"
+
+# Кнопки настроек
+@menu_action("toggle", "Вкл/Выкл защиту", "🛡️", discord.ButtonStyle.primary, SETTINGS_DENIED)
+async def toggle_protection(interaction: discord.Interaction, guild_id):
+    current_status = await db.get_protection_status(guild_id)
+    new_status = not current_status
+    await db.set_protection_status(guild_id, new_status)
     
-    @discord.ui.button(label="Вкл/Выкл защиту", emoji="🛡️", style=discord.ButtonStyle.primary)
-    async def toggle_protection(self, interaction: discord.Interaction, button: discord.ui.Button):
-        current_status = db.get_protection_status(self.guild_id)
-        new_status = not current_status
-        db.set_protection_status(self.guild_id, new_status)
-        
-        status_emoji = EMOJI['lock'] if new_status else EMOJI['unlock']
-        status_text = "АКТИВНА" if new_status else "ОТКЛЮЧЕНА"
-        
-        embed = discord.Embed(
-            title=f"{EMOJI['shield']} Статус защиты",
-            description=f"**{status_emoji} Защита от рейдов {status_text}**",
-            color=EMBED_COLOR,
-            timestamp=datetime.now()
-        )
-        
-        limits = db.get_action_limits(self.guild_id)
-        embed.add_field(
-            name=f"{EMOJI['limit']} Ограничения",
-            value=(
-                f"**{EMOJI['roles']} Роли:** {limits['role_limit']} действий/24ч\n"
-                f"**{EMOJI['channels']} Каналы:** {limits['channel_limit']} действий/24ч"
-            ),
-            inline=False
-        )
-        
-        trusted_count = len(db.get_trusted_users(self.guild_id))
-        embed.add_field(
-            name=f"{EMOJI['trusted']} Доверенные лица",
-            value=f"Всего: **{trusted_count}** пользователей",
-            inline=False
-        )
-        
-        embed.set_footer(text="Anti Raid Bot • Настройки")
-        embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else "")
-        
-        await interaction.response.edit_message(embed=embed, view=self)
-    
-    @discord.ui.button(label="Настроить лимиты", emoji="📊", style=discord.ButtonStyle.primary)
-    async def configure_limits(self, interaction: discord.Interaction, button: discord.ui.Button):
-        modal = LimitSettingsModal(self.guild_id)
-        await interaction.response.send_modal(modal)
+    limits = await db.get_action_limits(guild_id)
+    trusted_count = await db.get_trusted_count(guild_id)
+    embed = PROTECTION_TOGGLED.render(
+        guild_icon(interaction.guild), **status_values(new_status), **limits, trusted_count=trusted_count
+    )
     
-    @discord.ui.button(label="Доверенные лица", emoji="👥", style=discord.ButtonStyle.primary)
-    async def manage_trusted_users(self, interaction: discord.Interaction, button: discord.ui.Button):
-        trusted_view = TrustedUsersView(self.guild_id, self.owner_id)
-        embed = discord.Embed(
-            title=f"{EMOJI['trusted']} Управление доверенными лицами",
-            description=(
-                f"Управляйте списком доверенных пользователей.\n\n"
-                f"{EMOJI['warning']} **ВНИМАНИЕ!**\n"
-                f"Доверенные лица обходят защиту от рейдов.\n"
-                f"Добавляйте только полностью проверенных пользователей!"
-            ),
-            color=EMBED_COLOR,
-            timestamp=datetime.now()
-        )
-        embed.set_footer(text="Anti Raid Bot • Управление")
-        embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else "")
-        await interaction.response.edit_message(embed=embed, view=trusted_view)
+    # Кнопки сообщения остаются прежними
+    await interaction.response.edit_message(embed=embed)
+
+@menu_action("limits", "Настроить лимиты", "📊", discord.ButtonStyle.primary, SETTINGS_DENIED)
+async def configure_limits(interaction: discord.Interaction, guild_id):
+    limits = await db.get_action_limits(guild_id)
+    modal = LimitSettingsModal(guild_id, limits)
+    await interaction.response.send_modal(modal)
+
+@menu_action("trusted", "Доверенные лица", "👥", discord.ButtonStyle.primary, SETTINGS_DENIED)
+async def manage_trusted_users(interaction: discord.Interaction, guild_id):
+    embed = discord.Embed(
+        title=f"{EMOJI['trusted']} Управление доверенными лицами",
+        description=(
+            f"Управляйте списком доверенных пользователей.\n\n"
+            f"{EMOJI['warning']} **ВНИМАНИЕ!**\n"
+            f"Доверенные лица обходят защиту от рейдов.\n"
+            f"Добавляйте только полностью проверенных пользователей!"
+        ),
+        color=EMBED_COLOR,
+        timestamp=datetime.now()
+    )
+    embed.set_footer(text="Anti Raid Bot • Управление")
+    embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else "")
+    await interaction.response.edit_message(embed=embed, view=TrustedUsersView(guild_id))
 
 # Модальное окно для настройки лимитов
 class LimitSettingsModal(discord.ui.Modal, title="Настройка лимитов"):
-    def __init__(self, guild_id):
+    def __init__(self, guild_id, limits):
         super().__init__()
         self.guild_id = guild_id
         
-        limits = db.get_action_limits(guild_id)
-        
         self.role_limit = discord.ui.TextInput(
             label="Лимит ролей (за 24 часа)",
             placeholder="Максимум действий с ролями",
@@ -168,7 +265,7 @@ class LimitSettingsModal(discord.ui.Modal, title="Настройка лимит
                 await interaction.response.send_message(embed=embed, ephemeral=True)
                 return
             
-            db.set_action_limits(self.guild_id, role_limit, channel_limit)
+            await db.set_action_limits(self.guild_id, role_limit, channel_limit)
             
             embed = discord.Embed(
                 title=f"{EMOJI['success']} Лимиты обновлены",
@@ -191,12 +288,84 @@ class LimitSettingsModal(discord.ui.Modal, title="Настройка лимит
             embed.set_footer(text="Anti Raid Bot • Ошибка")
             await interaction.response.send_message(embed=embed, ephemeral=True)
 
-# Класс для управления доверенными лицами
-class TrustedUsersView(discord.ui.View):
+# Кнопки управления доверенными лицами
+@menu_action("add", "Добавить", "➕", discord.ButtonStyle.success, TRUSTED_DENIED)
+async def add_trusted_user(interaction: discord.Interaction, guild_id):
+    embed = discord.Embed(
+        title=f"{EMOJI['add']} Добавление доверенного лица",
+        description="Выберите пользователя для добавления.",
+        color=EMBED_COLOR,
+        timestamp=datetime.now()
+    )
+    embed.set_footer(text="Anti Raid Bot • Выбор пользователя")
+    select_view = AddTrustedUserView(guild_id, interaction.guild.owner_id)
+    await interaction.response.send_message(embed=embed, view=select_view, ephemeral=True)
+    select_view.interaction = interaction
+
+@menu_action("remove", "Удалить", "➖", discord.ButtonStyle.danger, TRUSTED_DENIED)
+async def remove_trusted_user(interaction: discord.Interaction, guild_id):
+    await interaction.response.defer(ephemeral=True)
+    select_view = RemoveTrustedUserView(guild_id, interaction.guild.owner_id)
+    await select_view.load(interaction.guild)
+    
+    if not select_view.user_ids:
+        embed = discord.Embed(
+            title=f"{EMOJI['info']} Список пуст",
+            description="Нет доверенных лиц для удаления.",
+            color=EMBED_COLOR,
+            timestamp=datetime.now()
+        )
+        embed.set_footer(text="Anti Raid Bot • Информация")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        return
+    
+    await interaction.followup.send(embed=select_view.embed(interaction.guild), view=select_view, ephemeral=True)
+
+@menu_action("list", "Список", "📜", discord.ButtonStyle.secondary, TRUSTED_DENIED)
+async def view_trusted_users(interaction: discord.Interaction, guild_id):
+    await interaction.response.defer(ephemeral=True)
+    list_view = TrustedListView(guild_id, interaction.guild.owner_id)
+    await list_view.load(interaction.guild)
+    
+    if not list_view.user_ids:
+        embed = discord.Embed(
+            title=f"{EMOJI['trusted']} Доверенные лица",
+            description="Список доверенных лиц пуст.",
+            color=EMBED_COLOR,
+            timestamp=datetime.now()
+        )
+        embed.set_footer(text="Anti Raid Bot • Список")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        return
+    
+    await interaction.followup.send(embed=list_view.embed(interaction.guild), view=list_view, ephemeral=True)
+
+@menu_action("back", "Назад", "⬅️", discord.ButtonStyle.primary, TRUSTED_DENIED)
+async def back_to_settings(interaction: discord.Interaction, guild_id):
+    protection_status = await db.get_protection_status(guild_id)
+    limits = await db.get_action_limits(guild_id)
+    trusted_count = await db.get_trusted_count(guild_id)
+    
+    embed = SETTINGS.render(
+        guild_icon(interaction.guild), **status_values(protection_status), **limits, trusted_count=trusted_count
+    )
+    
+    await interaction.response.edit_message(embed=embed, view=SettingsView(guild_id))
+
+# Выбор пользователя для добавления в доверенные лица
+class AddTrustedUserView(discord.ui.View):
+    """Выбор пользователя компонентом Discord вместо упоминания в чате
+
+    Боту не нужен интент message_content, и пока запрос открыт, сообщения
+    серверов не проверяются.
+    """
+
     def __init__(self, guild_id, owner_id):
-        super().__init__(timeout=300)
+        super().__init__(timeout=60)
         self.guild_id = guild_id
         self.owner_id = owner_id
+        # Взаимодействие, которым отправлен выбор (для сообщения об истечении времени)
+        self.interaction = None
     
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id != self.owner_id:
@@ -211,171 +380,52 @@ class TrustedUsersView(discord.ui.View):
             return False
         return True
     
-    @discord.ui.button(label="Добавить", emoji="➕", style=discord.ButtonStyle.success)
-    async def add_trusted_user(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = discord.Embed(
-            title=f"{EMOJI['add']} Добавление доверенного лица",
-            description="Упомяните пользователя (@username) для добавления.",
-            color=EMBED_COLOR,
-            timestamp=datetime.now()
-        )
-        embed.set_footer(text="Anti Raid Bot • Введите @username")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        
-        def check(m):
-            return m.author.id == interaction.user.id and m.channel.id == interaction.channel.id and len(m.mentions) > 0
-        
-        try:
-            message = await bot.wait_for('message', check=check, timeout=60.0)
-            
-            try:
-                await message.delete()
-            except:
-                pass
-            
-            mentioned_user = message.mentions[0]
-            
-            if db.is_trusted_user(self.guild_id, mentioned_user.id):
-                embed = discord.Embed(
-                    title=f"{EMOJI['info']} Уже добавлен",
-                    description=f"{mentioned_user.mention} уже в списке доверенных!",
-                    color=EMBED_COLOR,
-                    timestamp=datetime.now()
-                )
-                embed.set_footer(text="Anti Raid Bot • Информация")
-                await interaction.followup.send(embed=embed, ephemeral=True)
-                return
-            
-            embed = discord.Embed(
-                title=f"{EMOJI['warning']} Подтверждение добавления",
-                description=(
-                    f"Вы добавляете {mentioned_user.mention} в доверенные лица.\n\n"
-                    f"**{EMOJI['warning']} ВНИМАНИЕ!**\n"
-                    f"Это позволит пользователю обойти защиту от рейдов.\n"
-                    f"Подтвердите действие:"
-                ),
-                color=0xFF4500,  # Оранжевый для предупреждения
-                timestamp=datetime.now()
-            )
-            embed.set_footer(text="Anti Raid Bot • Подтверждение")
-            
-            confirm_view = ConfirmAddTrustedUserView(self.guild_id, mentioned_user.id, mentioned_user.mention)
-            await interaction.followup.send(embed=embed, view=confirm_view, ephemeral=True)
-            
-        except asyncio.TimeoutError:
-            embed = discord.Embed(
-                title=f"{EMOJI['error']} Время истекло",
-                description="Вы не указали пользователя в течение 60 секунд.",
-                color=SECONDARY_COLOR,
-                timestamp=datetime.now()
-            )
-            embed.set_footer(text="Anti Raid Bot • Ошибка")
-            await interaction.followup.send(embed=embed, ephemeral=True)
-    
-    @discord.ui.button(label="Удалить", emoji="➖", style=discord.ButtonStyle.danger)
-    async def remove_trusted_user(self, interaction: discord.Interaction, button: discord.ui.Button):
-        trusted_users = db.get_trusted_users(self.guild_id)
+    @discord.ui.select(cls=discord.ui.UserSelect, placeholder="Выберите пользователя", min_values=1, max_values=1)
+    async def select_user(self, interaction: discord.Interaction, select: discord.ui.UserSelect):
+        self.stop()
+        user = select.values[0]
         
-        if not trusted_users:
+        if await db.is_trusted_user(self.guild_id, user.id):
             embed = discord.Embed(
-                title=f"{EMOJI['info']} Список пуст",
-                description="Нет доверенных лиц для удаления.",
+                title=f"{EMOJI['info']} Уже добавлен",
+                description=f"{user.mention} уже в списке доверенных!",
                 color=EMBED_COLOR,
                 timestamp=datetime.now()
             )
             embed.set_footer(text="Anti Raid Bot • Информация")
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            await interaction.response.edit_message(embed=embed, view=None)
             return
         
-        select_view = RemoveTrustedUserView(self.guild_id, interaction.guild)
-        
         embed = discord.Embed(
-            title=f"{EMOJI['remove']} Удаление доверенного лица",
-            description="Выберите пользователя для удаления:",
-            color=EMBED_COLOR,
+            title=f"{EMOJI['warning']} Подтверждение добавления",
+            description=(
+                f"Вы добавляете {user.mention} в доверенные лица.\n\n"
+                f"**{EMOJI['warning']} ВНИМАНИЕ!**\n"
+                f"Это позволит пользователю обойти защиту от рейдов.\n"
+                f"Подтвердите действие:"
+            ),
+            color=0xFF4500,  # Оранжевый для предупреждения
             timestamp=datetime.now()
         )
-        embed.set_footer(text="Anti Raid Bot • Выбор")
-        await interaction.response.send_message(embed=embed, view=select_view, ephemeral=True)
-    
-    @discord.ui.button(label="Список", emoji="📜", style=discord.ButtonStyle.secondary)
-    async def view_trusted_users(self, interaction: discord.Interaction, button: discord.ui.Button):
-        trusted_users = db.get_trusted_users(self.guild_id)
-        
-        if not trusted_users:
-            embed = discord.Embed(
-                title=f"{EMOJI['trusted']} Доверенные лица",
-                description="Список доверенных лиц пуст.",
-                color=EMBED_COLOR,
-                timestamp=datetime.now()
-            )
-            embed.set_footer(text="Anti Raid Bot • Список")
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            return
-        
-        guild = interaction.guild
-        description = f"**Список доверенных лиц:**\n\n"
-        
-        for user_id in trusted_users:
-            member = guild.get_member(user_id)
-            if member:
-                description += f"{EMOJI['user']} {member.mention} ({member.name})\n"
-            else:
-                description += f"{EMOJI['user']} ID: {user_id} (не найден)\n"
+        embed.set_footer(text="Anti Raid Bot • Подтверждение")
         
-        embed = discord.Embed(
-            title=f"{EMOJI['trusted']} Доверенные лица",
-            description=description,
-            color=EMBED_COLOR,
-            timestamp=datetime.now()
-        )
-        embed.set_footer(text="Anti Raid Bot • Список")
-        embed.set_thumbnail(url=guild.icon.url if guild.icon else "")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        confirm_view = ConfirmAddTrustedUserView(self.guild_id, user.id, user.mention)
+        await interaction.response.edit_message(embed=embed, view=confirm_view)
     
-    @discord.ui.button(label="Назад", emoji="⬅️", style=discord.ButtonStyle.primary)
-    async def back_to_settings(self, interaction: discord.Interaction, button: discord.ui.Button):
-        settings_view = SettingsView(self.guild_id, self.owner_id)
-        
-        protection_status = db.get_protection_status(self.guild_id)
-        limits = db.get_action_limits(self.guild_id)
-        trusted_count = len(db.get_trusted_users(self.guild_id))
-        
-        status_emoji = EMOJI['lock'] if protection_status else EMOJI['unlock']
-        status_text = "АКТИВНА" if protection_status else "ОТКЛЮЧЕНА"
-        
+    async def on_timeout(self):
+        if self.interaction is None:
+            return
         embed = discord.Embed(
-            title=f"{EMOJI['settings']} Настройки защиты",
-            description="Выберите параметр для изменения:",
-            color=EMBED_COLOR,
+            title=f"{EMOJI['error']} Время истекло",
+            description="Вы не выбрали пользователя в течение 60 секунд.",
+            color=SECONDARY_COLOR,
             timestamp=datetime.now()
         )
-        
-        embed.add_field(
-            name=f"{EMOJI['shield']} Статус",
-            value=f"**{status_emoji} Защита {status_text}**",
-            inline=False
-        )
-        
-        embed.add_field(
-            name=f"{EMOJI['limit']} Лимиты",
-            value=(
-                f"**{EMOJI['roles']} Роли:** {limits['role_limit']} действий/24ч\n"
-                f"**{EMOJI['channels']} Каналы:** {limits['channel_limit']} действий/24ч"
-            ),
-            inline=False
-        )
-        
-        embed.add_field(
-            name=f"{EMOJI['trusted']} Доверенные",
-            value=f"Всего: **{trusted_count}** пользователей",
-            inline=False
-        )
-        
-        embed.set_footer(text="Anti Raid Bot • Настройки")
-        embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else "")
-        
-        await interaction.response.edit_message(embed=embed, view=settings_view)
+        embed.set_footer(text="Anti Raid Bot • Ошибка")
+        try:
+            await self.interaction.edit_original_response(embed=embed, view=None)
+        except discord.HTTPException:
+            pass
 
 # Класс для подтверждения добавления
 class ConfirmAddTrustedUserView(discord.ui.View):
@@ -387,7 +437,7 @@ class ConfirmAddTrustedUserView(discord.ui.View):
     
     @discord.ui.button(label="Подтвердить", emoji="✔️", style=discord.ButtonStyle.success)
     async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
-        success = db.add_trusted_user(self.guild_id, self.user_id)
+        success = await db.add_trusted_user(self.guild_id, self.user_id)
         
         if success:
             embed = discord.Embed(
@@ -418,24 +468,156 @@ class ConfirmAddTrustedUserView(discord.ui.View):
         embed.set_footer(text="Anti Raid Bot • Отмена")
         await interaction.response.edit_message(embed=embed, view=None)
 
-# Класс для выбора удаления
-class RemoveTrustedUserView(discord.ui.View):
-    def __init__(self, guild_id, guild):
-        super().__init__(timeout=60)
+# Доверенных лиц на странице списка и меню удаления (лимит Select — 25 вариантов)
+TRUSTED_PAGE_SIZE = 25
+
+def cached_member(guild, user_id):
+    """Участник из кэша discord.py или из LRU недавно полученных"""
+    return guild.get_member(user_id) or member_lru.get(guild.id, user_id)
+
+async def fetch_members(guild, user_ids):
+    """Участники сервера по ID: из кэша, промахи — запросами к шлюзу по 100 ID"""
+    members = {}
+    missing = []
+    for user_id in user_ids:
+        member = cached_member(guild, user_id)
+        if member is not None:
+            members[user_id] = member
+        else:
+            missing.append(user_id)
+    for start in range(0, len(missing), 100):
+        try:
+            # В режиме lean ответ не добавляется в кэш discord.py, только в LRU
+            found = await guild.query_members(user_ids=missing[start:start + 100], limit=100, cache=not LEAN_MEMBERS)
+        except (discord.ClientException, discord.HTTPException, asyncio.TimeoutError) as e:
+            logger.warning("Не удалось получить участников сервера: %s", e, extra={"guild_id": guild.id})
+            break
+        for member in found:
+            members[member.id] = member_lru.put(member)
+    return members
+
+async def role_member_ids(role):
+    """ID участников роли; в режиме lean — по списку участников сервера без кэширования"""
+    if not LEAN_MEMBERS:
+        return [member.id for member in role.members]
+    members = await role.guild.chunk(cache=False)
+    return [member.id for member in members if member.get_role(role.id) is not None]
+
+# Базовый класс постраничного просмотра доверенных лиц
+class TrustedPageView(discord.ui.View):
+    """Страницы доверенных лиц по TRUSTED_PAGE_SIZE
+
+    Из базы читается только видимая страница (keyset-пагинация по
+    user_id), участники страницы запрашиваются одним вызовом. Подклассы
+    меняют заголовок (page_title) и текст страницы (page_description).
+    """
+
+    page_title = f"{EMOJI['trusted']} Доверенные лица"
+
+    def __init__(self, guild_id, owner_id):
+        super().__init__(timeout=120)
         self.guild_id = guild_id
-        self.guild = guild
-        
-        trusted_users = db.get_trusted_users(guild_id)
+        self.owner_id = owner_id
+        # Начала просмотренных страниц; последнее — текущая страница
+        self.cursors = [0]
+        self.user_ids = []
+        self.members = {}
+        self.total = 0
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            embed = discord.Embed(
+                title=f"{EMOJI['error']} Ошибка доступа",
+                description="Только владелец может управлять доверенными лицами!",
+                color=SECONDARY_COLOR,
+                timestamp=datetime.now()
+            )
+            embed.set_footer(text="Anti Raid Bot • Ограниченный доступ")
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return False
+        return True
+    
+    async def load(self, guild):
+        """Чтение текущей страницы и участников на ней"""
+        page = await db.get_trusted_users_page(self.guild_id, self.cursors[-1], TRUSTED_PAGE_SIZE + 1)
+        self.user_ids = page[:TRUSTED_PAGE_SIZE]
+        self.members = await fetch_members(guild, self.user_ids)
+        self.total = await db.get_trusted_count(self.guild_id)
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = len(page) <= TRUSTED_PAGE_SIZE
+    
+    def page_description(self):
+        description = f"**Список доверенных лиц:**\n\n"
+        description += "\n".join(f"{EMOJI['user']} {self.user_label(user_id)}" for user_id in self.user_ids)
+        return description
+    
+    def embed(self, guild):
+        """Embed текущей страницы"""
+        embed = discord.Embed(
+            title=self.page_title,
+            description=self.page_description(),
+            color=EMBED_COLOR,
+            timestamp=datetime.now()
+        )
+        embed.set_footer(text=f"Anti Raid Bot • {self.page_footer()}")
+        return embed
+    
+    def page_footer(self):
+        pages = max(1, -(-self.total // TRUSTED_PAGE_SIZE))
+        return f"Страница {len(self.cursors)} из {pages} • Всего: {self.total}"
+    
+    def user_label(self, user_id):
+        member = self.members.get(user_id)
+        if member:
+            return f"{member.mention} ({member.name})"
+        return f"ID: {user_id} (не найден)"
+    
+    async def show(self, interaction):
+        await interaction.response.defer()
+        await self.load(interaction.guild)
+        await interaction.edit_original_response(embed=self.embed(interaction.guild), view=self)
+    
+    @discord.ui.button(label="Назад", emoji="◀️", style=discord.ButtonStyle.secondary, row=1)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await self.show(interaction)
+    
+    @discord.ui.button(label="Далее", emoji="▶️", style=discord.ButtonStyle.secondary, row=1)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.user_ids:
+            self.cursors.append(self.user_ids[-1])
+        await self.show(interaction)
+
+# Класс для просмотра списка
+class TrustedListView(TrustedPageView):
+    def embed(self, guild):
+        embed = super().embed(guild)
+        embed.set_thumbnail(url=guild.icon.url if guild.icon else "")
+        return embed
+
+# Класс для выбора удаления
+class RemoveTrustedUserView(TrustedPageView):
+    page_title = f"{EMOJI['remove']} Удаление доверенного лица"
+    
+    def __init__(self, guild_id, owner_id):
+        super().__init__(guild_id, owner_id)
         
         self.select = discord.ui.Select(
             placeholder="Выберите пользователя",
             min_values=1,
             max_values=1,
-            options=[]
+            options=[],
+            row=0
         )
-        
-        for user_id in trusted_users:
-            member = guild.get_member(user_id)
+        self.select.callback = self.select_callback
+        self.add_item(self.select)
+    
+    async def load(self, guild):
+        await super().load(guild)
+        self.select.options = []
+        for user_id in self.user_ids:
+            member = self.members.get(user_id)
             if member:
                 self.select.add_option(
                     label=member.name,
@@ -450,17 +632,17 @@ class RemoveTrustedUserView(discord.ui.View):
                     description="Не найден на сервере",
                     emoji="👤"
                 )
-        
-        self.select.callback = self.select_callback
-        self.add_item(self.select)
+    
+    def page_description(self):
+        return "Выберите пользователя для удаления:"
     
     async def select_callback(self, interaction: discord.Interaction):
         user_id = int(self.select.values[0])
         
-        success = db.remove_trusted_user(self.guild_id, user_id)
+        success = await db.remove_trusted_user(self.guild_id, user_id)
         
         if success:
-            member = self.guild.get_member(user_id)
+            member = self.members.get(user_id)
             user_mention = member.mention if member else f"ID: {user_id}"
             
             embed = discord.Embed(
@@ -480,336 +662,653 @@ class RemoveTrustedUserView(discord.ui.View):
         embed.set_footer(text="Anti Raid Bot • Результат")
         await interaction.response.edit_message(embed=embed, view=None)
 
-@bot.event
-async def on_ready():
-    print(f'Бот {bot.user.name} успешно запущен!')
+async def prepare():
+    """Фоновая подготовка при запуске, параллельно с подключением к шлюзу"""
+    # Миграции базы начались при импорте в потоке писателя
+    await db.open()
+    startup.mark("database")
+    # Восстанавливаем счетчики действий из базы; события до этого ждут в конвейере
+    loaded = await state.load(db)
+    logger.info('Восстановлено %s действий в счетчиках', loaded)
+    startup.mark("counters")
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, reputation_task.load)
+    reputation_task.start()
+    startup.mark("reputation")
+    warmed = await db.warm_config_cache(SHARD_COUNT, SHARD_IDS)
+    logger.info('Загружены настройки %s защищенных серверов', warmed)
+    startup.mark("config_cache")
+
+async def sync_command_tree():
     try:
-        synced = await bot.tree.sync()
-        print(f'Синхронизировано {len(synced)} команд')
+        synced = await sync_commands(bot.tree, db, force=FORCE_COMMAND_SYNC)
+        if synced is None:
+            logger.info('Команды не изменились, синхронизация пропущена')
+        else:
+            logger.info('Синхронизировано %s команд', synced)
     except Exception as e:
-        print(f'Ошибка синхронизации: {e}')
+        logger.error('Ошибка синхронизации: %s', e)
+
+@bot.event
+async def setup_hook():
+    # Вызывается после входа (login), до подключения к шлюзу
+    startup.mark("login")
+    # SIGTERM (launcher.py, systemd) — штатная остановка: bot.run вернется,
+    # и run_bot запишет очередь действий, журнал событий и индекс нарушителей
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except NotImplementedError:
+        pass
+    # Кнопки меню из custom_id, в том числе в сообщениях до перезапуска
+    bot.add_dynamic_items(MenuButton)
+    if METRICS_PORT:
+        try:
+            await start_metrics_server(port=METRICS_PORT)
+        except OSError as e:
+            logger.warning('Не удалось запустить сервер метрик на порту %s: %s', METRICS_PORT, e)
+    startup.run(prepare())
+    if IS_PRIMARY:
+        # Синхронизация команд — один раз за запуск, а не при каждом on_ready
+        startup.run(sync_command_tree(), phase="command_sync", gate=False)
+        retention.start()
+    snapshot_task.start()
+    mitigation.start()
+
+@bot.event
+async def on_ready():
+    # on_ready повторяется после переподключений; этап отмечается один раз
+    startup.mark("gateway_ready")
+    logger.info('Бот %s успешно запущен! Шарды: %s', bot.user.name, SHARD_IDS or "все")
 
 @bot.tree.command(name="help", description="Показать справку по командам")
 async def help_command(interaction: discord.Interaction):
-    embed = discord.Embed(
-        title=f"{EMOJI['shield']} Anti Raid Bot",
-        description="Система защиты от рейдов и несанкционированных изменений",
-        color=EMBED_COLOR,
-        timestamp=datetime.now()
-    )
+    await interaction.response.send_message(embed=HELP.render(guild_icon(interaction.guild)), ephemeral=True)
+
+@bot.tree.command(name="settings", description="Настройки защиты от рейда")
+async def settings_command(interaction: discord.Interaction):
+    if interaction.guild.owner_id != interaction.user.id:
+        embed = ACCESS_DENIED.render(message="Только владелец сервера может использовать эту команду!")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
     
-    embed.add_field(
-        name=f"{EMOJI['info']} Доступные команды",
-        value=(
-            f"**{EMOJI['help']} /help** - Показать справку\n"
-            f"**{EMOJI['settings']} /settings** - Настроить защиту (владелец)\n"
-            f"**{EMOJI['shield']} /status** - Текущий статус защиты\n"
-            f"**{EMOJI['trusted']} /trusted** - Управление доверенными лицами"
-        ),
-        inline=False
+    protection_status = await db.get_protection_status(interaction.guild.id)
+    limits = await db.get_action_limits(interaction.guild.id)
+    trusted_count = await db.get_trusted_count(interaction.guild.id)
+    
+    view = SettingsView(interaction.guild.id)
+    embed = SETTINGS.render(
+        guild_icon(interaction.guild), **status_values(protection_status), **limits, trusted_count=trusted_count
     )
     
-    embed.add_field(
-        name=f"{EMOJI['shield']} Возможности",
-        value=(
-            f"**{EMOJI['roles']} Контроль ролей**\n"
-            f"**{EMOJI['channels']} Контроль каналов**\n"
-            f"**{EMOJI['alert']} Автоматическая защита**\n"
-            f"**{EMOJI['warning']} Уведомления владельца**"
-        ),
-        inline=False
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+@bot.tree.command(name="status", description="Показать статус защиты")
+async def status_command(interaction: discord.Interaction):
+    protection_status = await db.get_protection_status(interaction.guild.id)
+    limits = await db.get_action_limits(interaction.guild.id)
+    
+    owner = await fetch_owner(interaction.guild)
+    embed = STATUS.render(
+        guild_icon(interaction.guild), **status_values(protection_status), **limits,
+        owner_mention=owner.mention if owner else f"<@{interaction.guild.owner_id}>",
+        owner_name=owner.name if owner else "неизвестно"
     )
     
-    embed.add_field(
-        name=f"{EMOJI['warning']} Важно",
-        value=(
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="trusted", description="Управление доверенными лицами")
+async def trusted_command(interaction: discord.Interaction):
+    if interaction.guild.owner_id != interaction.user.id:
+        embed = discord.Embed(
+            title=f"{EMOJI['error']} Ошибка доступа",
+            description="Только владелец может управлять доверенными лицами!",
+            color=SECONDARY_COLOR,
+            timestamp=datetime.now()
+        )
+        embed.set_footer(text="Anti Raid Bot • Ограниченный доступ")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    
+    trusted_view = TrustedUsersView(interaction.guild.id)
+    
+    embed = discord.Embed(
+        title=f"{EMOJI['trusted']} Доверенные лица",
+        description=(
+            f"Управление списком доверенных пользователей.\n\n"
+            f"**{EMOJI['warning']} ВНИМАНИЕ!**\n"
             f"Доверенные лица могут обходить защиту.\n"
             f"Добавляйте только проверенных пользователей!"
         ),
-        inline=False
+        color=EMBED_COLOR,
+        timestamp=datetime.now()
     )
     
-    embed.set_footer(text="Anti Raid Bot • Справка")
+    embed.set_footer(text="Anti Raid Bot • Управление")
     embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else "")
     
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.response.send_message(embed=embed, view=trusted_view, ephemeral=True)
 
-@bot.tree.command(name="settings", description="Настройки защиты от рейда")
-async def settings_command(interaction: discord.Interaction):
+@bot.tree.command(name="policy", description="Правила обнаружения рейдов по окнам времени")
+@app_commands.describe(
+    family="Семейство действий",
+    window="Окно времени",
+    limit="Максимум действий за окно (0 — отключить правило, пусто — вернуть правило по умолчанию)"
+)
+@app_commands.choices(
+    family=[app_commands.Choice(name=family_label(family), value=family) for family in (*FAMILIES, ALL_FAMILIES)],
+    window=[app_commands.Choice(name=format_window(window), value=window) for window in WINDOW_CHOICES]
+)
+async def policy_command(interaction: discord.Interaction, family: str = None, window: int = None, limit: int = None):
     if interaction.guild.owner_id != interaction.user.id:
         embed = discord.Embed(
             title=f"{EMOJI['error']} Ошибка доступа",
-            description="Только владелец сервера может использовать эту команду!",
+            description="Только владелец сервера может изменять правила!",
             color=SECONDARY_COLOR,
             timestamp=datetime.now()
         )
         embed.set_footer(text="Anti Raid Bot • Ограниченный доступ")
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
-    
-    protection_status = db.get_protection_status(interaction.guild.id)
-    limits = db.get_action_limits(interaction.guild.id)
-    trusted_count = len(db.get_trusted_users(interaction.guild.id))
-    
-    status_emoji = EMOJI['lock'] if protection_status else EMOJI['unlock']
-    status_text = "АКТИВНА" if protection_status else "ОТКЛЮЧЕНА"
-    
-    view = SettingsView(interaction.guild.id, interaction.guild.owner_id)
-    
+
+    guild_id = interaction.guild.id
+    if family is not None and window is not None:
+        try:
+            if limit is None:
+                await db.remove_policy_rule(guild_id, family, window)
+            else:
+                await db.set_policy_rule(guild_id, family, window, limit)
+        except ValueError as e:
+            embed = discord.Embed(
+                title=f"{EMOJI['error']} Ошибка",
+                description=str(e),
+                color=SECONDARY_COLOR,
+                timestamp=datetime.now()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+    config = await db.get_guild_config(guild_id)
+    lines = []
+    for rule in config.policy.rules:
+        mark = f" {EMOJI['settings']}" if (rule.family, rule.window) in config.policy_rules else ""
+        lines.append(f"**{family_label(rule.family)}:** {rule.limit} за {format_window(rule.window)}{mark}")
+
     embed = discord.Embed(
-        title=f"{EMOJI['settings']} Настройки защиты",
-        description="Выберите параметр для настройки:",
+        title=f"{EMOJI['limit']} Правила обнаружения",
+        description="\n".join(lines) or "Все правила отключены",
         color=EMBED_COLOR,
         timestamp=datetime.now()
     )
-    
-    embed.add_field(
-        name=f"{EMOJI['shield']} Статус",
-        value=f"**{status_emoji} Защита {status_text}**",
-        inline=False
-    )
-    
     embed.add_field(
-        name=f"{EMOJI['limit']} Лимиты",
+        name=f"{EMOJI['info']} Как это работает",
         value=(
-            f"**{EMOJI['roles']} Роли:** {limits['role_limit']} действий/24ч\n"
-            f"**{EMOJI['channels']} Каналы:** {limits['channel_limit']} действий/24ч"
+            f"Нарушитель обнаруживается, если превышено любое правило.\n"
+            f"В правиле «{family_label(ALL_FAMILIES)}» действия учитываются с весами.\n"
+            f"{EMOJI['settings']} — правило изменено для этого сервера."
         ),
         inline=False
     )
-    
-    embed.add_field(
-        name=f"{EMOJI['trusted']} Доверенные",
-        value=f"Всего: **{trusted_count}** пользователей",
-        inline=False
+    embed.set_footer(text="Anti Raid Bot • Правила")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+def owner_error_embed(description):
+    return ACCESS_DENIED.render(message=description)
+
+def error_embed(description):
+    embed = discord.Embed(
+        title=f"{EMOJI['error']} Ошибка",
+        description=description,
+        color=SECONDARY_COLOR,
+        timestamp=datetime.now()
     )
-    
-    embed.set_footer(text="Anti Raid Bot • Настройки")
-    embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else "")
-    
-    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+    embed.set_footer(text="Anti Raid Bot • Ошибка")
+    return embed
+
+# ID пользователей в тексте: упоминания <@123> или просто числа
+USER_ID_PATTERN = re.compile(r"\d{15,20}")
+
+@bot.tree.command(name="trusted_bulk", description="Массовое добавление или удаление доверенных лиц")
+@app_commands.describe(
+    action="Добавить или удалить",
+    users="ID или упоминания пользователей через пробел",
+    role="Все участники роли"
+)
+@app_commands.choices(action=[
+    app_commands.Choice(name="Добавить", value="add"),
+    app_commands.Choice(name="Удалить", value="remove")
+])
+async def trusted_bulk_command(interaction: discord.Interaction, action: str, users: str = None, role: discord.Role = None):
+    if interaction.guild.owner_id != interaction.user.id:
+        await interaction.response.send_message(
+            embed=owner_error_embed("Только владелец может управлять доверенными лицами!"), ephemeral=True
+        )
+        return
+
+    # Список участников роли в режиме lean загружается дольше 3 секунд
+    await interaction.response.defer(ephemeral=True)
+    user_ids = {int(user_id) for user_id in USER_ID_PATTERN.findall(users or "")}
+    if role is not None:
+        user_ids.update(await role_member_ids(role))
+    if not user_ids:
+        await interaction.followup.send(embed=error_embed("Укажите пользователей или роль."), ephemeral=True)
+        return
+
+    guild_id = interaction.guild.id
+    if action == "add":
+        changed = await db.add_trusted_users(guild_id, user_ids)
+        description = f"Добавлено в доверенные лица: **{changed}** из {len(user_ids)}."
+    else:
+        changed = await db.remove_trusted_users(guild_id, user_ids)
+        description = f"Удалено из доверенных лиц: **{changed}** из {len(user_ids)}."
 
-@bot.tree.command(name="status", description="Показать статус защиты")
-async def status_command(interaction: discord.Interaction):
-    protection_status = db.get_protection_status(interaction.guild.id)
-    limits = db.get_action_limits(interaction.guild.id)
-    
-    status_emoji = EMOJI['lock'] if protection_status else EMOJI['unlock']
-    status_text = "АКТИВНА" if protection_status else "ОТКЛЮЧЕНА"
-    
     embed = discord.Embed(
-        title=f"{EMOJI['shield']} Статус защиты",
-        description=f"**{status_emoji} Защита от рейдов {status_text}**",
+        title=f"{EMOJI['success']} Готово",
+        description=description,
         color=EMBED_COLOR,
         timestamp=datetime.now()
     )
-    
     embed.add_field(
-        name=f"{EMOJI['limit']} Ограничения",
-        value=(
-            f"**{EMOJI['roles']} Роли:** {limits['role_limit']} действий/24ч\n"
-            f"**{EMOJI['channels']} Каналы:** {limits['channel_limit']} действий/24ч"
-        ),
-        inline=False
-    )
-    
-    owner = interaction.guild.owner
-    embed.add_field(
-        name=f"{EMOJI['user']} Владелец",
-        value=f"{owner.mention} ({owner.name})",
+        name=f"{EMOJI['trusted']} Доверенные",
+        value=f"Всего: **{await db.get_trusted_count(guild_id)}** пользователей",
         inline=False
     )
-    
-    embed.set_footer(text="Anti Raid Bot • Статус")
-    embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else "")
-    
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    embed.set_footer(text="Anti Raid Bot • Результат")
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
-@bot.tree.command(name="trusted", description="Управление доверенными лицами")
-async def trusted_command(interaction: discord.Interaction):
+@bot.tree.command(name="config_export", description="Выгрузить настройки защиты в файл")
+@app_commands.describe(format="Формат файла")
+@app_commands.choices(format=[app_commands.Choice(name=fmt.upper(), value=fmt) for fmt in FORMATS])
+async def config_export_command(interaction: discord.Interaction, format: str = "csv"):
     if interaction.guild.owner_id != interaction.user.id:
-        embed = discord.Embed(
-            title=f"{EMOJI['error']} Ошибка доступа",
-            description="Только владелец может управлять доверенными лицами!",
-            color=SECONDARY_COLOR,
-            timestamp=datetime.now()
+        await interaction.response.send_message(
+            embed=owner_error_embed("Только владелец сервера может выгружать настройки!"), ephemeral=True
         )
-        embed.set_footer(text="Anti Raid Bot • Ограниченный доступ")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
         return
-    
-    trusted_view = TrustedUsersView(interaction.guild.id, interaction.guild.owner_id)
-    
+
+    await interaction.response.defer(ephemeral=True)
+    handle, path = tempfile.mkstemp(suffix=f".{format}")
+    os.close(handle)
+    try:
+        rows = await db.export_config(interaction.guild.id, path, format)
+        await interaction.followup.send(
+            content=f"{EMOJI['success']} Настройки сервера: {rows} строк",
+            file=discord.File(path, filename=f"antiraid-{interaction.guild.id}.{format}"),
+            ephemeral=True
+        )
+    finally:
+        os.remove(path)
+
+@bot.tree.command(name="config_import", description="Загрузить настройки защиты из файла")
+@app_commands.describe(
+    file="Файл .csv или .jsonl, выгруженный командой /config_export",
+    replace="Заменить правила и список доверенных лиц (иначе дополнить)"
+)
+async def config_import_command(interaction: discord.Interaction, file: discord.Attachment, replace: bool = False):
+    if interaction.guild.owner_id != interaction.user.id:
+        await interaction.response.send_message(
+            embed=owner_error_embed("Только владелец сервера может загружать настройки!"), ephemeral=True
+        )
+        return
+
+    try:
+        fmt = format_for(file.filename)
+    except ValueError as e:
+        await interaction.response.send_message(embed=error_embed(str(e)), ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    handle, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(handle)
+    try:
+        await file.save(path)
+        counts = await db.import_config(interaction.guild.id, path, fmt, replace=replace)
+    except ValueError as e:
+        await interaction.followup.send(embed=error_embed(f"Настройки не изменены. {e}"), ephemeral=True)
+        return
+    finally:
+        os.remove(path)
+
     embed = discord.Embed(
-        title=f"{EMOJI['trusted']} Доверенные лица",
+        title=f"{EMOJI['success']} Настройки загружены",
         description=(
-            f"Управление списком доверенных пользователей.\n\n"
-            f"**{EMOJI['warning']} ВНИМАНИЕ!**\n"
-            f"Доверенные лица могут обходить защиту.\n"
-            f"Добавляйте только проверенных пользователей!"
+            f"**{EMOJI['shield']} Статус защиты:** {'да' if counts['protection'] else 'нет'}\n"
+            f"**{EMOJI['limit']} Лимитов:** {counts['limit']}\n"
+            f"**{EMOJI['settings']} Правил:** {counts['policy']}\n"
+            f"**{EMOJI['trusted']} Доверенных лиц:** {counts['trusted']}"
         ),
         color=EMBED_COLOR,
         timestamp=datetime.now()
     )
+    embed.set_footer(text="Anti Raid Bot • Результат")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+async def resolve_user(guild, user_id):
+    user = cached_member(guild, user_id) or bot.get_user(user_id)
+    if user is None:
+        try:
+            user = await bot.fetch_user(user_id)
+        except discord.HTTPException as e:
+            logger.warning("Не удалось получить пользователя %s: %s", user_id, e, extra={"guild_id": guild.id, "user_id": user_id})
+    return user
+
+async def rest_call(coro):
+    """Вызов REST: discord.RateLimited становится RateLimited диспетчера (повтор после ожидания)"""
+    try:
+        return await coro
+    except discord.RateLimited as e:
+        raise RateLimited(e.retry_after)
+
+class DiscordMitigationClient:
+    """REST-вызовы мер защиты для MitigationDispatcher"""
     
-    embed.set_footer(text="Anti Raid Bot • Управление")
-    embed.set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else "")
-    
-    await interaction.response.send_message(embed=embed, view=trusted_view, ephemeral=True)
+    async def prefetch_members(self, guild, users):
+        # Участники пачки нарушителей — одним запросом вместо запроса на каждого
+        await fetch_members(guild, [user.id for user in users if not is_guild_member(guild, user)])
+
+    async def strip_roles(self, guild, user):
+        return await rest_call(remove_all_roles(user, guild))
+
+    async def lockdown_roles(self, guild, users):
+        return await lockdown_roles(guild, users)
+
+    async def lock_role(self, guild, role):
+        return await rest_call(lock_role(guild, role))
+
+    async def send_summary(self, guild, offences, locked_roles):
+        # Сводка отправляется после снятия ролей: удаления нарушителей уже
+        # пришли из журнала аудита, и их можно восстановить
+        deleted = restorer.take(guild.id, {user.id for user, _, _, _ in offences})
+        if deleted:
+            task = asyncio.create_task(restorer.restore(guild, deleted))
+            restore_tasks.add(task)
+            task.add_done_callback(restore_tasks.discard)
+        await notify_owner(guild, offences, locked_roles, restoring=len(deleted))
+
+class DiscordRestoreClient:
+    """REST-вызовы восстановления для RestoreEngine
+
+    Долгое ожидание после 429 приходит в RestoreEngine как RateLimited:
+    движок штрафует маршрут и повторяет вызов
+    """
+
+    async def create_role(self, guild, record):
+        return await rest_call(self._create_role(guild, record))
+
+    async def edit_role_positions(self, guild, positions):
+        return await rest_call(self._edit_role_positions(guild, positions))
+
+    async def create_channel(self, guild, record, category, overwrites):
+        return await rest_call(self._create_channel(guild, record, category, overwrites))
+
+    async def _create_role(self, guild, record):
+        return await guild.create_role(
+            name=record["name"],
+            permissions=discord.Permissions(record["permissions"]),
+            colour=discord.Colour(record["colour"]),
+            hoist=record["hoist"],
+            mentionable=record["mentionable"],
+            reason="Anti Raid Bot: восстановление после рейда"
+        )
+
+    async def _edit_role_positions(self, guild, positions):
+        # Бот не может поднять роль выше своей
+        top = guild.me.top_role.position - 1
+        await guild.edit_role_positions(
+            positions={role: max(1, min(position, top)) for role, position in positions.items()},
+            reason="Anti Raid Bot: восстановление после рейда"
+        )
+
+    async def _create_channel(self, guild, record, category, overwrites):
+        options = {
+            "position": record["position"],
+            "overwrites": {
+                # Участник не из кэша передается по ID (режим lean)
+                (discord.Object(id=target) if isinstance(target, int) else target):
+                    discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny))
+                for target, allow, deny in overwrites
+            },
+            "reason": "Anti Raid Bot: восстановление после рейда",
+        }
+        channel_type = record["type"]
+        if channel_type == discord.ChannelType.category.value:
+            return await guild.create_category(record["name"], **options)
+        options["category"] = category
+        if channel_type in (discord.ChannelType.voice.value, discord.ChannelType.stage_voice.value):
+            options["user_limit"] = record["user_limit"]
+            if record["bitrate"]:
+                options["bitrate"] = min(record["bitrate"], int(guild.bitrate_limit))
+            if channel_type == discord.ChannelType.stage_voice.value:
+                return await guild.create_stage_channel(record["name"], **options)
+            return await guild.create_voice_channel(record["name"], **options)
+        options.update(topic=record["topic"], slowmode_delay=record["slowmode_delay"], nsfw=record["nsfw"])
+        if channel_type == discord.ChannelType.forum.value:
+            return await guild.create_forum(record["name"], **options)
+        return await guild.create_text_channel(record["name"], **options)
+
+# Меры защиты: без повторов для одного нарушителя, нарушители сервера —
+# параллельно одной пачкой, при скоординированном рейде — блокировка ролей,
+# уведомления одной сводкой
+mitigation = MitigationDispatcher(DiscordMitigationClient())
+
+# Восстановление удаленных нарушителями ролей и каналов по снимкам
+restorer = RestoreEngine(snapshots, DiscordRestoreClient())
+restore_tasks = set()
+
+# Конвейер: автор → фильтр политики → запись → оценка → меры
+pipeline = ActionPipeline(
+    db, state, resolve_user, mitigation.punish, reputation=reputation, startup=startup, journal=journal
+)
+
+# Метрики очередей и кэша (http://127.0.0.1:BOT_METRICS_PORT/metrics, 0 — отключить)
+METRICS_PORT = int(os.environ.get("BOT_METRICS_PORT", "9108"))
+
+Gauge("antiraid_action_log_queue_depth", "Действия в очереди записи").set_function(lambda: db.action_log.depth)
+Gauge("antiraid_mitigation_queue_depth", "Задачи в очереди мер защиты").set_function(lambda: mitigation.queue.qsize())
+Gauge("antiraid_pipeline_pending_events", "События в очереди конвейера").set_function(
+    lambda: sum(len(events) for events in pipeline.pending.values())
+)
+Gauge("antiraid_config_cache_size", "Серверов в кэше настроек").set_function(lambda: len(db.config_cache))
+Gauge("antiraid_config_cache_hit_ratio", "Доля попаданий в кэш настроек").set_function(
+    lambda: db.config_cache.stats()["hit_rate"]
+)
+Gauge("antiraid_member_lru_size", "Участники в LRU недавно полученных").set_function(lambda: len(member_lru))
+Gauge("antiraid_reputation_offences_total", "Нарушения, учтенные в индексе нарушителей").set_function(
+    lambda: reputation.offences_total
+)
+if journal is not None:
+    Gauge("antiraid_journal_records_total", "Действия, записанные в журнал событий").set_function(lambda: journal.appended)
+
+# Удаления, которые можно отменить по снимкам
+DELETED_KINDS = {"role_delete": ROLE, "channel_delete": CHANNEL}
+
+@bot.event
+async def on_audit_log_entry_create(entry):
+    action_type = action_type_for(entry)
+    if action_type is not None:
+        if action_type in DELETED_KINDS:
+            restorer.note_deleted(entry.guild.id, entry.user_id, DELETED_KINDS[action_type], entry.target.id)
+        pipeline.submit(entry.guild, entry.user_id, action_type, user=entry.user)
+
+# Запасной путь: без потока журнала аудита автор ищется пакетным запросом
+audit_fallback = AuditLogFallback(on_audit_log_entry_create)
 
 @bot.event
 async def on_guild_role_create(role):
-    guild = role.guild
-    
-    async for entry in guild.audit_logs(limit=1, action=discord.AuditLogAction.role_create):
-        user = entry.user
-        
-        if not db.get_protection_status(guild.id):
-            return
-        
-        if user.id == guild.owner_id or db.is_trusted_user(guild.id, user.id):
-            return
-        
-        db.log_action(guild.id, user.id, "role_create")
-        
-        limits = db.get_action_limits(guild.id)
-        role_actions = db.count_user_actions(guild.id, user.id, "role_create") + db.count_user_actions(guild.id, user.id, "role_delete")
-        
-        if role_actions > limits["role_limit"]:
-            try:
-                await remove_all_roles(user, guild)
-                await notify_owner(guild, user, "роли", role_actions, limits["role_limit"])
-            except Exception as e:
-                print(f"Ошибка при создании роли: {e}")
+    if not USE_AUDIT_LOG_STREAM:
+        audit_fallback.notify(role.guild, discord.AuditLogAction.role_create, role.id)
 
 @bot.event
 async def on_guild_role_delete(role):
-    guild = role.guild
-    
-    async for entry in guild.audit_logs(limit=1, action=discord.AuditLogAction.role_delete):
-        user = entry.user
-        
-        if not db.get_protection_status(guild.id):
-            return
-        
-        if user.id == guild.owner_id or db.is_trusted_user(guild.id, user.id):
-            return
-        
-        db.log_action(guild.id, user.id, "role_delete")
-        
-        limits = db.get_action_limits(guild.id)
-        role_actions = db.count_user_actions(guild.id, user.id, "role_create") + db.count_user_actions(guild.id, user.id, "role_delete")
-        
-        if role_actions > limits["role_limit"]:
-            try:
-                await remove_all_roles(user, guild)
-                await notify_owner(guild, user, "роли", role_actions, limits["role_limit"])
-            except Exception as e:
-                print(f"Ошибка при удалении роли: {e}")
+    # Удаленный объект еще в событии — он свежее последнего снимка
+    if await db.get_protection_status(role.guild.id):
+        await snapshots.remember_role(role.guild, role)
+    if not USE_AUDIT_LOG_STREAM:
+        audit_fallback.notify(role.guild, discord.AuditLogAction.role_delete, role.id)
 
 @bot.event
 async def on_guild_channel_create(channel):
-    guild = channel.guild
-    
-    async for entry in guild.audit_logs(limit=1, action=discord.AuditLogAction.channel_create):
-        user = entry.user
-        
-        if not db.get_protection_status(guild.id):
-            return
-        
-        if user.id == guild.owner_id or db.is_trusted_user(guild.id, user.id):
-            return
-        
-        db.log_action(guild.id, user.id, "channel_create")
-        
-        limits = db.get_action_limits(guild.id)
-        channel_actions = db.count_user_actions(guild.id, user.id, "channel_create") + db.count_user_actions(guild.id, user.id, "channel_delete")
-        
-        if channel_actions > limits["channel_limit"]:
-            try:
-                await remove_all_roles(user, guild)
-                await notify_owner(guild, user, "каналы", channel_actions, limits["channel_limit"])
-            except Exception as e:
-                print(f"Ошибка при создании канала: {e}")
+    if not USE_AUDIT_LOG_STREAM:
+        audit_fallback.notify(channel.guild, discord.AuditLogAction.channel_create, channel.id)
 
 @bot.event
 async def on_guild_channel_delete(channel):
-    guild = channel.guild
-    
-    async for entry in guild.audit_logs(limit=1, action=discord.AuditLogAction.channel_delete):
-        user = entry.user
-        
-        if not db.get_protection_status(guild.id):
-            return
-        
-        if user.id == guild.owner_id or db.is_trusted_user(guild.id, user.id):
-            return
-        
-        db.log_action(guild.id, user.id, "channel_delete")
-        
-        limits = db.get_action_limits(guild.id)
-        channel_actions = db.count_user_actions(guild.id, user.id, "channel_create") + db.count_user_actions(guild.id, user.id, "channel_delete")
-        
-        if channel_actions > limits["channel_limit"]:
-            try:
-                await remove_all_roles(user, guild)
-                await notify_owner(guild, user, "каналы", channel_actions, limits["channel_limit"])
-            except Exception as e:
-                print(f"Ошибка при удалении канала: {e}")
+    if await db.get_protection_status(channel.guild.id):
+        await snapshots.remember_channel(channel.guild, channel)
+    if not USE_AUDIT_LOG_STREAM:
+        audit_fallback.notify(channel.guild, discord.AuditLogAction.channel_delete, channel.id)
+
+def is_guild_member(guild, user):
+    return isinstance(user, discord.Member) and user.guild.id == guild.id
+
+async def get_member(guild, user):
+    """Участник сервера из кэша, при промахе — запросом к API (None, если вышел)"""
+    if is_guild_member(guild, user):
+        return user
+    member = cached_member(guild, user.id)
+    if member is None:
+        try:
+            member = member_lru.put(await guild.fetch_member(user.id))
+        except discord.NotFound:
+            return None
+    return member
+
+async def fetch_owner(guild):
+    """Владелец сервера: из кэша или LRU, при промахе — запросом к API (None, если недоступен)
+
+    В режиме lean guild.owner всегда None: участники не кэшируются
+    """
+    owner = cached_member(guild, guild.owner_id)
+    if owner is not None:
+        return owner
+    try:
+        return member_lru.put(await guild.fetch_member(guild.owner_id))
+    except discord.HTTPException:
+        pass
+    # Для личного сообщения достаточно пользователя
+    try:
+        return await bot.fetch_user(guild.owner_id)
+    except discord.HTTPException as e:
+        logger.warning("Не удалось получить владельца сервера: %s", e, extra={"guild_id": guild.id})
+        return None
 
 async def remove_all_roles(user, guild):
-    member = guild.get_member(user.id)
-    if member:
+    """Снятие всех ролей, кроме управляемых; False при ошибке"""
+    context = {"guild_id": guild.id, "user_id": user.id}
+    try:
+        member = await get_member(guild, user)
+        if member is None:
+            return True
         roles_to_keep = [role for role in member.roles if role.managed or role.is_default()]
-        
-        try:
-            await member.edit(roles=roles_to_keep, reason="Anti Raid Bot: превышение лимита")
-            print(f"Сняты роли с {member.name} на {guild.name}")
-        except discord.Forbidden:
-            print(f"Недостаточно прав для снятия ролей с {member.name} на {guild.name}")
-        except Exception as e:
-            print(f"Ошибка при снятии ролей: {e}")
+        await member.edit(roles=roles_to_keep, reason="Anti Raid Bot: превышение лимита")
+        logger.info("Сняты роли с %s на %s", member.name, guild.name, extra=context)
+        return True
+    except discord.Forbidden:
+        logger.warning("Недостаточно прав для снятия ролей с %s на %s", user.name, guild.name, extra=context)
+    except discord.RateLimited:
+        # Повтор — в диспетчере мер защиты
+        raise
+    except Exception as e:
+        logger.error("Ошибка при снятии ролей: %s", e, extra=context)
+    return False
+
+# Права, которые отключаются у ролей нарушителей при блокировке
+DANGEROUS_PERMISSIONS = discord.Permissions(
+    administrator=True,
+    manage_guild=True,
+    manage_roles=True,
+    manage_channels=True,
+    manage_webhooks=True,
+    ban_members=True,
+    kick_members=True,
+    moderate_members=True,
+)
 
-async def notify_owner(guild, user, action_type, count, limit):
-    owner = guild.owner
+async def lockdown_roles(guild, users):
+    """Роли нарушителей с опасными правами, которые бот может изменить"""
+    top_role = guild.me.top_role
+    roles = {}
+    members = [user for user in users if is_guild_member(guild, user)]
+    fetched = await fetch_members(guild, [user.id for user in users if not is_guild_member(guild, user)])
+    for member in members + list(fetched.values()):
+        for role in member.roles:
+            if role.managed or role.is_default() or role >= top_role:
+                continue
+            if role.permissions.value & DANGEROUS_PERMISSIONS.value:
+                roles[role.id] = role
+    return list(roles.values())
+
+async def lock_role(guild, role):
+    """Отключение опасных прав у роли"""
+    permissions = discord.Permissions(role.permissions.value & ~DANGEROUS_PERMISSIONS.value)
+    try:
+        await role.edit(permissions=permissions, reason="Anti Raid Bot: блокировка при рейде")
+        logger.info("Отключены опасные права роли %s на %s", role.name, guild.name, extra={"guild_id": guild.id})
+        return True
+    except discord.Forbidden:
+        logger.warning("Недостаточно прав для изменения роли %s на %s", role.name, guild.name, extra={"guild_id": guild.id})
+        return False
+
+async def notify_owner(guild, offences, locked_roles=(), restoring=0):
+    """Одно уведомление владельцу обо всех нарушениях за период сводки"""
+    owner = await fetch_owner(guild)
     
     if owner:
-        embed = discord.Embed(
-            title=f"{EMOJI['alert']} Обнаружен рейд!",
-            description=f"**{user.mention} ({user.name})** превысил лимит действий!",
-            color=0xFF4500,
-            timestamp=datetime.now()
-        )
+        users = {user.id: user for user, _, _, _ in offences}
+        if len(users) == 1:
+            user = next(iter(users.values()))
+            description = f"**{user.mention} ({user.name})** превысил лимит действий!"
+        else:
+            description = f"**{len(users)}** пользователей превысили лимит действий!"
         
-        embed.add_field(
-            name=f"{EMOJI['info']} Подробности",
-            value=(
-                f"**{EMOJI['roles'] if action_type == 'роли' else EMOJI['channels']} Тип:** {action_type}\n"
-                f"**{EMOJI['limit']} Действий:** {count}\n"
-                f"**{EMOJI['limit']} Лимит:** {limit}\n"
-                f"**{EMOJI['server']} Сервер:** {guild.name}"
-            ),
-            inline=False
-        )
+        # Не больше 23 полей нарушений: лимит embed — 25 полей
+        fields = [
+            OFFENCE_FIELD.render({
+                "name": user.name,
+                "type_emoji": EMOJI['roles'] if action_type.startswith('роли') else EMOJI['channels'],
+                "action_type": action_type,
+                "count": count,
+                "limit": limit,
+            })
+            for user, action_type, count, limit in offences[:23]
+        ]
+        fields.append(SERVER_FIELD.render({"guild_name": guild.name}))
         
-        embed.add_field(
-            name=f"{EMOJI['shield']} Действия",
-            value="Все роли пользователя сняты.",
-            inline=False
-        )
+        actions_text = "Все роли нарушителей сняты."
+        if locked_roles:
+            names = ", ".join(role.name for role in locked_roles[:20])
+            if len(locked_roles) > 20:
+                names += f" и еще {len(locked_roles) - 20}"
+            actions_text += f"\n{EMOJI['lock']} Опасные права отключены у ролей: {names}"
+        if restoring:
+            actions_text += f"\n{EMOJI['success']} Восстанавливается удаленных ролей и каналов: {restoring}"
+        fields.append(ACTIONS_FIELD.render({"actions": actions_text[:1024]}))
         
-        embed.set_footer(text="Anti Raid Bot • Уведомление")
-        embed.set_thumbnail(url=guild.icon.url if guild.icon else "")
+        embed = RAID_ALERT.render(guild_icon(guild), fields, summary=description)
         
         try:
             await owner.send(embed=embed)
         except discord.Forbidden:
-            print(f"Невозможно отправить уведомление владельцу {guild.name}")
+            logger.warning("Невозможно отправить уведомление владельцу %s", guild.name, extra={"guild_id": guild.id})
         except Exception as e:
-            print(f"Ошибка уведомления: {e}")
+            logger.error("Ошибка уведомления: %s", e, extra={"guild_id": guild.id})
 
 def run_bot(token):
-    bot.run(token)
+    # Журнал пишется из отдельного потока; BOT_LOG_JSON=1 — вывод в JSON
+    listener = setup_logging(
+        level=os.environ.get("BOT_LOG_LEVEL", "INFO").upper(),
+        json_output=os.environ.get("BOT_LOG_JSON", "0") == "1",
+    )
+    try:
+        # log_handler=None — discord.py пишет в уже настроенный корневой логгер
+        bot.run(token, log_handler=None)
+    finally:
+        # Сбрасываем в базу действия, оставшиеся в очереди
+        db.close()
+        if journal is not None:
+            journal.close()
+        reputation.save(REPUTATION_PATH)
+        listener.stop()
 
 # Запуск бота
-bot.run("")
\ No newline at end of file
+if __name__ == "__main__":
+    run_bot(os.environ.get("DISCORD_TOKEN", ""))
\ No newline at end of file
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from policy import compile_policy
+
+
+class GuildConfig:
+    """Настройки защиты одного сервера"""
+    __slots__ = ("protection_enabled", "limits", "trusted_users", "policy_rules", "_policy")
+
+    def __init__(self, protection_enabled, limits, trusted_users, policy_rules=None):
+        self.protection_enabled = protection_enabled
+        self.limits = dict(limits)
+        # Множество для проверки доверенного лица за O(1)
+        self.trusted_users = set(trusted_users)
+        self.policy_rules = dict(policy_rules or {})
+        self._policy = None
+
+    @property
+    def policy(self):
+        """Скомпилированная политика; пересобирается после изменения лимитов или правил"""
+        if self._policy is None:
+            self._policy = compile_policy(self.limits, self.policy_rules)
+        return self._policy
+
+    def invalidate_policy(self):
+        self._policy = None
+
+
+class GuildConfigCache:
+    """LRU-кэш настроек серверов с учетом попаданий и промахов
+
+    Кэш заполняется при первом обращении и обновляется методами записи
+    (write-through), поэтому повторные проверки не обращаются к базе.
+    """
+
+    def __init__(self, max_guilds=10000):
+        self.max_guilds = max_guilds
+        self.configs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, guild_id):
+        """Настройки из кэша или None"""
+        config = self.configs.get(guild_id)
+        if config is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.configs.move_to_end(guild_id)
+        return config
+
+    def peek(self, guild_id):
+        """Настройки из кэша без учета статистики и порядка LRU"""
+        return self.configs.get(guild_id)
+
+    def put(self, guild_id, config):
+        """Сохранение настроек с вытеснением давно не используемых серверов"""
+        self.configs[guild_id] = config
+        self.configs.move_to_end(guild_id)
+        while len(self.configs) > self.max_guilds:
+            self.configs.popitem(last=False)
+            self.evictions += 1
+        return config
+
+    def invalidate(self, guild_id=None):
+        """Сброс настроек сервера (или всего кэша)"""
+        if guild_id is None:
+            self.configs.clear()
+        else:
+            self.configs.pop(guild_id, None)
+
+    # Write-through обновления после успешной записи в базу
+    def set_protection_status(self, guild_id, status):
+        config = self.peek(guild_id)
+        if config is not None:
+            config.protection_enabled = bool(status)
+
+    def set_action_limits(self, guild_id, limits):
+        config = self.peek(guild_id)
+        if config is not None:
+            config.limits.update(limits)
+            config.invalidate_policy()
+
+    def set_policy_rule(self, guild_id, family, window, limit):
+        config = self.peek(guild_id)
+        if config is not None:
+            config.policy_rules[(family, window)] = limit
+            config.invalidate_policy()
+
+    def remove_policy_rule(self, guild_id, family, window):
+        config = self.peek(guild_id)
+        if config is not None:
+            config.policy_rules.pop((family, window), None)
+            config.invalidate_policy()
+
+    def add_trusted_user(self, guild_id, user_id):
+        config = self.peek(guild_id)
+        if config is not None:
+            config.trusted_users.add(user_id)
+
+    def remove_trusted_user(self, guild_id, user_id):
+        config = self.peek(guild_id)
+        if config is not None:
+            config.trusted_users.discard(user_id)
+
+    def add_trusted_users(self, guild_id, user_ids):
+        config = self.peek(guild_id)
+        if config is not None:
+            config.trusted_users.update(user_ids)
+
+    def remove_trusted_users(self, guild_id, user_ids):
+        config = self.peek(guild_id)
+        if config is not None:
+            config.trusted_users.difference_update(user_ids)
+
+    def stats(self):
+        """Статистика кэша для мониторинга"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self.configs),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self):
+        return len(self.configs)
@@ -0,0 +1,113 @@
+import csv
+import json
+
+from actions import DEFAULT_LIMITS
+from policy import validate_rule
+
+# Экспорт и импорт настроек сервера построчно: статус защиты, лимиты,
+# правила политики и доверенные лица. Файлы читаются и пишутся потоком,
+# поэтому размер списка доверенных лиц не влияет на память.
+#
+# Строка настроек — (раздел, ключ, значение):
+#   protection, enabled, 1
+#   limit, role_limit, 5
+#   policy, role:10, 3          (семейство:окно в секундах, лимит)
+#   trusted, 123456789012345678,
+# CSV — с заголовком section,key,value; JSON — JSON Lines, по объекту
+# {"section": ..., "key": ..., "value": ...} на строку.
+
+FORMATS = ("csv", "jsonl")
+SECTIONS = ("protection", "limit", "policy", "trusted")
+CSV_HEADER = ("section", "key", "value")
+
+
+def format_for(filename):
+    """Формат файла по расширению; ValueError для неизвестного"""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension == "json":
+        extension = "jsonl"
+    if extension not in FORMATS:
+        raise ValueError(f"Неизвестный формат файла: {filename} (поддерживаются .csv и .jsonl)")
+    return extension
+
+
+def write_rows(rows, file, fmt):
+    """Запись строк настроек в открытый текстовый файл; возвращает число строк"""
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for section, key, value in rows:
+            file.write(json.dumps({"section": section, "key": key, "value": value}, ensure_ascii=False))
+            file.write("\n")
+            count += 1
+    return count
+
+
+def read_rows(file, fmt):
+    """Строки настроек из открытого текстового файла с проверкой значений
+
+    Генератор: ValueError с номером строки при первой ошибке.
+    """
+    if fmt == "csv":
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        if tuple(column.strip().lower() for column in header) != CSV_HEADER:
+            raise ValueError("Строка 1: ожидался заголовок section,key,value")
+        records = ((reader.line_num, row) for row in reader)
+    else:
+        records = _json_records(file)
+    for line, row in records:
+        if not row:
+            continue
+        try:
+            yield parse_row(row)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Строка {line}: {e}") from None
+
+
+def _json_records(file):
+    for line, text in enumerate(file, 1):
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"Строка {line}: {e}") from None
+        if not isinstance(record, dict):
+            raise ValueError(f"Строка {line}: ожидался объект")
+        yield line, (record.get("section"), record.get("key"), record.get("value"))
+
+
+def parse_row(row):
+    """Проверенная строка: (раздел, ключ, значение) с типами Python"""
+    if len(row) < 2:
+        raise ValueError("ожидались раздел, ключ и значение")
+    section, key = str(row[0]).strip(), str(row[1]).strip()
+    value = row[2] if len(row) > 2 else None
+    if section == "trusted":
+        return section, int(key), None
+    if section == "protection":
+        if key != "enabled":
+            raise ValueError(f"неизвестный параметр защиты: {key}")
+        return section, key, str(value).strip().lower() in ("1", "true", "yes")
+    if section == "limit":
+        if key not in DEFAULT_LIMITS:
+            raise ValueError(f"неизвестный лимит: {key}")
+        limit = int(value)
+        if limit < 1:
+            raise ValueError("лимит должен быть положительным")
+        return section, key, limit
+    if section == "policy":
+        family, _, window = key.partition(":")
+        rule = (family, int(window), int(value))
+        validate_rule(*rule)
+        return section, rule, None
+    raise ValueError(f"неизвестный раздел: {section} (ожидались {', '.join(SECTIONS)})")
@@ -0,0 +1,136 @@
+import time
+from array import array
+from actions import ACTION_CODES, ACTION_TYPES
+from policy import HORIZON
+
+
+class ActionTimeline:
+    """История действий одного пользователя на сервере
+
+    Отметки времени и коды семейств хранятся в двух компактных массивах
+    (array), упорядоченных по времени, — в этом виде их разбирает
+    CompiledPolicy.evaluate за один проход.
+    """
+    __slots__ = ("timestamps", "codes")
+
+    def __init__(self):
+        self.timestamps = array("d")
+        self.codes = array("b")
+
+    def add(self, ts, code):
+        timestamps = self.timestamps
+        if not timestamps or ts >= timestamps[-1]:
+            timestamps.append(ts)
+            self.codes.append(code)
+            return
+        # Действие пришло с опозданием — вставляем с сохранением порядка
+        low, high = 0, len(timestamps)
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[middle] <= ts:
+                low = middle + 1
+            else:
+                high = middle
+        timestamps.insert(low, ts)
+        self.codes.insert(low, code)
+
+    def trim(self, threshold):
+        """Удаление действий старше threshold"""
+        timestamps = self.timestamps
+        if not timestamps or timestamps[0] >= threshold:
+            return
+        cut = 0
+        while cut < len(timestamps) and timestamps[cut] < threshold:
+            cut += 1
+        del timestamps[:cut]
+        del self.codes[:cut]
+
+    @property
+    def last_seen(self):
+        return self.timestamps[-1] if self.timestamps else 0.0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class TimelineStore:
+    """Истории действий по (сервер, пользователь) в памяти
+
+    Хранится horizon секунд истории — окно самого длинного правила
+    политики. Пользователи без действий дольше horizon удаляются
+    периодической очисткой.
+    """
+
+    def __init__(self, horizon=HORIZON, sweep_interval=600):
+        self.horizon = horizon
+        self.sweep_interval = sweep_interval
+        self.timelines = {}
+        self._last_sweep = time.time()
+
+    def record(self, guild_id, user_id, action_type, ts=None):
+        """Учет действия; возвращает историю пользователя"""
+        now = time.time() if ts is None else ts
+        key = (guild_id, user_id)
+        timeline = self.timelines.get(key)
+        if timeline is None:
+            timeline = self.timelines[key] = ActionTimeline()
+        timeline.add(now, ACTION_CODES[action_type])
+        if len(timeline) > 64:
+            timeline.trim(now - self.horizon)
+
+        if now - self._last_sweep >= self.sweep_interval:
+            self.evict_idle(now)
+        return timeline
+
+    def timeline(self, guild_id, user_id, now=None):
+        """История пользователя за horizon секунд (или None)"""
+        timeline = self.timelines.get((guild_id, user_id))
+        if timeline is not None:
+            timeline.trim((time.time() if now is None else now) - self.horizon)
+        return timeline
+
+    def evict_idle(self, now=None):
+        """Удаление пользователей без действий дольше horizon"""
+        now = time.time() if now is None else now
+        threshold = now - self.horizon
+        idle = [key for key, timeline in self.timelines.items() if timeline.last_seen < threshold]
+        for key in idle:
+            del self.timelines[key]
+        self._last_sweep = now
+        return len(idle)
+
+    def load_actions(self, rows):
+        """Восстановление историй из строк user_actions при запуске
+
+        rows — результат Database.get_recent_actions(hours=horizon / 3600)
+        """
+        loaded = 0
+        for guild_id, user_id, action_type, ts in rows:
+            if action_type in ACTION_CODES:
+                self.record(guild_id, user_id, action_type, ts=ts)
+                loaded += 1
+        return loaded
+
+    def load_records(self, records):
+        """Восстановление историй из журнала событий (journal.py)
+
+        records — (guild_id, user_id, время, код типа действия) в порядке
+        записи; действия добавляются напрямую, без очистки на каждом шаге.
+        """
+        family_codes = [ACTION_CODES[action_type] for action_type in ACTION_TYPES]
+        known = len(family_codes)
+        timelines = self.timelines
+        loaded = 0
+        for guild_id, user_id, ts, code in records:
+            if code >= known:
+                continue
+            key = (guild_id, user_id)
+            timeline = timelines.get(key)
+            if timeline is None:
+                timeline = timelines[key] = ActionTimeline()
+            timeline.add(ts, family_codes[code])
+            loaded += 1
+        return loaded
+
+    def __len__(self):
+        return len(self.timelines)
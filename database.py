@@ -1,75 +1,55 @@
 import sqlite3
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+import logging
+from collections import deque
+from actions import DEFAULT_LIMITS
+from migrations import apply_migrations
+from policy import validate_rule
+from config_io import read_rows, write_rows
+
+logger = logging.getLogger(__name__)
 
 class Database:
-    def __init__(self, db_path='database.db'):
+    def __init__(self, db_path='database.db', check_same_thread=True, readonly=False):
         self.db_path = db_path
+        self.check_same_thread = check_same_thread
+        self.readonly = readonly
         self.connection = None
         self.cursor = None
+        # Очередь отложенной записи действий (ActionLogQueue), если подключена
+        self.action_queue = None
+        self._vacuum_warned = False
         self.connect()
-        self.create_tables()
+        if not readonly:
+            self.create_tables()
     
     def connect(self):
         try:
-            self.connection = sqlite3.connect(self.db_path)
+            if self.readonly:
+                # Соединение только для чтения (для пула читателей)
+                self.connection = sqlite3.connect(
+                    f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=self.check_same_thread
+                )
+            else:
+                self.connection = sqlite3.connect(self.db_path, check_same_thread=self.check_same_thread)
+                # WAL позволяет читать параллельно с записью
+                # Для новой базы включаем инкрементальный VACUUM (до создания таблиц)
+                self.connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("PRAGMA busy_timeout=5000")
             self.cursor = self.connection.cursor()
         except sqlite3.Error as e:
-            print(f"Ошибка подключения к базе данных: {e}")
+            logger.error("Ошибка подключения к базе данных: %s", e)
     
     def create_tables(self):
+        """Создание таблиц и применение миграций схемы"""
         try:
-            # Таблица для хранения состояния защиты (вкл/выкл)
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS protection_status (
-                guild_id INTEGER PRIMARY KEY,
-                is_enabled INTEGER DEFAULT 0
-            )
-            ''')
-            
-            # Таблица для хранения лимитов действий
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS action_limits (
-                guild_id INTEGER PRIMARY KEY,
-                role_limit INTEGER DEFAULT 5,
-                channel_limit INTEGER DEFAULT 5
-            )
-            ''')
-            
-            # Таблица для хранения доверенных лиц
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trusted_users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER,
-                user_id INTEGER,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(guild_id, user_id)
-            )
-            ''')
-            
-            # Таблица для отслеживания действий пользователей
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_actions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER,
-                user_id INTEGER,
-                action_type TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-            
-            # Таблица для хранения изображений серверов
-            self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS server_images (
-                guild_id INTEGER PRIMARY KEY,
-                image_url TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-            
-            self.connection.commit()
+            apply_migrations(self.connection)
         except sqlite3.Error as e:
-            print(f"Ошибка создания таблиц: {e}")
+            logger.error("Ошибка создания таблиц: %s", e)
     
     def close(self):
         """Закрытие соединения с базой данных"""
@@ -90,7 +70,7 @@ class Database:
                 self.connection.commit()
                 return False
         except sqlite3.Error as e:
-            print(f"Ошибка получения статуса защиты: {e}")
+            logger.error("Ошибка получения статуса защиты: %s", e)
             return False
     
     def set_protection_status(self, guild_id, status):
@@ -103,40 +83,51 @@ class Database:
             self.connection.commit()
             return True
         except sqlite3.Error as e:
-            print(f"Ошибка установки статуса защиты: {e}")
+            logger.error("Ошибка установки статуса защиты: %s", e)
             return False
     
     # Методы для работы с лимитами действий
     def get_action_limits(self, guild_id):
         """Получение лимитов действий для сервера"""
+        columns = ", ".join(DEFAULT_LIMITS)
         try:
-            self.cursor.execute("SELECT role_limit, channel_limit FROM action_limits WHERE guild_id = ?", (guild_id,))
+            self.cursor.execute(f"SELECT {columns} FROM action_limits WHERE guild_id = ?", (guild_id,))
             result = self.cursor.fetchone()
             if result:
-                return {"role_limit": result[0], "channel_limit": result[1]}
+                return dict(zip(DEFAULT_LIMITS, result))
             else:
                 # Если записи нет, создаем со значениями по умолчанию
-                self.cursor.execute(
-                    "INSERT INTO action_limits (guild_id, role_limit, channel_limit) VALUES (?, 5, 5)",
-                    (guild_id,)
-                )
+                self.cursor.execute("INSERT INTO action_limits (guild_id) VALUES (?)", (guild_id,))
                 self.connection.commit()
-                return {"role_limit": 5, "channel_limit": 5}
+                return dict(DEFAULT_LIMITS)
         except sqlite3.Error as e:
-            print(f"Ошибка получения лимитов действий: {e}")
-            return {"role_limit": 5, "channel_limit": 5}
+            logger.error("Ошибка получения лимитов действий: %s", e)
+            return dict(DEFAULT_LIMITS)
     
-    def set_action_limits(self, guild_id, role_limit, channel_limit):
-        """Установка лимитов действий для сервера"""
+    def set_action_limits(self, guild_id, role_limit, channel_limit, **extra_limits):
+        """Установка лимитов действий для сервера
+
+        Дополнительные лимиты передаются по имени колонки, например ban_limit=2.
+        """
+        limits = {"role_limit": role_limit, "channel_limit": channel_limit, **extra_limits}
+        unknown = set(limits) - set(DEFAULT_LIMITS)
+        if unknown:
+            raise ValueError(f"Неизвестные лимиты: {', '.join(sorted(unknown))}")
+        columns = ", ".join(limits)
+        placeholders = ", ".join("?" for _ in limits)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in limits)
         try:
             self.cursor.execute(
-                "INSERT OR REPLACE INTO action_limits (guild_id, role_limit, channel_limit) VALUES (?, ?, ?)",
-                (guild_id, role_limit, channel_limit)
+                f"""
+                INSERT INTO action_limits (guild_id, {columns}) VALUES (?, {placeholders})
+                ON CONFLICT (guild_id) DO UPDATE SET {updates}
+                """,
+                (guild_id, *limits.values())
             )
             self.connection.commit()
             return True
         except sqlite3.Error as e:
-            print(f"Ошибка установки лимитов действий: {e}")
+            logger.error("Ошибка установки лимитов действий: %s", e)
             return False
     
     # Методы для работы с доверенными лицами
@@ -150,7 +141,7 @@ class Database:
             self.connection.commit()
             return self.cursor.rowcount > 0
         except sqlite3.Error as e:
-            print(f"Ошибка добавления доверенного лица: {e}")
+            logger.error("Ошибка добавления доверенного лица: %s", e)
             return False
     
     def remove_trusted_user(self, guild_id, user_id):
@@ -163,7 +154,7 @@ class Database:
             self.connection.commit()
             return self.cursor.rowcount > 0
         except sqlite3.Error as e:
-            print(f"Ошибка удаления доверенного лица: {e}")
+            logger.error("Ошибка удаления доверенного лица: %s", e)
             return False
     
     def is_trusted_user(self, guild_id, user_id):
@@ -175,7 +166,7 @@ class Database:
             )
             return self.cursor.fetchone() is not None
         except sqlite3.Error as e:
-            print(f"Ошибка проверки доверенного лица: {e}")
+            logger.error("Ошибка проверки доверенного лица: %s", e)
             return False
     
     def get_trusted_users(self, guild_id):
@@ -187,12 +178,268 @@ class Database:
             )
             return [row[0] for row in self.cursor.fetchall()]
         except sqlite3.Error as e:
-            print(f"Ошибка получения списка доверенных лиц: {e}")
+            logger.error("Ошибка получения списка доверенных лиц: %s", e)
             return []
+
+    def get_trusted_users_page(self, guild_id, after=0, limit=25):
+        """Страница доверенных лиц: до limit ID больше after по возрастанию
+
+        Keyset-пагинация по индексу UNIQUE(guild_id, user_id): следующая
+        страница начинается после последнего ID текущей, без OFFSET.
+        """
+        try:
+            self.cursor.execute(
+                "SELECT user_id FROM trusted_users WHERE guild_id = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+                (guild_id, after, limit)
+            )
+            return [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения страницы доверенных лиц: %s", e)
+            return []
+    
+    def add_trusted_users(self, guild_id, user_ids):
+        """Добавление многих доверенных лиц одной транзакцией; возвращает число добавленных"""
+        try:
+            before = self.connection.total_changes
+            with self.connection:
+                self.cursor.executemany(
+                    "INSERT OR IGNORE INTO trusted_users (guild_id, user_id) VALUES (?, ?)",
+                    ((guild_id, user_id) for user_id in user_ids)
+                )
+            return self.connection.total_changes - before
+        except sqlite3.Error as e:
+            logger.error("Ошибка массового добавления доверенных лиц: %s", e)
+            return 0
+
+    def remove_trusted_users(self, guild_id, user_ids):
+        """Удаление многих доверенных лиц одной транзакцией; возвращает число удаленных"""
+        try:
+            before = self.connection.total_changes
+            with self.connection:
+                self.cursor.executemany(
+                    "DELETE FROM trusted_users WHERE guild_id = ? AND user_id = ?",
+                    ((guild_id, user_id) for user_id in user_ids)
+                )
+            return self.connection.total_changes - before
+        except sqlite3.Error as e:
+            logger.error("Ошибка массового удаления доверенных лиц: %s", e)
+            return 0
+
+    def iter_trusted_users(self, guild_id, chunk_size=1000):
+        """Все доверенные лица сервера страницами по chunk_size (без загрузки списка целиком)"""
+        after = 0
+        while True:
+            page = self.get_trusted_users_page(guild_id, after, chunk_size)
+            yield from page
+            if len(page) < chunk_size:
+                return
+            after = page[-1]
+
+    # Экспорт и импорт настроек сервера (формат — в config_io.py)
+    def export_config(self, guild_id, path, fmt="csv"):
+        """Запись настроек сервера в файл; возвращает число строк
+
+        Выполняется на соединении только для чтения, поэтому настройки
+        читаются простыми SELECT: для сервера без записей — значения по умолчанию.
+        """
+        def rows():
+            self.cursor.execute("SELECT is_enabled FROM protection_status WHERE guild_id = ?", (guild_id,))
+            status = self.cursor.fetchone()
+            yield "protection", "enabled", int(status[0]) if status else 0
+            self.cursor.execute(f"SELECT {', '.join(DEFAULT_LIMITS)} FROM action_limits WHERE guild_id = ?", (guild_id,))
+            limits = self.cursor.fetchone()
+            for key, value in (dict(zip(DEFAULT_LIMITS, limits)) if limits else DEFAULT_LIMITS).items():
+                yield "limit", key, value
+            for (family, window), limit in sorted(self.get_policy_rules(guild_id).items()):
+                yield "policy", f"{family}:{window}", limit
+            for user_id in self.iter_trusted_users(guild_id):
+                yield "trusted", user_id, ""
+
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            return write_rows(rows(), file, fmt)
+
+    def import_config(self, guild_id, path, fmt="csv", replace=False, chunk_size=1000):
+        """Импорт настроек сервера из файла одной транзакцией
+
+        replace=True заменяет правила политики и список доверенных лиц,
+        иначе они дополняются. Доверенные лица записываются пачками по
+        chunk_size. При ошибке в файле или в базе ничего не меняется (ValueError).
+        Возвращает число импортированных строк по разделам.
+        """
+        counts = {"protection": 0, "limit": 0, "policy": 0, "trusted": 0}
+        trusted = []
+
+        def flush_trusted():
+            self.cursor.executemany(
+                "INSERT OR IGNORE INTO trusted_users (guild_id, user_id) VALUES (?, ?)",
+                ((guild_id, user_id) for user_id in trusted)
+            )
+            trusted.clear()
+
+        try:
+            with open(path, encoding="utf-8", newline="") as file, self.connection:
+                if replace:
+                    self.cursor.execute("DELETE FROM trusted_users WHERE guild_id = ?", (guild_id,))
+                    self.cursor.execute("DELETE FROM policy_rules WHERE guild_id = ?", (guild_id,))
+                for section, key, value in read_rows(file, fmt):
+                    counts[section] += 1
+                    if section == "trusted":
+                        trusted.append(key)
+                        if len(trusted) >= chunk_size:
+                            flush_trusted()
+                    elif section == "protection":
+                        self.cursor.execute(
+                            """
+                            INSERT INTO protection_status (guild_id, is_enabled) VALUES (?, ?)
+                            ON CONFLICT (guild_id) DO UPDATE SET is_enabled = excluded.is_enabled
+                            """,
+                            (guild_id, int(value))
+                        )
+                    elif section == "limit":
+                        self.cursor.execute(
+                            f"""
+                            INSERT INTO action_limits (guild_id, {key}) VALUES (?, ?)
+                            ON CONFLICT (guild_id) DO UPDATE SET {key} = excluded.{key}
+                            """,
+                            (guild_id, value)
+                        )
+                    else:
+                        self.cursor.execute(
+                            """
+                            INSERT INTO policy_rules (guild_id, family, window_seconds, max_actions) VALUES (?, ?, ?, ?)
+                            ON CONFLICT(guild_id, family, window_seconds) DO UPDATE SET max_actions = excluded.max_actions
+                            """,
+                            (guild_id, *key)
+                        )
+                if trusted:
+                    flush_trusted()
+        except sqlite3.Error as e:
+            # Транзакция откатана: настройки не изменены
+            logger.error("Ошибка импорта настроек: %s", e)
+            raise ValueError("Ошибка базы данных, попробуйте позже.")
+        return counts
+
+    # Методы для работы с правилами политики обнаружения
+    def get_policy_rules(self, guild_id):
+        """Правила сервера: {(семейство, окно в секундах): лимит}"""
+        try:
+            self.cursor.execute(
+                "SELECT family, window_seconds, max_actions FROM policy_rules WHERE guild_id = ?",
+                (guild_id,)
+            )
+            return {(family, window): limit for family, window, limit in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения правил политики: %s", e)
+            return {}
+
+    def set_policy_rule(self, guild_id, family, window, limit):
+        """Установка правила сервера (лимит 0 отключает правило)"""
+        validate_rule(family, window, limit)
+        try:
+            self.cursor.execute(
+                """
+                INSERT INTO policy_rules (guild_id, family, window_seconds, max_actions) VALUES (?, ?, ?, ?)
+                ON CONFLICT(guild_id, family, window_seconds) DO UPDATE SET max_actions = excluded.max_actions
+                """,
+                (guild_id, family, window, limit)
+            )
+            self.connection.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error("Ошибка установки правила политики: %s", e)
+            return False
+
+    def remove_policy_rule(self, guild_id, family, window):
+        """Возврат к правилу по умолчанию"""
+        try:
+            self.cursor.execute(
+                "DELETE FROM policy_rules WHERE guild_id = ? AND family = ? AND window_seconds = ?",
+                (guild_id, family, window)
+            )
+            self.connection.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error("Ошибка удаления правила политики: %s", e)
+            return False
+
+    def get_guild_config(self, guild_id):
+        """Получение всех настроек сервера за одно обращение"""
+        return {
+            "protection_enabled": self.get_protection_status(guild_id),
+            "limits": self.get_action_limits(guild_id),
+            "trusted_users": self.get_trusted_users(guild_id),
+            "policy_rules": self.get_policy_rules(guild_id),
+        }
+    
+    def get_protected_guild_configs(self, limit=10000, shard_count=None, shard_ids=None):
+        """Настройки серверов с включенной защитой (до limit) для прогрева кэша
+
+        {guild_id: настройки как в get_guild_config}; вместо четырех запросов
+        на сервер — по одному запросу на таблицу для пачки серверов. При
+        shard_count берутся только серверы шардов shard_ids. Недостающие
+        записи не создаются: для них подставляются значения по умолчанию.
+        """
+        query = "SELECT guild_id FROM protection_status WHERE is_enabled = 1"
+        params = []
+        if shard_count and shard_ids is not None:
+            query += f" AND (guild_id >> 22) % ? IN ({', '.join('?' * len(shard_ids))})"
+            params += [shard_count, *shard_ids]
+        query += " ORDER BY guild_id LIMIT ?"
+        params.append(limit)
+        columns = ", ".join(DEFAULT_LIMITS)
+        try:
+            self.cursor.execute(query, params)
+            configs = {
+                guild_id: {"protection_enabled": True, "limits": dict(DEFAULT_LIMITS), "trusted_users": [], "policy_rules": {}}
+                for (guild_id,) in self.cursor.fetchall()
+            }
+            guild_ids = list(configs)
+            for start in range(0, len(guild_ids), 500):
+                chunk = guild_ids[start:start + 500]
+                marks = ", ".join("?" * len(chunk))
+                self.cursor.execute(f"SELECT guild_id, {columns} FROM action_limits WHERE guild_id IN ({marks})", chunk)
+                for guild_id, *limits in self.cursor.fetchall():
+                    configs[guild_id]["limits"] = dict(zip(DEFAULT_LIMITS, limits))
+                self.cursor.execute(f"SELECT guild_id, user_id FROM trusted_users WHERE guild_id IN ({marks})", chunk)
+                for guild_id, user_id in self.cursor.fetchall():
+                    configs[guild_id]["trusted_users"].append(user_id)
+                self.cursor.execute(
+                    f"SELECT guild_id, family, window_seconds, max_actions FROM policy_rules WHERE guild_id IN ({marks})", chunk
+                )
+                for guild_id, family, window, limit in self.cursor.fetchall():
+                    configs[guild_id]["policy_rules"][(family, window)] = limit
+            return configs
+        except sqlite3.Error as e:
+            logger.error("Ошибка загрузки настроек защищенных серверов: %s", e)
+            return {}
+
+    # Служебные значения бота
+    def get_meta(self, key):
+        """Значение из bot_meta или None"""
+        try:
+            self.cursor.execute("SELECT value FROM bot_meta WHERE key = ?", (key,))
+            result = self.cursor.fetchone()
+            return result[0] if result else None
+        except sqlite3.Error as e:
+            logger.error("Ошибка чтения служебного значения %s: %s", key, e)
+            return None
+
+    def set_meta(self, key, value):
+        """Запись значения в bot_meta"""
+        try:
+            self.cursor.execute("INSERT OR REPLACE INTO bot_meta (key, value) VALUES (?, ?)", (key, value))
+            self.connection.commit()
+            return True
+        except sqlite3.Error as e:
+            logger.error("Ошибка записи служебного значения %s: %s", key, e)
+            return False
     
     # Методы для работы с действиями пользователей
     def log_action(self, guild_id, user_id, action_type):
         """Логирование действия пользователя"""
+        if self.action_queue is not None:
+            self.action_queue.put(guild_id, user_id, action_type)
+            return True
         try:
             self.cursor.execute(
                 "INSERT INTO user_actions (guild_id, user_id, action_type) VALUES (?, ?, ?)",
@@ -201,13 +448,30 @@ class Database:
             self.connection.commit()
             return True
         except sqlite3.Error as e:
-            print(f"Ошибка логирования действия: {e}")
+            logger.error("Ошибка логирования действия: %s", e)
+            return False
+    
+    def log_actions(self, records):
+        """Пакетная запись действий одной транзакцией
+
+        records — последовательность (guild_id, user_id, action_type, timestamp),
+        где timestamp — секунды Unix
+        """
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO user_actions (guild_id, user_id, action_type, timestamp) VALUES (?, ?, ?, ?)",
+                    records
+                )
+            return True
+        except sqlite3.Error as e:
+            logger.error("Ошибка пакетной записи действий: %s", e)
             return False
     
     def count_user_actions(self, guild_id, user_id, action_type, hours=24):
         """Подсчет количества действий пользователя за указанный период"""
         try:
-            time_threshold = (datetime.now() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+            time_threshold = int(time.time() - hours * 3600)
             self.cursor.execute(
                 """
                 SELECT COUNT(*) FROM user_actions 
@@ -217,9 +481,132 @@ class Database:
             )
             return self.cursor.fetchone()[0]
         except sqlite3.Error as e:
-            print(f"Ошибка подсчета действий пользователя: {e}")
+            logger.error("Ошибка подсчета действий пользователя: %s", e)
+            return 0
+
+    def count_family_actions(self, guild_id, user_id, action_types, hours=24):
+        """Подсчет действий нескольких типов (одного семейства) за период"""
+        try:
+            time_threshold = int(time.time() - hours * 3600)
+            placeholders = ", ".join("?" for _ in action_types)
+            self.cursor.execute(
+                f"""
+                SELECT COUNT(*) FROM user_actions
+                WHERE guild_id = ? AND user_id = ? AND action_type IN ({placeholders}) AND timestamp > ?
+                """,
+                (guild_id, user_id, *action_types, time_threshold)
+            )
+            return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error("Ошибка подсчета действий пользователя: %s", e)
+            return 0
+    
+    def get_user_actions(self, guild_id, user_id, since):
+        """Действия пользователя с момента since по возрастанию времени
+
+        Возвращает [(timestamp, action_type)] — историю для оценки политики.
+        """
+        try:
+            self.cursor.execute(
+                """
+                SELECT timestamp, action_type FROM user_actions
+                WHERE guild_id = ? AND user_id = ? AND timestamp >= ?
+                ORDER BY timestamp
+                """,
+                (guild_id, user_id, int(since))
+            )
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения истории пользователя: %s", e)
+            return []
+
+    def get_recent_actions(self, hours=24):
+        """Получение действий за период для восстановления счетчиков"""
+        try:
+            self.cursor.execute(
+                """
+                SELECT guild_id, user_id, action_type, timestamp
+                FROM user_actions
+                WHERE timestamp > ?
+                ORDER BY timestamp
+                """,
+                (int(time.time() - hours * 3600),)
+            )
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения последних действий: %s", e)
+            return []
+
+    # Методы для хранения и сжатия журнала действий
+    def purge_actions_chunk(self, before, chunk_size=500):
+        """Перенос порции действий старше before в суточные агрегаты и удаление
+
+        Возвращает число удаленных строк. Порция небольшая, чтобы
+        транзакция не удерживала блокировку записи надолго.
+        """
+        chunk = "SELECT id FROM user_actions WHERE timestamp < ? ORDER BY timestamp LIMIT ?"
+        try:
+            with self.connection:
+                self.connection.execute(
+                    f"""
+                    INSERT INTO user_actions_daily (guild_id, day, user_id, action_type, count)
+                    SELECT guild_id, timestamp / 86400, user_id, action_type, COUNT(*)
+                    FROM user_actions WHERE id IN ({chunk})
+                    GROUP BY guild_id, timestamp / 86400, user_id, action_type
+                    ON CONFLICT (guild_id, day, user_id, action_type)
+                    DO UPDATE SET count = count + excluded.count
+                    """,
+                    (before, chunk_size)
+                )
+                deleted = self.connection.execute(
+                    f"DELETE FROM user_actions WHERE id IN ({chunk})",
+                    (before, chunk_size)
+                ).rowcount
+            return deleted
+        except sqlite3.Error as e:
+            logger.error("Ошибка очистки журнала действий: %s", e)
             return 0
     
+    def incremental_vacuum(self, pages=1000):
+        """Освобождение до pages свободных страниц файла базы
+
+        Для базы, созданной без auto_vacuum=INCREMENTAL, ничего не делает:
+        режим включается отдельным шагом (migrations.enable_incremental_vacuum).
+        """
+        try:
+            if self.connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                if not self._vacuum_warned:
+                    self._vacuum_warned = True
+                    logger.warning(
+                        "База %s создана без auto_vacuum=INCREMENTAL: место не освобождается. "
+                        "Остановите бота и выполните python migrations.py --incremental-vacuum %s",
+                        self.db_path, self.db_path
+                    )
+                return False
+            self.connection.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            return True
+        except sqlite3.Error as e:
+            logger.error("Ошибка сжатия базы данных: %s", e)
+            return False
+    
+    def get_daily_stats(self, guild_id, days=30):
+        """Суточная статистика действий сервера по типам"""
+        try:
+            since = int(time.time()) // 86400 - days
+            self.cursor.execute(
+                """
+                SELECT day, action_type, SUM(count) FROM user_actions_daily
+                WHERE guild_id = ? AND day > ?
+                GROUP BY day, action_type
+                ORDER BY day
+                """,
+                (guild_id, since)
+            )
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения статистики действий: %s", e)
+            return []
+    
     # Методы для работы с изображениями серверов
     def set_server_image(self, guild_id, image_url):
         """Установка изображения для сервера"""
@@ -234,7 +621,7 @@ class Database:
             self.connection.commit()
             return True
         except sqlite3.Error as e:
-            print(f"Ошибка установки изображения сервера: {e}")
+            logger.error("Ошибка установки изображения сервера: %s", e)
             return False
     
     def get_server_image(self, guild_id):
@@ -247,5 +634,92 @@ class Database:
             result = self.cursor.fetchone()
             return result[0] if result else None
         except sqlite3.Error as e:
-            print(f"Ошибка получения изображения сервера: {e}")
+            logger.error("Ошибка получения изображения сервера: %s", e)
             return None
+
+
+class ActionLogQueue:
+    """Отложенная пакетная запись действий в фоновом потоке
+
+    put() не блокирует цикл событий: запись попадает в очередь и
+    сбрасывается в базу пачками через write_batch (executemany в одной
+    транзакции) — по достижении flush_size или раз в flush_interval секунд.
+    """
+
+    def __init__(self, write_batch, flush_size=100, flush_interval=1.0):
+        self.write_batch = write_batch
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue = deque()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.flushed_total = 0
+        self.batches_total = 0
+        self.failed_total = 0
+        self.last_flush_seconds = 0.0
+    
+    def start(self):
+        """Запуск фонового потока записи"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="action-log-writer", daemon=True)
+            self._thread.start()
+    
+    def put(self, guild_id, user_id, action_type, timestamp=None):
+        """Добавление действия в очередь без ожидания записи"""
+        if timestamp is None:
+            timestamp = int(time.time())
+        self.queue.append((guild_id, user_id, action_type, timestamp))
+        if len(self.queue) >= self.flush_size:
+            self._wakeup.set()
+    
+    def flush(self):
+        """Запись всех накопленных действий; возвращает число записанных"""
+        with self._flush_lock:
+            written = 0
+            while self.queue:
+                batch = []
+                while self.queue and len(batch) < self.flush_size:
+                    batch.append(self.queue.popleft())
+                started = time.perf_counter()
+                if self.write_batch(batch):
+                    self.flushed_total += len(batch)
+                    written += len(batch)
+                else:
+                    self.failed_total += len(batch)
+                self.batches_total += 1
+                self.last_flush_seconds = time.perf_counter() - started
+            return written
+    
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Ошибка фоновой записи действий: %s", e)
+    
+    def close(self):
+        """Остановка потока с записью оставшихся действий"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+    
+    @property
+    def depth(self):
+        return len(self.queue)
+    
+    def metrics(self):
+        """Метрики очереди для мониторинга"""
+        return {
+            "queue_depth": len(self.queue),
+            "flushed_total": self.flushed_total,
+            "batches_total": self.batches_total,
+            "failed_total": self.failed_total,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
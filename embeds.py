@@ -0,0 +1,218 @@
+import string
+from datetime import datetime, timezone
+
+import discord
+
+# Шаблоны embed-сообщений бота. Эмодзи подставляются один раз при импорте,
+# значения {полей} — при выводе через str.format; каждый вывод — новый
+# discord.Embed, который можно изменять.
+
+# Константы
+EMBED_COLOR = 0x1E90FF  # Яркий синий цвет для современного вида
+SECONDARY_COLOR = 0x2F3136  # Темный фон для акцентов
+ALERT_COLOR = 0xFF4500  # Оранжевый для предупреждения
+
+# Эмодзи для сообщений
+EMOJI = {
+    "shield": "🛡️",
+    "settings": "⚙️",
+    "warning": "⚠️",
+    "success": "✅",
+    "error": "❌",
+    "info": "ℹ️",
+    "lock": "🔒",
+    "unlock": "🔓",
+    "limit": "📊",
+    "trusted": "👥",
+    "add": "➕",
+    "remove": "➖",
+    "list": "📜",
+    "back": "⬅️",
+    "confirm": "✔️",
+    "cancel": "✖️",
+    "roles": "🎭",
+    "channels": "📣",
+    "alert": "🚨",
+    "time": "🕒",
+    "server": "🏰",
+    "user": "👤",
+    "help": "❓",
+    "image": "🖼️"
+}
+
+_formatter = string.Formatter()
+
+
+def _prepare(text):
+    """Подстановка эмодзи ({e[shield]}) сразу; остальные {поля} остаются для вывода"""
+    if text is None:
+        return None
+    return _formatter.vformat(text, (), _KeepMissing(e=EMOJI))
+
+
+class _KeepMissing(dict):
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def _format(text, values):
+    return text.format_map(values) if text is not None else None
+
+
+class FieldTemplate:
+    """Поле embed: name и value с подстановками"""
+    __slots__ = ("name", "value", "inline")
+
+    def __init__(self, name, value, inline=False):
+        self.name = _prepare(name)
+        self.value = _prepare(value)
+        self.inline = inline
+
+    def render(self, values):
+        """Словарь поля для Embed.add_field"""
+        return {"name": _format(self.name, values), "value": _format(self.value, values), "inline": self.inline}
+
+
+class EmbedTemplate:
+    """Embed с заранее подставленными эмодзи
+
+    Эмодзи записываются как {e[имя]} и подставляются при создании
+    шаблона. render(thumbnail, fields, **значения) каждый раз возвращает
+    новый discord.Embed; fields — дополнительные поля (словари), которые
+    добавляются после полей шаблона.
+    """
+
+    def __init__(self, title, description=None, color=EMBED_COLOR, footer=None, fields=(), timestamp=True):
+        self.title = _prepare(title)
+        self.description = _prepare(description)
+        self.colour = discord.Colour(color)
+        self.footer = footer
+        self.fields = list(fields)
+        self.timestamp = timestamp
+
+    def render(self, thumbnail=None, fields=(), **values):
+        embed = discord.Embed(
+            title=_format(self.title, values),
+            description=_format(self.description, values),
+            colour=self.colour,
+            # Время с часовым поясом: Discord показывает его в поясе читателя
+            timestamp=datetime.now(timezone.utc) if self.timestamp else None
+        )
+        for field in self.fields:
+            embed.add_field(**field.render(values))
+        for field in fields:
+            embed.add_field(**field)
+        if self.footer is not None:
+            embed.set_footer(text=self.footer)
+        if thumbnail is not None:
+            embed.set_thumbnail(url=thumbnail)
+        return embed
+
+
+def guild_icon(guild):
+    """Миниатюра сервера для embed"""
+    return guild.icon.url if guild.icon else ""
+
+
+# Справка: одинакова для всех серверов
+HELP = EmbedTemplate(
+    title="{e[shield]} Anti Raid Bot",
+    description="Система защиты от рейдов и несанкционированных изменений",
+    footer="Anti Raid Bot • Справка",
+    timestamp=False,
+    fields=[
+        FieldTemplate(
+            "{e[info]} Доступные команды",
+            "**{e[help]} /help** - Показать справку\n"
+            "**{e[settings]} /settings** - Настроить защиту (владелец)\n"
+            "**{e[shield]} /status** - Текущий статус защиты\n"
+            "**{e[trusted]} /trusted** - Управление доверенными лицами\n"
+            "**{e[limit]} /policy** - Правила обнаружения (владелец)"
+        ),
+        FieldTemplate(
+            "{e[shield]} Возможности",
+            "**{e[roles]} Контроль ролей**\n"
+            "**{e[channels]} Контроль каналов**\n"
+            "**{e[alert]} Автоматическая защита**\n"
+            "**{e[warning]} Уведомления владельца**"
+        ),
+        FieldTemplate(
+            "{e[warning]} Важно",
+            "Доверенные лица могут обходить защиту.\n"
+            "Добавляйте только проверенных пользователей!"
+        ),
+    ],
+)
+
+_LIMITS_VALUE = (
+    "**{e[roles]} Роли:** {role_limit} действий/24ч\n"
+    "**{e[channels]} Каналы:** {channel_limit} действий/24ч"
+)
+
+# Главное меню /settings (и кнопка «Назад» из доверенных лиц)
+SETTINGS = EmbedTemplate(
+    title="{e[settings]} Настройки защиты",
+    description="Выберите параметр для настройки:",
+    footer="Anti Raid Bot • Настройки",
+    fields=[
+        FieldTemplate("{e[shield]} Статус", "**{status_emoji} Защита {status_text}**"),
+        FieldTemplate("{e[limit]} Лимиты", _LIMITS_VALUE),
+        FieldTemplate("{e[trusted]} Доверенные", "Всего: **{trusted_count}** пользователей"),
+    ],
+)
+
+# /status
+STATUS = EmbedTemplate(
+    title="{e[shield]} Статус защиты",
+    description="**{status_emoji} Защита от рейдов {status_text}**",
+    footer="Anti Raid Bot • Статус",
+    fields=[
+        FieldTemplate("{e[limit]} Ограничения", _LIMITS_VALUE),
+        FieldTemplate("{e[user]} Владелец", "{owner_mention} ({owner_name})"),
+    ],
+)
+
+# Ответ на кнопку «Вкл/Выкл защиту»
+PROTECTION_TOGGLED = EmbedTemplate(
+    title="{e[shield]} Статус защиты",
+    description="**{status_emoji} Защита от рейдов {status_text}**",
+    footer="Anti Raid Bot • Настройки",
+    fields=[
+        FieldTemplate("{e[limit]} Ограничения", _LIMITS_VALUE),
+        FieldTemplate("{e[trusted]} Доверенные лица", "Всего: **{trusted_count}** пользователей"),
+    ],
+)
+
+# Отказ в доступе не-владельцу
+ACCESS_DENIED = EmbedTemplate(
+    title="{e[error]} Ошибка доступа",
+    description="{message}",
+    color=SECONDARY_COLOR,
+    footer="Anti Raid Bot • Ограниченный доступ",
+)
+
+# Уведомление владельцу о рейде (поля нарушений добавляются при выводе)
+RAID_ALERT = EmbedTemplate(
+    title="{e[alert]} Обнаружен рейд!",
+    description="{summary}",
+    color=ALERT_COLOR,
+    footer="Anti Raid Bot • Уведомление",
+)
+
+OFFENCE_FIELD = FieldTemplate(
+    "{e[user]} {name}",
+    "**{type_emoji} Тип:** {action_type}\n"
+    "**{e[limit]} Действий:** {count}\n"
+    "**{e[limit]} Лимит:** {limit}",
+    inline=True,
+)
+
+SERVER_FIELD = FieldTemplate("{e[server]} Сервер", "{guild_name}")
+ACTIONS_FIELD = FieldTemplate("{e[shield]} Действия", "{actions}")
+
+
+def status_values(protection_status):
+    """Эмодзи и текст статуса защиты для шаблонов"""
+    if protection_status:
+        return {"status_emoji": EMOJI['lock'], "status_text": "АКТИВНА"}
+    return {"status_emoji": EMOJI['unlock'], "status_text": "ОТКЛЮЧЕНА"}
@@ -0,0 +1,244 @@
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import logging
+from datetime import datetime, timezone
+
+from actions import ACTION_TYPES, ACTION_TYPE_CODES
+
+logger = logging.getLogger(__name__)
+
+# Журнал событий: каждое учтенное действие дописывается записью
+# фиксированного размера в сегмент, отображенный в память (mmap). Запись —
+# одна упаковка struct в уже выделенную память, без системных вызовов.
+# При запуске счетчики восстанавливаются чтением последних сегментов
+# без копирования (memoryview + struct.iter_unpack), вместо построчной
+# выборки user_actions из SQLite. Тот же журнал выгружается для разбора
+# инцидентов:
+#
+#   python journal.py --dir journal --guild 123456789012345678 --hours 6 --output incident.csv
+#
+# Сегмент — файл <время создания, мс>.seg: заголовок HEADER и записи RECORD.
+# Новый сегмент начинается раз в segment_seconds секунд или при заполнении;
+# закрытый сегмент обрезается до числа записей, сегменты старше
+# retention_hours удаляются. Страницы mmap сохраняются ядром и при падении
+# процесса; flush() — при смене сегмента и при закрытии.
+
+SEGMENT_MAGIC = b"ARJRNL1\0"
+SEGMENT_SUFFIX = ".seg"
+# Сигнатура, вместимость (записей), число записей, время создания, наибольшее время записи
+HEADER = struct.Struct("<8sIIdd")
+# Сервер, пользователь, время (epoch, с), код типа действия (actions.ACTION_TYPE_CODES); 32 байта
+RECORD = struct.Struct("<QQdB7x")
+EXPORT_FIELDS = ("guild_id", "user_id", "action_type", "timestamp", "time")
+
+
+def read_header(path):
+    """Заголовок сегмента (вместимость, записей, создан, наибольшее время) или None"""
+    with open(path, "rb") as file:
+        header = file.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, capacity, count, created_at, max_ts = HEADER.unpack(header)
+    if magic != SEGMENT_MAGIC:
+        return None
+    return capacity, count, created_at, max_ts
+
+
+class EventJournal:
+    """Журнал действий в сегментах фиксированного размера
+
+    Пишет только цикл событий процесса; читать (scan, export) можно
+    одновременно и из другого процесса — число записей в заголовке
+    обновляется после самих записей.
+    """
+
+    def __init__(self, directory, segment_records=1 << 18, segment_seconds=3600, retention_hours=72):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.segment_seconds = segment_seconds
+        self.retention_hours = retention_hours
+        self.appended = 0
+        self._file = None
+        self._map = None
+        self._path = None
+        self._count = 0
+        self._created_at = 0.0
+        self._max_ts = 0.0
+
+    def segments(self):
+        """Пути сегментов по времени создания"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def append(self, guild_id, user_id, action_type, ts):
+        self.append_many(guild_id, ((user_id, action_type, ts),))
+
+    def append_many(self, guild_id, actions):
+        """Запись пачки действий (user_id, action_type, timestamp) одного сервера"""
+        for user_id, action_type, ts in actions:
+            if self._map is None or self._count >= self.segment_records or ts - self._created_at >= self.segment_seconds:
+                self._rotate(ts)
+            RECORD.pack_into(
+                self._map, HEADER.size + self._count * RECORD.size,
+                guild_id, user_id, ts, ACTION_TYPE_CODES[action_type]
+            )
+            self._count += 1
+            if ts > self._max_ts:
+                self._max_ts = ts
+        self.appended += len(actions)
+        if self._map is not None:
+            self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(
+            self._map, 0, SEGMENT_MAGIC, self.segment_records, self._count, self._created_at, self._max_ts
+        )
+
+    def _rotate(self, now):
+        """Закрытие текущего сегмента и создание следующего"""
+        self._close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+        self.prune(now)
+        stamp = int(now * 1000)
+        while os.path.exists(os.path.join(self.directory, f"{stamp:015d}{SEGMENT_SUFFIX}")):
+            stamp += 1
+        path = os.path.join(self.directory, f"{stamp:015d}{SEGMENT_SUFFIX}")
+        size = HEADER.size + self.segment_records * RECORD.size
+        file = open(path, "w+b")
+        # Файл разреженный: место на диске занимают только записанные страницы
+        file.truncate(size)
+        self._file = file
+        self._map = mmap.mmap(file.fileno(), size)
+        self._path = path
+        self._count = 0
+        self._created_at = now
+        self._max_ts = now
+        self._write_header()
+
+    def _close_segment(self):
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map.close()
+        # Пустой сегмент удаляется, заполненный обрезается до последней записи
+        if self._count:
+            self._file.truncate(HEADER.size + self._count * RECORD.size)
+            self._file.close()
+        else:
+            self._file.close()
+            os.remove(self._path)
+        self._file = self._map = self._path = None
+
+    def flush(self):
+        """Запись страниц текущего сегмента на диск"""
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        self._close_segment()
+
+    def prune(self, now=None):
+        """Удаление сегментов старше retention_hours; возвращает число удаленных"""
+        threshold = (time.time() if now is None else now) - self.retention_hours * 3600
+        removed = 0
+        for path in self.segments():
+            if path == self._path:
+                continue
+            header = read_header(path)
+            if header is None or header[3] < threshold:
+                os.remove(path)
+                removed += 1
+        if removed:
+            logger.info("Удалено %s старых сегментов журнала событий", removed)
+        return removed
+
+    def covers(self, since):
+        """Есть ли в журнале все действия начиная с since (первый сегмент создан раньше)"""
+        for path in self.segments():
+            header = read_header(path)
+            if header is not None:
+                return header[2] <= since
+        return False
+
+    def scan(self, since=0.0, until=None, guild_id=None):
+        """Записи (guild_id, user_id, время, код типа действия) в порядке записи
+
+        Сегменты, целиком лежащие вне [since, until], пропускаются по
+        заголовку; записи читаются прямо из отображенного файла. Сегмент,
+        созданный после since, отдается без проверки каждой записи.
+        """
+        for path in self.segments():
+            with open(path, "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                if size < HEADER.size:
+                    continue
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    magic, _, count, created_at, max_ts = HEADER.unpack_from(mapped)
+                    if magic != SEGMENT_MAGIC or max_ts < since or (until is not None and created_at > until):
+                        continue
+                    count = min(count, (size - HEADER.size) // RECORD.size)
+                    view = memoryview(mapped)[HEADER.size:HEADER.size + count * RECORD.size]
+                    records = RECORD.iter_unpack(view)
+                    try:
+                        if created_at >= since and until is None and guild_id is None:
+                            yield from records
+                        else:
+                            for record in records:
+                                if since <= record[2] and (until is None or record[2] <= until) and (
+                                    guild_id is None or record[0] == guild_id
+                                ):
+                                    yield record
+                    finally:
+                        # Отображение нельзя закрыть, пока на него есть ссылки
+                        del records
+                        view.release()
+
+    def export(self, file, fmt="csv", since=0.0, until=None, guild_id=None):
+        """Выгрузка действий в открытый текстовый файл (csv или jsonl); возвращает число записей"""
+        writer = None
+        if fmt == "csv":
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_FIELDS)
+        count = 0
+        for record_guild_id, user_id, ts, code in self.scan(since, until, guild_id):
+            action_type = ACTION_TYPES[code] if code < len(ACTION_TYPES) else str(code)
+            row = (record_guild_id, user_id, action_type, ts, datetime.fromtimestamp(ts, timezone.utc).isoformat())
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                file.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False))
+                file.write("\n")
+            count += 1
+        return count
+
+
+def main():
+    from config_io import format_for
+
+    parser = argparse.ArgumentParser(description="Выгрузка журнала событий для разбора инцидента")
+    parser.add_argument("--dir", default=os.environ.get("BOT_JOURNAL_DIR", "journal"), help="каталог журнала")
+    parser.add_argument("--guild", type=int, default=None, help="ID сервера (по умолчанию все)")
+    parser.add_argument("--hours", type=float, default=24.0, help="за сколько последних часов")
+    parser.add_argument("--output", default=None, help="файл .csv или .jsonl (по умолчанию CSV в stdout)")
+    args = parser.parse_args()
+
+    journal = EventJournal(args.dir)
+    since = time.time() - args.hours * 3600
+    if args.output is None:
+        count = journal.export(sys.stdout, "csv", since=since, guild_id=args.guild)
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as file:
+            count = journal.export(file, format_for(args.output), since=since, guild_id=args.guild)
+    print(f"Выгружено записей: {count}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
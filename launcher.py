@@ -0,0 +1,99 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Запуск бота в нескольких процессах: каждый процесс обслуживает свой
+# диапазон шардов, счетчики и настройки берутся из общего хранилища.
+#
+#   DISCORD_TOKEN=... python launcher.py --shards 16 --processes 4
+
+
+def shard_ranges(shard_count, processes):
+    """Разбиение шардов 0..shard_count-1 на processes почти равных диапазонов"""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def spawn(shard_ids, shard_count, backend, redis_url, metrics_port):
+    env = dict(os.environ)
+    env["BOT_METRICS_PORT"] = str(metrics_port)
+    env["BOT_SHARD_COUNT"] = str(shard_count)
+    env["BOT_SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shard_ids)
+    env["BOT_STATE_BACKEND"] = backend
+    if redis_url:
+        env["BOT_REDIS_URL"] = redis_url
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+    return subprocess.Popen([sys.executable, script], env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запуск Anti Raid Bot в нескольких процессах")
+    parser.add_argument("--shards", type=int, required=True, help="общее число шардов")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument("--backend", choices=("sqlite", "redis"), default="sqlite", help="общее хранилище счетчиков")
+    parser.add_argument("--redis-url", default=None, help="адрес Redis для --backend redis")
+    parser.add_argument("--metrics-port", type=int, default=9108, help="порт метрик первого процесса (0 — отключить)")
+    parser.add_argument("--restart-delay", type=float, default=5.0, help="пауза перед перезапуском упавшего процесса")
+    parser.add_argument("--stop-timeout", type=float, default=30.0, help="сколько ждать штатной остановки процесса")
+    args = parser.parse_args()
+
+    if not os.environ.get("DISCORD_TOKEN"):
+        parser.error("не задана переменная окружения DISCORD_TOKEN")
+    if args.backend == "redis" and not args.redis_url:
+        parser.error("для --backend redis нужен --redis-url")
+
+    ranges = shard_ranges(args.shards, args.processes)
+    # У каждого процесса свой порт метрик: --metrics-port + номер процесса
+    ports = {
+        tuple(shard_ids): args.metrics_port + index if args.metrics_port else 0
+        for index, shard_ids in enumerate(ranges)
+    }
+    workers = {}
+    for shard_ids in ranges:
+        workers[tuple(shard_ids)] = spawn(shard_ids, args.shards, args.backend, args.redis_url, ports[tuple(shard_ids)])
+        print(f"Запущен процесс для шардов {shard_ids}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in workers.values():
+            process.terminate()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while workers:
+        if stopping:
+            # Процессы записывают очереди на диск; зависшие завершаются принудительно
+            for shard_ids, process in workers.items():
+                try:
+                    process.wait(timeout=args.stop_timeout)
+                except subprocess.TimeoutExpired:
+                    print(f"Процесс шардов {list(shard_ids)} не остановился за {args.stop_timeout} с, завершение")
+                    process.kill()
+                    process.wait()
+            break
+        for shard_ids, process in list(workers.items()):
+            code = process.poll()
+            if code is None:
+                continue
+            print(f"Процесс шардов {list(shard_ids)} завершился с кодом {code}, перезапуск")
+            time.sleep(args.restart_delay)
+            workers[shard_ids] = spawn(list(shard_ids), args.shards, args.backend, args.redis_url, ports[shard_ids])
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
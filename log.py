@@ -0,0 +1,121 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+# Структурированное логирование: записи несут поля guild_id, user_id,
+# action_type (через extra=...), форматируются и выводятся в отдельном
+# потоке (QueueHandler + QueueListener), повторяющиеся сообщения
+# ограничиваются фильтром RateLimitFilter.
+
+# Поля записи, которые выводятся в JSON, если заданы через extra
+CONTEXT_FIELDS = ("guild_id", "user_id", "action_type", "family", "window", "count", "limit", "route", "shard_ids")
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            data["suppressed"] = suppressed
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Текстовый формат с полями контекста в конце строки"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        context = " ".join(
+            f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS
+            if getattr(record, field, None) is not None
+        )
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            context += f" suppressed={suppressed}"
+        return f"{line} [{context.strip()}]" if context.strip() else line
+
+
+class RateLimitFilter(logging.Filter):
+    """Не больше burst одинаковых сообщений за period секунд
+
+    Сообщения сравниваются по логгеру, уровню и шаблону (record.msg), поэтому
+    одна и та же ошибка во время рейда не засоряет журнал. Число отброшенных
+    записей добавляется к следующей пропущенной записи (поле suppressed).
+    """
+
+    def __init__(self, burst=10, period=60.0, min_level=logging.DEBUG):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.min_level = min_level
+        self.windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.min_level:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                if len(self.windows) > 10000:
+                    self._forget_old(now)
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+    def _forget_old(self, now):
+        self.windows = {key: window for key, window in self.windows.items() if now - window[0] < self.period}
+
+
+def setup_logging(level=logging.INFO, json_output=False, stream=None, burst=10, period=60.0):
+    """Настройка корневого логгера; возвращает запущенный QueueListener
+
+    В цикле событий запись только кладется в очередь, форматирование
+    и вывод выполняет поток QueueListener. При завершении вызовите
+    listener.stop(), чтобы вывести оставшиеся записи.
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_output else TextFormatter())
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(RateLimitFilter(burst=burst, period=period))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    return listener
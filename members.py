@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+
+# Режим экономии памяти: кэш участников discord.py отключен, участники
+# запрашиваются по ID только когда нужны (нарушители, доверенные лица), а
+# недавно полученные хранятся в небольшом LRU. Так нарушитель, найденный
+# при блокировке ролей, не запрашивается второй раз при снятии ролей.
+
+
+class MemberLRU:
+    """Недавно полученные участники серверов с ограничением числа и времени жизни
+
+    Роли участника могут измениться, поэтому запись живет не дольше ttl
+    секунд; после этого участник запрашивается заново.
+    """
+
+    def __init__(self, capacity=10000, ttl=60.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.members = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, guild_id, user_id):
+        """Участник или None"""
+        key = (guild_id, user_id)
+        item = self.members.get(key)
+        if item is None or time.monotonic() - item[1] > self.ttl:
+            if item is not None:
+                del self.members[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.members.move_to_end(key)
+        return item[0]
+
+    def put(self, member):
+        key = (member.guild.id, member.id)
+        self.members[key] = (member, time.monotonic())
+        self.members.move_to_end(key)
+        while len(self.members) > self.capacity:
+            self.members.popitem(last=False)
+        return member
+
+    def discard(self, guild_id, user_id):
+        self.members.pop((guild_id, user_id), None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.members),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self):
+        return len(self.members)
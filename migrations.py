@@ -0,0 +1,230 @@
+import argparse
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Миграции схемы базы данных. Номер текущей версии хранится в
+# PRAGMA user_version; каждая миграция выполняется в своей транзакции
+# и переводит базу на следующую версию без потери данных.
+
+
+def _create_base_tables(cursor):
+    """Исходные таблицы бота (версия 1.0)"""
+    # Таблица для хранения состояния защиты (вкл/выкл)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS protection_status (
+        guild_id INTEGER PRIMARY KEY,
+        is_enabled INTEGER DEFAULT 0
+    )
+    ''')
+
+    # Таблица для хранения лимитов действий
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS action_limits (
+        guild_id INTEGER PRIMARY KEY,
+        role_limit INTEGER DEFAULT 5,
+        channel_limit INTEGER DEFAULT 5
+    )
+    ''')
+
+    # Таблица для хранения доверенных лиц
+    # (UNIQUE(guild_id, user_id) создает индекс для поиска по серверу и пользователю)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS trusted_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id INTEGER,
+        user_id INTEGER,
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(guild_id, user_id)
+    )
+    ''')
+
+    # Таблица для отслеживания действий пользователей
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_actions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id INTEGER,
+        user_id INTEGER,
+        action_type TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Таблица для хранения изображений серверов
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS server_images (
+        guild_id INTEGER PRIMARY KEY,
+        image_url TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def _epoch_user_actions(cursor):
+    """Перевод user_actions.timestamp в секунды Unix и составные индексы"""
+    cursor.execute('''
+    CREATE TABLE user_actions_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        action_type TEXT NOT NULL,
+        timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+    )
+    ''')
+    # Старые значения — строки CURRENT_TIMESTAMP в UTC
+    cursor.execute('''
+    INSERT INTO user_actions_new (id, guild_id, user_id, action_type, timestamp)
+    SELECT id, guild_id, user_id, action_type,
+           COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+    FROM user_actions
+    ''')
+    cursor.execute("DROP TABLE user_actions")
+    cursor.execute("ALTER TABLE user_actions_new RENAME TO user_actions")
+    # Проверка лимита: сервер + пользователь + тип действия + диапазон времени
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_actions_lookup
+    ON user_actions (guild_id, user_id, action_type, timestamp)
+    ''')
+    # Выборка по времени: восстановление счетчиков и очистка старых записей
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_actions_timestamp
+    ON user_actions (timestamp)
+    ''')
+
+
+def _daily_rollup(cursor):
+    """Таблица суточных агрегатов действий для статистики"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_actions_daily (
+        guild_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        action_type TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, day, user_id, action_type)
+    )
+    ''')
+
+
+def _extra_action_limits(cursor):
+    """Лимиты для вебхуков, банов, киков, эмодзи и изменений прав"""
+    for column, default in (
+        ("webhook_limit", 3),
+        ("ban_limit", 3),
+        ("kick_limit", 3),
+        ("emoji_limit", 10),
+        ("permission_limit", 5),
+    ):
+        cursor.execute(f"ALTER TABLE action_limits ADD COLUMN {column} INTEGER DEFAULT {default}")
+
+
+def _policy_rules(cursor):
+    """Правила политики обнаружения для отдельных серверов"""
+    # Правило заменяет правило по умолчанию с тем же семейством и окном
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS policy_rules (
+        guild_id INTEGER,
+        family TEXT,
+        window_seconds INTEGER,
+        max_actions INTEGER,
+        PRIMARY KEY (guild_id, family, window_seconds)
+    )
+    ''')
+
+
+def _bot_meta(cursor):
+    """Служебные значения бота (хэш дерева команд и т.п.)"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS bot_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+
+
+# Список миграций по порядку: версия схемы = индекс + 1
+MIGRATIONS = [
+    _create_base_tables,
+    _epoch_user_actions,
+    _daily_rollup,
+    _extra_action_limits,
+    _policy_rules,
+    _bot_meta,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection):
+    """Текущая версия схемы из PRAGMA user_version"""
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(connection):
+    """Применение всех недостающих миграций; возвращает итоговую версию
+
+    Версия перечитывается после BEGIN IMMEDIATE: процессы, запущенные
+    одновременно (launcher.py), применяют каждую миграцию ровно один раз.
+    """
+    version = get_schema_version(connection)
+    while version < SCHEMA_VERSION:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            version = get_schema_version(connection)
+            if version >= SCHEMA_VERSION:
+                # Все миграции уже применил другой процесс
+                connection.commit()
+                break
+            migration = MIGRATIONS[version]
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {version + 1}")
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        version += 1
+        logger.info("Применена миграция базы данных %s: %s", version, migration.__doc__)
+    return max(version, SCHEMA_VERSION)
+
+
+def enable_incremental_vacuum(connection):
+    """Перевод существующей базы в режим auto_vacuum=INCREMENTAL
+
+    Режим включается только полным VACUUM, который держит блокировку
+    записи все время перестройки файла, поэтому это отдельный шаг при
+    остановленном боте (новые базы создаются сразу в этом режиме):
+
+        python migrations.py --incremental-vacuum database.db
+
+    Возвращает False, если режим уже включен.
+    """
+    if connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    connection.execute("VACUUM")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных бота (при остановленном боте)")
+    parser.add_argument("path", nargs="?", default="database.db", help="файл базы данных")
+    parser.add_argument("--incremental-vacuum", action="store_true", help="включить auto_vacuum=INCREMENTAL (полный VACUUM)")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.path)
+    try:
+        version = apply_migrations(connection)
+        print(f"Версия схемы: {version}")
+        if args.incremental_vacuum:
+            if enable_incremental_vacuum(connection):
+                print("Включен режим auto_vacuum=INCREMENTAL")
+            else:
+                print("Режим auto_vacuum=INCREMENTAL уже включен")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import asyncio
+import itertools
+import time
+import logging
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+PUNISHMENTS_TOTAL = Counter("antiraid_punishments_total", "Выполненные меры защиты", ["kind"])
+# Ответы 429, которые discord.py не переждал сам (ожидание дольше
+# max_ratelimit_timeout): их повторяют диспетчер мер защиты и восстановление
+RATE_LIMITED_TOTAL = Counter(
+    "antiraid_rest_rate_limited_total", "Ответы 429 от REST API с долгим ожиданием по маршрутам", ["route"]
+)
+
+# Приоритеты задач: снятие ролей останавливает рейд и выполняется первым
+PRIORITY_STRIP = 0
+PRIORITY_NOTIFY = 1
+
+
+class RateLimited(Exception):
+    """Ответ 429 от REST API с временем ожидания"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Превышен лимит запросов, повтор через {retry_after:.2f} с")
+        self.retry_after = retry_after
+
+
+class RouteBucket:
+    """Лимит запросов для одного маршрута REST API (token bucket)"""
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self):
+        """Сколько ждать до следующего запроса (0 — можно сразу)"""
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.per / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.delay()
+            if wait <= 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(wait)
+
+    def penalize(self, retry_after):
+        """Блокировка маршрута после ответа 429"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.tokens = 0.0
+
+
+class MitigationDispatcher:
+    """Очередь мер защиты с дедупликацией и учетом лимитов REST API
+
+    Снятие ролей с нарушителя выполняется один раз на (сервер,
+    пользователь) и не повторяется в течение cooldown секунд. Нарушители
+    одного сервера собираются в пачку и обрабатываются параллельно (не
+    больше strip_concurrency запросов одновременно) с ожиданием лимита
+    маршрута. Если за lockdown_window секунд на сервере набирается
+    lockdown_threshold нарушителей (скоординированный рейд), перед
+    снятием ролей включается блокировка: у ролей нарушителей за один
+    проход отключаются опасные права, и ни один из аккаунтов больше не
+    может ими пользоваться. Уведомления владельцу собираются в течение
+    summary_delay секунд и отправляются одним сообщением.
+
+    client — объект с корутинами strip_roles(guild, user),
+    lockdown_roles(guild, users) -> роли, lock_role(guild, role) и
+    send_summary(guild, offences, locked_roles); strip_roles и lock_role
+    возвращают False при неудаче. Необязательная prefetch_members(guild,
+    users) заранее получает участников пачки одним запросом. В тестах
+    client можно заменить заглушкой.
+    """
+
+    def __init__(self, client, workers=4, cooldown=60.0, summary_delay=3.0,
+                 strip_rate=(10, 10.0), notify_rate=(5, 5.0), max_retries=3,
+                 strip_concurrency=8, lockdown_threshold=2, lockdown_window=60.0):
+        self.client = client
+        self.cooldown = cooldown
+        self.summary_delay = summary_delay
+        self.strip_rate = strip_rate
+        self.notify_rate = notify_rate
+        self.max_retries = max_retries
+        self.workers = workers
+        self.strip_concurrency = strip_concurrency
+        self.lockdown_threshold = lockdown_threshold
+        self.lockdown_window = lockdown_window
+        self.queue = asyncio.PriorityQueue()
+        self.buckets = {}
+        self.pending = set()
+        self.recent = {}
+        self.offences = {}
+        # Нарушители сервера, ожидающие снятия ролей: {guild_id: {user_id: user}}
+        self.strip_batches = {}
+        # Недавние нарушители сервера для включения блокировки: {guild_id: {user_id: время}}
+        self.offenders = {}
+        # Роли с отключенными правами — для сводки владельцу
+        self.locked_roles = {}
+        # Роли, блокировка которых уже начата: {(guild_id, role_id): время}
+        self._locking = {}
+        self._semaphore = None
+        self._sequence = itertools.count()
+        self._worker_tasks = []
+        self.stats = {
+            "punishments": 0,
+            "deduplicated": 0,
+            "strip_calls": 0,
+            "strip_batches": 0,
+            "lockdowns": 0,
+            "roles_locked": 0,
+            "summary_calls": 0,
+            "rate_limited": 0,
+            "failed": 0,
+        }
+
+    def start(self):
+        """Запуск обработчиков очереди"""
+        if not self._worker_tasks:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.strip_concurrency)
+            self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
+
+    def bucket(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            rate, per = self.notify_rate if route[0] == "dm" else self.strip_rate
+            bucket = self.buckets[route] = RouteBucket(rate, per)
+        return bucket
+
+    def _schedule(self, priority, route, job, attempt=0):
+        self.queue.put_nowait((priority, next(self._sequence), route, job, attempt))
+
+    async def punish(self, guild, user, label, count, limit):
+        """Регистрация нарушения; REST-вызовы выполняются в фоне"""
+        self.stats["punishments"] += 1
+        key = (guild.id, user.id)
+        now = time.monotonic()
+
+        # Нарушение попадает в сводку для владельца, даже если роли уже сняты
+        offences = self.offences.get(guild.id)
+        if offences is None:
+            offences = self.offences[guild.id] = {}
+            asyncio.get_running_loop().call_later(self.summary_delay, self._schedule_summary, guild)
+        offences[(user.id, label)] = (user, label, count, limit)
+
+        recently = self.recent.get(key)
+        if key in self.pending or (recently is not None and now - recently < self.cooldown):
+            self.stats["deduplicated"] += 1
+            return
+        self.pending.add(key)
+        self.offenders.setdefault(guild.id, {})[user.id] = now
+
+        # Нарушители, найденные до начала обработки пачки, попадают в нее же
+        batch = self.strip_batches.get(guild.id)
+        if batch is None:
+            batch = self.strip_batches[guild.id] = {}
+            self._schedule(PRIORITY_STRIP, ("member_edit", guild.id), ("strip", guild, batch))
+        batch[user.id] = user
+
+    def _schedule_summary(self, guild):
+        offences = self.offences.pop(guild.id, None)
+        if offences:
+            locked = self.locked_roles.pop(guild.id, [])
+            self._schedule(PRIORITY_NOTIFY, ("dm",), ("summary", guild, (list(offences.values()), locked)))
+
+    def _lockdown_needed(self, guild):
+        """Скоординированный рейд: много нарушителей сервера за короткое время"""
+        offenders = self.offenders.get(guild.id, {})
+        threshold = time.monotonic() - self.lockdown_window
+        for user_id, at in list(offenders.items()):
+            if at < threshold:
+                del offenders[user_id]
+        return len(offenders) >= self.lockdown_threshold
+
+    async def _worker(self):
+        while True:
+            priority, _, route, job, attempt = await self.queue.get()
+            try:
+                if job[0] == "strip":
+                    # Пачка сама ждет лимита маршрута для каждого запроса
+                    await self._execute(job, route)
+                else:
+                    await self.bucket(route).acquire()
+                    await self._execute(job, route)
+            except RateLimited as e:
+                self.stats["rate_limited"] += 1
+                RATE_LIMITED_TOTAL.labels(route[0]).inc()
+                logger.warning("Лимит запросов REST API, повтор через %.2f с", e.retry_after, extra={"route": route[0]})
+                self.bucket(route).penalize(e.retry_after)
+                if attempt < self.max_retries:
+                    self._schedule(priority, route, job, attempt + 1)
+                else:
+                    self.stats["failed"] += 1
+            except Exception as e:
+                logger.error("Ошибка выполнения мер защиты: %s", e, extra={"guild_id": job[1].id, "route": route[0]})
+                if job[0] != "strip":
+                    self.stats["failed"] += 1
+            finally:
+                self.queue.task_done()
+
+    async def _execute(self, job, route):
+        kind, guild, payload = job
+        if kind == "strip":
+            await self._strip_batch(guild, payload)
+            return
+        offences, locked = payload
+        self.stats["summary_calls"] += 1
+        await self.client.send_summary(guild, offences, locked)
+        PUNISHMENTS_TOTAL.labels(kind).inc()
+
+    async def _strip_batch(self, guild, batch):
+        """Блокировка (при необходимости) и параллельное снятие ролей с пачки нарушителей"""
+        if self.strip_batches.get(guild.id) is batch:
+            del self.strip_batches[guild.id]
+        users = list(batch.values())
+        self.stats["strip_batches"] += 1
+        prefetch = getattr(self.client, "prefetch_members", None)
+        if prefetch is not None:
+            try:
+                await prefetch(guild, users)
+            except Exception as e:
+                logger.warning("Не удалось получить участников пачки: %s", e, extra={"guild_id": guild.id})
+        try:
+            if self._lockdown_needed(guild):
+                await self._lockdown(guild, users)
+        finally:
+            # Снятие ролей выполняется, даже если блокировка не удалась
+            await asyncio.gather(*(self._strip_one(guild, user) for user in users))
+
+    async def _lockdown(self, guild, users):
+        """Отключение опасных прав у ролей нарушителей — по одному запросу на роль"""
+        now = time.monotonic()
+        roles = [
+            role for role in await self.client.lockdown_roles(guild, users)
+            if now - self._locking.get((guild.id, role.id), -self.lockdown_window) >= self.lockdown_window
+        ]
+        if not roles:
+            return
+        for role in roles:
+            self._locking[(guild.id, role.id)] = now
+        self.stats["lockdowns"] += 1
+        PUNISHMENTS_TOTAL.labels("lockdown").inc()
+        logger.warning("Блокировка опасных прав у %s ролей", len(roles), extra={"guild_id": guild.id})
+        locked = await asyncio.gather(*(
+            self._call(("role_edit", guild.id), self.client.lock_role, guild, role) for role in roles
+        ))
+        done = [role for role, success in zip(roles, locked) if success]
+        self.stats["roles_locked"] += len(done)
+        self.locked_roles.setdefault(guild.id, []).extend(done)
+
+    async def _strip_one(self, guild, user):
+        success = await self._call(("member_edit", guild.id), self.client.strip_roles, guild, user)
+        if success:
+            self.stats["strip_calls"] += 1
+            PUNISHMENTS_TOTAL.labels("strip").inc()
+        self._finish(guild, user, failed=not success)
+
+    async def _call(self, route, method, *args):
+        """Вызов REST с ограничением параллельности, лимитом маршрута и повторами после 429"""
+        bucket = self.bucket(route)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.strip_concurrency)
+        for _ in range(self.max_retries + 1):
+            try:
+                # Лимит маршрута ждем до захвата семафора, чтобы медленный
+                # маршрут одного сервера не занимал слоты остальных
+                await bucket.acquire()
+                async with self._semaphore:
+                    result = await method(*args)
+                return result is not False
+            except RateLimited as e:
+                self.stats["rate_limited"] += 1
+                RATE_LIMITED_TOTAL.labels(route[0]).inc()
+                logger.warning("Лимит запросов REST API, повтор через %.2f с", e.retry_after, extra={"route": route[0]})
+                bucket.penalize(e.retry_after)
+            except Exception as e:
+                logger.error("Ошибка выполнения мер защиты: %s", e, extra={"guild_id": args[0].id, "route": route[0]})
+                return False
+        return False
+
+    def _finish(self, guild, user, failed=False):
+        key = (guild.id, user.id)
+        if failed:
+            self.stats["failed"] += 1
+        self.pending.discard(key)
+        if not failed:
+            self.recent[key] = time.monotonic()
+        self._forget_old()
+
+    def _forget_old(self):
+        if len(self._locking) > 10000:
+            threshold = time.monotonic() - self.lockdown_window
+            self._locking = {key: at for key, at in self._locking.items() if at >= threshold}
+        if len(self.recent) > 10000:
+            threshold = time.monotonic() - self.cooldown
+            self.recent = {key: at for key, at in self.recent.items() if at >= threshold}
+
+    async def join(self):
+        """Ожидание выполнения всех поставленных задач"""
+        await self.queue.join()
@@ -0,0 +1,170 @@
+import asyncio
+import time
+import logging
+from actions import ACTION_FAMILIES
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = Histogram("antiraid_pipeline_stage_seconds", "Время этапа конвейера на пачку", ["stage"])
+EVENTS_TOTAL = Counter("antiraid_events_total", "Отслеживаемые действия по типам", ["action_type"])
+DETECTIONS_TOTAL = Counter("antiraid_detections_total", "Нарушения правил политики", ["family", "window"])
+
+
+class ActionEvent:
+    """Отслеживаемое действие участника"""
+    __slots__ = ("user_id", "user", "action_type", "timestamp")
+
+    def __init__(self, user_id, action_type, user=None, timestamp=None):
+        self.user_id = user_id
+        self.user = user
+        self.action_type = action_type
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+
+class ActionPipeline:
+    """Единый конвейер обработки отслеживаемых действий
+
+    Этапы: автор → фильтр политики → запись → оценка → меры.
+    События копятся по серверам: пока обрабатывается одна пачка, следующие
+    события ждут своей очереди и затем обрабатываются вместе. Всплеск рейда
+    дает одно чтение настроек, одну пачку записи и один проход оценки
+    вместо N. Объект пользователя нужен только для мер, поэтому авторы
+    определяются по ID, а полностью загружаются лишь нарушители.
+    """
+
+    def __init__(self, db, state, resolve_user, punish, batch_window=0.0, reputation=None, startup=None, journal=None):
+        self.db = db
+        # Хранилище истории действий (state_backend.py)
+        self.state = state
+        # Индекс нарушителей по всем серверам (reputation.py) или None
+        self.reputation = reputation
+        # resolve_user(guild, user_id) -> пользователь или None
+        self.resolve_user = resolve_user
+        # punish(guild, user, label, count, limit) — меры против нарушителя
+        self.punish = punish
+        self.batch_window = batch_window
+        # Этапы запуска (startup.py): события ждут загрузки счетчиков
+        self.startup = startup
+        # Журнал событий (journal.py) или None
+        self.journal = journal
+        self.pending = {}
+        self._workers = {}
+        self.events_total = 0
+        self.batches_total = 0
+
+    def submit(self, guild, user_id, action_type, user=None, timestamp=None):
+        """Постановка действия в очередь сервера"""
+        if action_type not in ACTION_FAMILIES:
+            return
+        self.pending.setdefault(guild.id, []).append(ActionEvent(user_id, action_type, user, timestamp))
+        if guild.id not in self._workers:
+            self._workers[guild.id] = asyncio.create_task(self._drain(guild))
+
+    async def _drain(self, guild):
+        try:
+            if self.startup is not None:
+                await self.startup.wait_ready()
+            if self.batch_window:
+                await asyncio.sleep(self.batch_window)
+            while self.pending.get(guild.id):
+                events = self.pending.pop(guild.id)
+                try:
+                    await self.process(guild, events)
+                except Exception as e:
+                    logger.exception("Ошибка обработки действий на %s: %s", guild.name, e, extra={"guild_id": guild.id})
+        finally:
+            self._workers.pop(guild.id, None)
+
+    async def process(self, guild, events):
+        """Обработка пачки действий одного сервера"""
+        self.events_total += len(events)
+        self.batches_total += 1
+        for event in events:
+            EVENTS_TOTAL.labels(event.action_type).inc()
+
+        with STAGE_SECONDS.labels("policy").time():
+            config = await self.db.get_guild_config(guild.id)
+            events = self.filter(guild, config, events)
+        if not events:
+            return
+        if self.startup is not None:
+            self.startup.mark("first_protected_event")
+        with STAGE_SECONDS.labels("record").time():
+            await self.record(guild, events)
+        with STAGE_SECONDS.labels("evaluate").time():
+            offenders = await self.evaluate(guild, config, events)
+        if offenders:
+            for _, rule, _ in offenders.values():
+                DETECTIONS_TOTAL.labels(rule.family, rule.window).inc()
+            with STAGE_SECONDS.labels("act").time():
+                await self.act(guild, events, offenders)
+
+    def filter(self, guild, config, events):
+        """Фильтр политики: защита включена, автор не владелец, не доверенный и не сам бот
+
+        Действия бота (восстановление, блокировка ролей) тоже попадают в
+        журнал аудита и не должны считаться нарушениями.
+        """
+        if not config.protection_enabled:
+            return []
+        me = guild.me
+        bot_id = me.id if me is not None else None
+        return [
+            event for event in events
+            if event.user_id != guild.owner_id and event.user_id != bot_id and event.user_id not in config.trusted_users
+        ]
+
+    async def record(self, guild, events):
+        """Запись действий в журнал одной пачкой и учет в счетчиках"""
+        await self.db.log_actions(
+            [(guild.id, event.user_id, event.action_type, int(event.timestamp)) for event in events]
+        )
+        if self.journal is not None:
+            self.journal.append_many(
+                guild.id, [(event.user_id, event.action_type, event.timestamp) for event in events]
+            )
+        await self.state.record_many(
+            guild.id, [(event.user_id, event.action_type, event.timestamp) for event in events]
+        )
+
+    async def evaluate(self, guild, config, events):
+        """Проверка правил политики для авторов пачки
+
+        История каждого автора разбирается один раз на все окна и семейства
+        (CompiledPolicy.evaluate) на момент его последнего действия в пачке.
+        Лимиты для нарушителей с других серверов ужесточаются по индексу
+        нарушителей. Возвращает {(user_id, семейство правила): (значение, правило, лимит)}.
+        """
+        latest = {}
+        for event in events:
+            if event.timestamp > latest.get(event.user_id, 0):
+                latest[event.user_id] = event.timestamp
+        policy = config.policy
+        offenders = {}
+        for user_id, now in latest.items():
+            scale = self.reputation.limit_scale(user_id, guild.id) if self.reputation is not None else 1.0
+            timestamps, codes = await self.state.timeline(guild.id, user_id, now)
+            for rule, value, limit in policy.evaluate(timestamps, codes, now, scale):
+                offenders[(user_id, rule.family)] = (value, rule, limit)
+        return offenders
+
+    async def act(self, guild, events, offenders):
+        """Меры против нарушителей"""
+        users = {event.user_id: event.user for event in events if event.user is not None}
+        for (user_id, family), (count, rule, limit) in offenders.items():
+            if self.reputation is not None:
+                self.reputation.record_offence(user_id, guild.id)
+            user = users.get(user_id) or await self.resolve_user(guild, user_id)
+            context = {
+                "guild_id": guild.id, "user_id": user_id, "family": family,
+                "window": rule.window, "count": count, "limit": limit,
+            }
+            if user is None:
+                logger.warning("Не удалось определить нарушителя %s на %s", user_id, guild.name, extra=context)
+                continue
+            logger.info("Превышен лимит (%s): %s из %s", rule.label, count, limit, extra=context)
+            try:
+                await self.punish(guild, user, rule.label, count, limit)
+            except Exception as e:
+                logger.error("Ошибка при применении мер к %s: %s", user_id, e, extra=context)
@@ -0,0 +1,169 @@
+from actions import FAMILIES, FAMILY_CODES
+
+# Политика обнаружения: набор правил «не больше limit действий за window
+# секунд». Правило относится к одному семейству действий или ко всем
+# сразу (ALL_FAMILIES) с весами семейств. Суточные лимиты берутся из
+# action_limits, короткие окна ловят быстрые рейды (20 удалений за 10 с)
+# задолго до исчерпания суточного лимита.
+
+ALL_FAMILIES = "all"
+
+# Самое длинное окно правил; столько истории хранят счетчики
+HORIZON = 24 * 3600
+
+# Суточное окно: лимит правила берется из настроек сервера (action_limits)
+DAILY_WINDOW = HORIZON
+
+# Правила коротких окон по умолчанию: семейство -> [(окно в секундах, лимит)]
+BURST_RULES = {
+    "role": [(10, 3), (300, 10)],
+    "channel": [(10, 3), (300, 10)],
+    "webhook": [(10, 2), (300, 6)],
+    "ban": [(10, 3), (300, 10)],
+    "kick": [(10, 3), (300, 10)],
+    "emoji": [(10, 5), (300, 20)],
+    "permission": [(10, 3), (300, 10)],
+    ALL_FAMILIES: [(60, 12)],
+}
+
+# Вес действия семейства в правилах ALL_FAMILIES: удаление каналов и баны
+# опаснее, чем, например, новые эмодзи
+FAMILY_WEIGHTS = {
+    "role": 2,
+    "channel": 2,
+    "webhook": 2,
+    "ban": 3,
+    "kick": 2,
+    "emoji": 1,
+    "permission": 1,
+}
+
+# Окна, которые можно выбрать для правил сервера
+WINDOW_CHOICES = (10, 60, 300, 3600, DAILY_WINDOW)
+
+
+def format_window(seconds):
+    """Окно правила для уведомлений: 10 с, 5 мин, 24 ч"""
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600} ч"
+    if seconds % 60 == 0:
+        return f"{seconds // 60} мин"
+    return f"{seconds} с"
+
+
+def family_label(family):
+    return "все действия" if family == ALL_FAMILIES else FAMILIES[family][2]
+
+
+class Rule:
+    """Правило политики: не больше limit действий family за window секунд"""
+    __slots__ = ("family", "window", "limit")
+
+    def __init__(self, family, window, limit):
+        self.family = family
+        self.window = window
+        self.limit = limit
+
+    @property
+    def label(self):
+        return f"{family_label(self.family)} за {format_window(self.window)}"
+
+    def __repr__(self):
+        return f"Rule({self.family!r}, {self.window}, {self.limit})"
+
+
+def default_rules(limits):
+    """Правила по умолчанию для лимитов сервера из action_limits"""
+    rules = {}
+    for family, (limit_key, default, _) in FAMILIES.items():
+        rules[(family, DAILY_WINDOW)] = limits.get(limit_key, default)
+    for family, windows in BURST_RULES.items():
+        for window, limit in windows:
+            rules[(family, window)] = limit
+    return rules
+
+
+def validate_rule(family, window, limit):
+    """Проверка правила сервера; ValueError при ошибке"""
+    if family != ALL_FAMILIES and family not in FAMILIES:
+        raise ValueError(f"Неизвестное семейство действий: {family}")
+    if not 0 < window <= HORIZON:
+        raise ValueError(f"Окно правила должно быть от 1 до {HORIZON} секунд")
+    if window == DAILY_WINDOW and family != ALL_FAMILIES:
+        raise ValueError("Суточные лимиты семейств задаются в настройках лимитов")
+    if limit < 0:
+        raise ValueError("Лимит правила не может быть отрицательным")
+
+
+class CompiledPolicy:
+    """Политика сервера, подготовленная к оценке за один проход
+
+    Правила группируются по окнам в порядке возрастания. Оценка идет по
+    массиву отметок времени пользователя от новых к старым: счетчики всех
+    семейств и взвешенная сумма накапливаются одновременно, а на границе
+    каждого окна проверяются все его правила. Стоимость — O(действий в
+    самом длинном окне + число правил) независимо от числа окон.
+    """
+    __slots__ = ("rules", "windows", "checks", "weights", "horizon")
+
+    def __init__(self, rules):
+        self.rules = [rule for rule in rules if rule.limit > 0]
+        self.rules.sort(key=lambda rule: (rule.window, rule.family))
+        self.windows = sorted({rule.window for rule in self.rules})
+        total_slot = len(FAMILY_CODES)
+        position = {window: index for index, window in enumerate(self.windows)}
+        # Для каждого окна: [(номер счетчика, лимит, правило)]
+        self.checks = [[] for _ in self.windows]
+        for rule in self.rules:
+            slot = total_slot if rule.family == ALL_FAMILIES else FAMILY_CODES[rule.family]
+            self.checks[position[rule.window]].append((slot, rule.limit, rule))
+        self.weights = [0] * total_slot
+        for family, code in FAMILY_CODES.items():
+            self.weights[code] = FAMILY_WEIGHTS.get(family, 1)
+        self.horizon = self.windows[-1] if self.windows else 0
+
+    def evaluate(self, timestamps, codes, now, scale=1.0):
+        """Нарушенные правила для истории пользователя
+
+        timestamps и codes — отметки времени по возрастанию и коды семейств
+        (actions.FAMILY_CODES). scale < 1 ужесточает все лимиты (известные
+        нарушители, reputation.py), но не ниже 1; при scale = 0 нарушением считается
+        любое действие. Возвращает [(правило, значение, лимит)] для каждого
+        семейства один раз — по самому короткому нарушенному окну.
+        """
+        violations = []
+        if not self.windows:
+            return violations
+        weights = self.weights
+        total_slot = len(weights)
+        counts = [0] * (total_slot + 1)
+        reported = set()
+        index = len(timestamps) - 1
+        for position, window in enumerate(self.windows):
+            boundary = now - window
+            while index >= 0 and timestamps[index] >= boundary:
+                code = codes[index]
+                counts[code] += 1
+                counts[total_slot] += weights[code]
+                index -= 1
+            for slot, limit, rule in self.checks[position]:
+                if scale != 1.0:
+                    # Ужесточенный лимит не меньше 1: иначе нарушением стало бы
+                    # первое же действие, как при scale = 0
+                    limit = max(1, int(limit * scale)) if scale > 0 else 0
+                value = counts[slot]
+                if value > limit and slot not in reported:
+                    reported.add(slot)
+                    violations.append((rule, value, limit))
+        return violations
+
+
+def compile_policy(limits, overrides=None):
+    """Политика сервера: правила по умолчанию с правилами сервера поверх
+
+    overrides — {(семейство, окно): лимит}; лимит 0 отключает правило.
+    """
+    rules = default_rules(limits)
+    if overrides:
+        rules.update(overrides)
+    return CompiledPolicy([Rule(family, window, limit) for (family, window), limit in rules.items()])
@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import math
+import os
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# Общий для всех серверов индекс нарушителей. Рейдовые аккаунты обычно
+# атакуют несколько серверов, защищенных одним ботом: нарушитель,
+# уже наказанный на другом сервере, получает более строгие лимиты,
+# а после нескольких серверов меры принимаются с первого действия.
+#
+# Память фиксирована и не зависит от числа пользователей: фильтры Блума
+# отвечают «встречался ли нарушитель», Count-Min — «на скольких серверах».
+
+MASK64 = (1 << 64) - 1
+FILE_MAGIC = b"ARREP1\0\0"
+HEADER = struct.Struct("<8sQQIIIQQd")
+# Таблица для деления 8-битных счетчиков пополам через bytes.translate
+HALVE_TABLE = bytes(value >> 1 for value in range(256))
+
+
+def _mix(value):
+    """64-битное перемешивание (splitmix64) для хеширования ID"""
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def _next_power_of_two(value):
+    return 1 << max(3, (value - 1).bit_length())
+
+
+def _round_bytes(bits):
+    return max(8, (bits + 7) // 8 * 8)
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray с двойным хешированием"""
+    __slots__ = ("bits", "size", "hashes", "inserted")
+
+    def __init__(self, size, hashes, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray(size // 8)
+        self.inserted = 0
+
+    def _positions(self, key):
+        hashed = _mix(key)
+        first = hashed & 0xFFFFFFFF
+        step = (hashed >> 32) | 1
+        size = self.size
+        return [(first + index * step) % size for index in range(self.hashes)]
+
+    def add(self, key):
+        """Добавление ключа; True, если его еще не было"""
+        bits = self.bits
+        added = False
+        for position in self._positions(key):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        if added:
+            self.inserted += 1
+        return added
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def clear(self):
+        self.bits = bytearray(self.size // 8)
+        self.inserted = 0
+
+
+class CountMinSketch:
+    """Count-Min с насыщающимися 8-битными счетчиками
+
+    Обновление консервативное: увеличиваются только счетчики, равные
+    минимуму, — это заметно снижает переоценку при той же памяти.
+    """
+    __slots__ = ("width", "depth", "rows", "_seeds")
+
+    def __init__(self, width, depth, rows=None):
+        self.width = width
+        self.depth = depth
+        self.rows = rows if rows is not None else [bytearray(width) for _ in range(depth)]
+        self._seeds = [_mix(row + 1) for row in range(depth)]
+
+    def _positions(self, key):
+        mask = self.width - 1
+        return [_mix(key ^ seed) & mask for seed in self._seeds]
+
+    def add(self, key, amount=1):
+        positions = self._positions(key)
+        target = min(255, min(row[position] for row, position in zip(self.rows, positions)) + amount)
+        for row, position in zip(self.rows, positions):
+            if row[position] < target:
+                row[position] = target
+
+    def estimate(self, key):
+        return min(row[position] for row, position in zip(self.rows, self._positions(key)))
+
+    def halve(self):
+        """Старение: все счетчики делятся пополам"""
+        self.rows = [bytearray(row.translate(HALVE_TABLE)) for row in self.rows]
+
+
+class ReputationIndex:
+    """Индекс нарушителей по всем серверам с ограниченной памятью
+
+    Нарушение учитывается один раз на пару (пользователь, сервер): пары
+    проверяет фильтр Блума, число серверов хранит Count-Min. Фильтры
+    разделены на два поколения — при заполнении текущего поколения
+    старое отбрасывается, а счетчики Count-Min делятся пополам, поэтому
+    давние нарушения постепенно забываются. capacity — число нарушителей
+    в поколении, при котором доля ложных срабатываний равна error_rate.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.01, depth=4, strict_guilds=1, preempt_guilds=3):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Нарушитель с strict_guilds серверов получает вдвое меньшие лимиты,
+        # с preempt_guilds — меры с первого отслеживаемого действия
+        self.strict_guilds = strict_guilds
+        self.preempt_guilds = preempt_guilds
+        bits = _round_bytes(int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        self.users = [BloomFilter(bits, hashes), BloomFilter(bits, hashes)]
+        self.pairs = [BloomFilter(bits * 2, hashes), BloomFilter(bits * 2, hashes)]
+        self.guilds = CountMinSketch(_next_power_of_two(capacity), depth)
+        self.rotated_at = time.time()
+        self.offences_total = 0
+
+    def record_offence(self, user_id, guild_id):
+        """Учет нарушения пользователя на сервере"""
+        self.offences_total += 1
+        pair = user_id ^ _mix(guild_id)
+        if pair in self.pairs[0] or pair in self.pairs[1]:
+            return
+        self.pairs[0].add(pair)
+        self.users[0].add(user_id)
+        self.guilds.add(user_id)
+        if self.users[0].inserted >= self.capacity or self.pairs[0].inserted >= self.capacity * 2:
+            self.rotate()
+
+    def guild_count(self, user_id, exclude_guild=None):
+        """Оценка числа серверов, где пользователь нарушал правила (0 — не встречался)
+
+        exclude_guild — сервер, который не учитывается (текущий: нарушение
+        на нем самом не должно ужесточать его же лимиты)
+        """
+        if user_id not in self.users[0] and user_id not in self.users[1]:
+            return 0
+        count = self.guilds.estimate(user_id)
+        if exclude_guild is not None and count:
+            pair = user_id ^ _mix(exclude_guild)
+            if pair in self.pairs[0] or pair in self.pairs[1]:
+                count -= 1
+        return count
+
+    def limit_scale(self, user_id, guild_id=None):
+        """Множитель лимитов политики для пользователя на сервере guild_id: 1, 0.5 или 0
+
+        Учитываются только нарушения на других серверах.
+        """
+        count = self.guild_count(user_id, exclude_guild=guild_id)
+        if count >= self.preempt_guilds:
+            return 0.0
+        if count >= self.strict_guilds:
+            return 0.5
+        return 1.0
+
+    def rotate(self):
+        """Новое поколение фильтров и старение счетчиков"""
+        for filters in (self.users, self.pairs):
+            old = filters.pop()
+            old.clear()
+            filters.insert(0, old)
+        self.guilds.halve()
+        self.rotated_at = time.time()
+
+    @property
+    def nbytes(self):
+        """Память структур индекса в байтах"""
+        blooms = sum(len(bloom.bits) for bloom in self.users + self.pairs)
+        return blooms + sum(len(row) for row in self.guilds.rows)
+
+    def save(self, path):
+        """Запись индекса в файл (атомарная замена)
+
+        Вызывается из потока; изменения во время записи допустимы —
+        для вероятностных структур достаточно почти согласованного снимка.
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(HEADER.pack(
+                FILE_MAGIC, self.capacity, self.users[0].size, self.users[0].hashes,
+                self.guilds.depth, self.guilds.width,
+                self.users[0].inserted, self.pairs[0].inserted, self.rotated_at,
+            ))
+            for bloom in self.users + self.pairs:
+                file.write(bloom.bits)
+            for row in self.guilds.rows:
+                file.write(row)
+            # Файл должен быть на диске до замены: иначе после сбоя
+            # на месте индекса может оказаться пустой или неполный файл
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+    def load(self, path):
+        """Чтение индекса из файла; False, если файла нет, параметры не совпадают или файл неполный"""
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as file:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return False
+            magic, capacity, bits, hashes, depth, width, users_inserted, pairs_inserted, rotated_at = HEADER.unpack(header)
+            current = self.users[0]
+            if (magic, capacity, bits, hashes, depth, width) != (
+                FILE_MAGIC, self.capacity, current.size, current.hashes, self.guilds.depth, self.guilds.width
+            ):
+                logger.warning("Индекс нарушителей %s создан с другими параметрами, пропуск", path)
+                return False
+            payload = sum(bloom.size // 8 for bloom in self.users + self.pairs) + sum(len(row) for row in self.guilds.rows)
+            if os.fstat(file.fileno()).st_size - HEADER.size != payload:
+                logger.warning("Индекс нарушителей %s поврежден (неверный размер), пропуск", path)
+                return False
+            for bloom in self.users + self.pairs:
+                bloom.bits = bytearray(file.read(bloom.size // 8))
+            for row in self.guilds.rows:
+                file.readinto(row)
+        self.users[0].inserted = users_inserted
+        self.pairs[0].inserted = pairs_inserted
+        self.rotated_at = rotated_at
+        return True
+
+
+class ReputationTask:
+    """Периодическое сохранение индекса нарушителей и старение раз в max_age секунд"""
+
+    def __init__(self, index, path, interval=300, max_age=7 * 86400):
+        self.index = index
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self._task = None
+
+    def load(self):
+        loaded = self.index.load(self.path)
+        if loaded:
+            logger.info("Загружен индекс нарушителей из %s", self.path)
+        return loaded
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def save(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.index.save, self.path)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if time.time() - self.index.rotated_at >= self.max_age:
+                    self.index.rotate()
+                await self.save()
+            except Exception as e:
+                logger.error("Ошибка сохранения индекса нарушителей: %s", e)
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+
+from metrics import Counter, Histogram
+from mitigation import RATE_LIMITED_TOTAL, RateLimited, RouteBucket
+from snapshot import CATEGORY_CHANNEL, ROLE
+
+logger = logging.getLogger(__name__)
+
+RESTORED_TOTAL = Counter("antiraid_restored_objects_total", "Восстановленные роли и каналы", ["kind"])
+RESTORE_SECONDS = Histogram("antiraid_restore_seconds", "Время восстановления удаленных объектов сервера")
+
+
+class RestoreEngine:
+    """Восстановление ролей и каналов, удаленных нарушителями, по снимкам
+
+    Удаления из журнала аудита запоминаются на window секунд вместе с
+    автором. После снятия ролей с нарушителей take() возвращает удаленные
+    ими объекты, а restore() пересоздает их в три волны: роли, затем
+    категории, затем остальные каналы (переопределения прав ссылаются на
+    новые роли и категории). Внутри волны запросы идут параллельно — не
+    больше concurrency одновременно и с лимитом create_rate на маршрут.
+
+    client — объект с корутинами create_role(guild, record),
+    create_channel(guild, record, category, overwrites) и
+    edit_role_positions(guild, positions); create_* возвращают новый объект.
+    """
+
+    def __init__(self, store, client, concurrency=8, create_rate=(10, 10.0), max_retries=3, window=600.0):
+        self.store = store
+        self.client = client
+        self.concurrency = concurrency
+        self.create_rate = create_rate
+        self.max_retries = max_retries
+        self.window = window
+        # Удаленные объекты: {guild_id: {(вид, id): (user_id, время)}}
+        self.deleted = {}
+        self.buckets = {}
+        self._semaphore = None
+        self.stats = {"restores": 0, "roles": 0, "channels": 0, "missing": 0, "rate_limited": 0, "failed": 0}
+
+    def note_deleted(self, guild_id, user_id, kind, object_id):
+        """Учет удаления роли или канала (из журнала аудита)"""
+        deleted = self.deleted.setdefault(guild_id, {})
+        deleted[(kind, object_id)] = (user_id, time.monotonic())
+        if len(deleted) > 5000:
+            threshold = time.monotonic() - self.window
+            self.deleted[guild_id] = {key: value for key, value in deleted.items() if value[1] >= threshold}
+
+    def take(self, guild_id, user_ids):
+        """Объекты сервера, удаленные пользователями user_ids за последние window секунд"""
+        deleted = self.deleted.get(guild_id)
+        if not deleted:
+            return []
+        threshold = time.monotonic() - self.window
+        taken = [key for key, (user_id, at) in deleted.items() if user_id in user_ids and at >= threshold]
+        for key in taken:
+            del deleted[key]
+        return taken
+
+    def bucket(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            bucket = self.buckets[route] = RouteBucket(*self.create_rate)
+        return bucket
+
+    async def _call(self, route, method, *args):
+        """Вызов REST с ограничением параллельности, лимитом маршрута и повторами после 429"""
+        bucket = self.bucket(route)
+        for _ in range(self.max_retries + 1):
+            try:
+                await bucket.acquire()
+                async with self._semaphore:
+                    return await method(*args)
+            except RateLimited as e:
+                self.stats["rate_limited"] += 1
+                RATE_LIMITED_TOTAL.labels(route[0]).inc()
+                bucket.penalize(e.retry_after)
+            except Exception as e:
+                logger.error("Ошибка восстановления: %s", e, extra={"guild_id": args[0].id, "route": route[0]})
+                break
+        self.stats["failed"] += 1
+        return None
+
+    async def restore(self, guild, objects):
+        """Пересоздание объектов [(вид, id)]; возвращает число восстановленных ролей и каналов"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+        self.stats["restores"] += 1
+        loop = asyncio.get_running_loop()
+        history = await self.store.load(guild.id)
+        records = await loop.run_in_executor(None, history.records, objects)
+        # Учтенные при удалении записи больше не нужны
+        self.store.forget(guild.id, objects)
+        # Объекты, появившиеся и удаленные между снимками, не восстановить
+        self.stats["missing"] += len(objects) - len(records)
+        roles, categories, channels = [], [], []
+        for (kind, _), record in records.items():
+            if kind == ROLE:
+                roles.append(record)
+            elif record["type"] == CATEGORY_CHANNEL:
+                categories.append(record)
+            else:
+                channels.append(record)
+
+        # Старый ID -> новый объект (для переопределений прав и категорий)
+        created = {}
+        results = await asyncio.gather(*(
+            self._call(("role_create", guild.id), self.client.create_role, guild, record) for record in roles
+        ))
+        positions = {}
+        for record, role in zip(roles, results):
+            if role is not None:
+                created[record["id"]] = role
+                positions[role] = record["position"]
+        if positions:
+            await self._call(("role_positions", guild.id), self.client.edit_role_positions, guild, positions)
+
+        for wave in (categories, channels):
+            results = await asyncio.gather(*(
+                self._call(
+                    ("channel_create", guild.id), self.client.create_channel, guild, record,
+                    self._category(guild, record, created), self._overwrites(guild, record, created),
+                )
+                for record in wave
+            ))
+            for record, channel in zip(wave, results):
+                if channel is not None:
+                    created[record["id"]] = channel
+
+        restored_roles = sum(1 for record in roles if record["id"] in created)
+        restored_channels = len(created) - restored_roles
+        self.stats["roles"] += restored_roles
+        self.stats["channels"] += restored_channels
+        RESTORED_TOTAL.labels("role").inc(restored_roles)
+        RESTORED_TOTAL.labels("channel").inc(restored_channels)
+        elapsed = time.perf_counter() - started
+        RESTORE_SECONDS.observe(elapsed)
+        logger.log(
+            logging.WARNING if restored_roles or restored_channels else logging.INFO,
+            "Восстановлено ролей: %s, каналов: %s за %.2f с", restored_roles, restored_channels, elapsed,
+            extra={"guild_id": guild.id},
+        )
+        return restored_roles, restored_channels
+
+    @staticmethod
+    def _category(guild, record, created):
+        category_id = record["category_id"]
+        if category_id is None:
+            return None
+        return created.get(category_id) or guild.get_channel(category_id)
+
+    @staticmethod
+    def _overwrites(guild, record, created):
+        """Переопределения прав с новыми ролями: [(цель, allow, deny)]
+
+        Цель — роль, участник или ID участника, которого нет в кэше.
+        """
+        overwrites = []
+        for target_id, target_type, allow, deny in record["overwrites"]:
+            if target_type == 0:
+                target = created.get(target_id) or guild.get_role(target_id)
+            else:
+                # Без кэша участников (режим lean) участник передается по ID
+                target = guild.get_member(target_id) or target_id
+            if target is not None:
+                overwrites.append((target, allow, deny))
+        return overwrites
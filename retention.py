@@ -0,0 +1,64 @@
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionTask:
+    """Фоновая очистка журнала user_actions
+
+    Раз в interval секунд действия старше horizon_hours переносятся в
+    суточные агрегаты (user_actions_daily) и удаляются небольшими
+    порциями, после чего освобождается место в файле базы.
+    Размер журнала и стоимость проверки лимита остаются постоянными.
+    """
+
+    def __init__(self, db, horizon_hours=72, interval=3600, chunk_size=500, chunk_pause=0.05, vacuum_pages=1000):
+        self.db = db
+        self.horizon_hours = horizon_hours
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.vacuum_pages = vacuum_pages
+        self.deleted_total = 0
+        self.last_run_seconds = 0.0
+        self._task = None
+
+    def start(self):
+        """Запуск периодической очистки"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run_once(self):
+        """Один проход очистки; возвращает число удаленных строк"""
+        started = time.perf_counter()
+        before = int(time.time() - self.horizon_hours * 3600)
+        deleted = 0
+        while True:
+            count = await self.db.purge_actions_chunk(before, self.chunk_size)
+            deleted += count
+            if count < self.chunk_size:
+                break
+            # Пауза между порциями, чтобы не задерживать запись новых действий
+            await asyncio.sleep(self.chunk_pause)
+        if deleted:
+            await self.db.incremental_vacuum(self.vacuum_pages)
+        self.deleted_total += deleted
+        self.last_run_seconds = time.perf_counter() - started
+        return deleted
+
+    async def _run(self):
+        while True:
+            try:
+                deleted = await self.run_once()
+                if deleted:
+                    logger.info("Очистка журнала: удалено %s действий за %.2f с", deleted, self.last_run_seconds)
+            except Exception as e:
+                logger.error("Ошибка очистки журнала действий: %s", e)
+            await asyncio.sleep(self.interval)
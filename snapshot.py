@@ -0,0 +1,421 @@
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# Снимки ролей и каналов серверов для восстановления после рейда.
+#
+# Каждая роль и каждый канал (с правами и позицией) кодируются в
+# компактную двоичную запись; ключ записи — хеш содержимого. На сервер
+# приходится один файл-журнал <guild_id>.snap, в который дописываются
+# только новые записи и манифест версии с отличиями от предыдущей
+# (copy-on-write): неизменившиеся объекты не копируются. Запись в
+# журнале: [тип u8][длина u32][хеш 16 байт][данные].
+
+ROLE = 0
+CHANNEL = 1
+
+RECORD_OBJECT = 1
+RECORD_MANIFEST = 2
+
+RECORD_HEADER = struct.Struct("<BI16s")
+ROLE_STRUCT = struct.Struct("<QQIBBi")
+CHANNEL_STRUCT = struct.Struct("<QBQiIIHB")
+OVERWRITE_STRUCT = struct.Struct("<QBQQ")
+MANIFEST_STRUCT = struct.Struct("<IdII")
+ENTRY_STRUCT = struct.Struct("<BQ16s")
+REMOVED_STRUCT = struct.Struct("<BQ")
+
+# Тип канала Discord (discord.ChannelType)
+CATEGORY_CHANNEL = 4
+
+
+def content_hash(kind, payload):
+    return hashlib.blake2b(bytes((kind,)) + payload, digest_size=16).digest()
+
+
+def _pack_str(value):
+    data = (value or "").encode("utf-8")
+    return struct.pack("<H", len(data)) + data
+
+
+def _unpack_str(payload, offset):
+    (size,) = struct.unpack_from("<H", payload, offset)
+    offset += 2
+    return payload[offset:offset + size].decode("utf-8"), offset + size
+
+
+def encode_role(role):
+    """Двоичная запись роли"""
+    return ROLE_STRUCT.pack(
+        role.id, role.permissions.value, role.colour.value,
+        bool(role.hoist), bool(role.mentionable), role.position,
+    ) + _pack_str(role.name)
+
+
+def encode_channel(channel, role_ids):
+    """Двоичная запись канала с переопределениями прав
+
+    role_ids — ID ролей сервера: по ним цели переопределений делятся на
+    роли и участников.
+    """
+    channel_type = getattr(channel.type, "value", channel.type)
+    overwrites = []
+    for target, overwrite in channel.overwrites.items():
+        allow, deny = overwrite.pair()
+        target_type = 0 if target.id in role_ids else 1
+        overwrites.append(OVERWRITE_STRUCT.pack(target.id, target_type, allow.value, deny.value))
+    return CHANNEL_STRUCT.pack(
+        channel.id, channel_type, channel.category_id or 0, channel.position,
+        getattr(channel, "slowmode_delay", 0) or 0, getattr(channel, "bitrate", 0) or 0,
+        getattr(channel, "user_limit", 0) or 0, bool(getattr(channel, "nsfw", False)),
+    ) + _pack_str(channel.name) + _pack_str(getattr(channel, "topic", None)) + (
+        struct.pack("<H", len(overwrites)) + b"".join(overwrites)
+    )
+
+
+def decode(kind, payload):
+    """Словарь полей роли или канала из двоичной записи"""
+    if kind == ROLE:
+        object_id, permissions, colour, hoist, mentionable, position = ROLE_STRUCT.unpack_from(payload)
+        name, _ = _unpack_str(payload, ROLE_STRUCT.size)
+        return {
+            "id": object_id, "name": name, "permissions": permissions, "colour": colour,
+            "hoist": bool(hoist), "mentionable": bool(mentionable), "position": position,
+        }
+    (object_id, channel_type, category_id, position, slowmode, bitrate, user_limit, nsfw) = CHANNEL_STRUCT.unpack_from(payload)
+    name, offset = _unpack_str(payload, CHANNEL_STRUCT.size)
+    topic, offset = _unpack_str(payload, offset)
+    (count,) = struct.unpack_from("<H", payload, offset)
+    offset += 2
+    overwrites = []
+    for _ in range(count):
+        target_id, target_type, allow, deny = OVERWRITE_STRUCT.unpack_from(payload, offset)
+        overwrites.append((target_id, target_type, allow, deny))
+        offset += OVERWRITE_STRUCT.size
+    return {
+        "id": object_id, "type": channel_type, "category_id": category_id or None, "position": position,
+        "slowmode_delay": slowmode, "bitrate": bitrate, "user_limit": user_limit, "nsfw": bool(nsfw),
+        "name": name, "topic": topic or None, "overwrites": overwrites,
+    }
+
+
+def capture(guild):
+    """Текущие роли и каналы сервера: {(вид, id): (хеш, запись)}"""
+    objects = {}
+    role_ids = {role.id for role in guild.roles}
+    for role in guild.roles:
+        if role.managed or role.is_default():
+            continue
+        payload = encode_role(role)
+        objects[(ROLE, role.id)] = (content_hash(ROLE, payload), payload)
+    for channel in guild.channels:
+        payload = encode_channel(channel, role_ids)
+        objects[(CHANNEL, channel.id)] = (content_hash(CHANNEL, payload), payload)
+    return objects
+
+
+class GuildHistory:
+    """Журнал снимков одного сервера и его индекс в памяти"""
+
+    def __init__(self, path):
+        self.path = path
+        # Последняя версия: {(вид, id): хеш}
+        self.current = {}
+        # Последняя известная запись каждого объекта, включая удаленные
+        self.last_known = {}
+        # Когда объект пропал из снимков (для сжатия журнала)
+        self.removed_at = {}
+        # Хеш -> смещение данных записи в файле
+        self.offsets = {}
+        # Объекты, удаленные после последнего снимка: {(вид, id): запись}
+        self.deleted = {}
+        self.versions = 0
+        self.size = 0
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, "rb") as file:
+            data = file.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            record_type, length, digest = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            if start + length > len(data):
+                # Недописанная запись после сбоя — отбрасываем хвост
+                break
+            if record_type == RECORD_OBJECT:
+                self.offsets[digest] = (start, length)
+            elif record_type == RECORD_MANIFEST:
+                self._apply_manifest(data[start:start + length])
+            offset = start + length
+        if offset < len(data):
+            # Следующие записи дописываются сразу за последней целой
+            with open(self.path, "r+b") as file:
+                file.truncate(offset)
+        self.size = offset
+
+    def _apply_manifest(self, payload):
+        version, timestamp, changed, removed = MANIFEST_STRUCT.unpack_from(payload)
+        offset = MANIFEST_STRUCT.size
+        if version == 0:
+            # Полный манифест после сжатия журнала
+            self.current = {}
+        for _ in range(changed):
+            kind, object_id, digest = ENTRY_STRUCT.unpack_from(payload, offset)
+            offset += ENTRY_STRUCT.size
+            self.current[(kind, object_id)] = digest
+            self.last_known[(kind, object_id)] = digest
+            self.removed_at.pop((kind, object_id), None)
+        for _ in range(removed):
+            kind, object_id = REMOVED_STRUCT.unpack_from(payload, offset)
+            offset += REMOVED_STRUCT.size
+            self.current.pop((kind, object_id), None)
+            self.removed_at[(kind, object_id)] = timestamp
+        self.versions = max(self.versions, version) + 1
+
+    def diff(self, objects):
+        """Новые записи и манифест отличий от последней версии"""
+        changed = [(key, digest) for key, (digest, _) in objects.items() if self.current.get(key) != digest]
+        removed = [key for key in self.current if key not in objects]
+        if not changed and not removed:
+            return None
+        chunks = []
+        written = set()
+        for key, digest in changed:
+            if digest not in self.offsets and digest not in written:
+                payload = objects[key][1]
+                chunks.append(RECORD_HEADER.pack(RECORD_OBJECT, len(payload), digest) + payload)
+                written.add(digest)
+        manifest = MANIFEST_STRUCT.pack(self.versions, time.time(), len(changed), len(removed))
+        manifest += b"".join(ENTRY_STRUCT.pack(kind, object_id, digest) for (kind, object_id), digest in changed)
+        manifest += b"".join(REMOVED_STRUCT.pack(kind, object_id) for kind, object_id in removed)
+        chunks.append(RECORD_HEADER.pack(RECORD_MANIFEST, len(manifest), bytes(16)) + manifest)
+        return b"".join(chunks)
+
+    def append(self, data):
+        """Дописывание записей в журнал и обновление индекса"""
+        with open(self.path, "ab") as file:
+            file.write(data)
+        base = self.size
+        self.size += len(data)
+        offset = 0
+        while offset < len(data):
+            record_type, length, digest = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            if record_type == RECORD_OBJECT:
+                self.offsets[digest] = (base + start, length)
+            else:
+                self._apply_manifest(data[start:start + length])
+            offset = start + length
+
+    def records(self, keys):
+        """Последние известные записи объектов [(вид, id)] за одно чтение файла
+
+        Возвращает {(вид, id): запись}; объектов, которых не было ни в
+        одном снимке, в результате нет.
+        """
+        found, wanted = {}, {}
+        for key in keys:
+            if key in self.deleted:
+                found[key] = decode(key[0], self.deleted[key])
+                continue
+            digest = self.last_known.get(key)
+            if digest is not None and digest in self.offsets:
+                wanted[key] = self.offsets[digest]
+        if not wanted:
+            return found
+        with open(self.path, "rb") as file:
+            data = file.read()
+        for (kind, object_id), (start, length) in wanted.items():
+            found[(kind, object_id)] = decode(kind, data[start:start + length])
+        return found
+
+    def remember(self, kind, object_id, payload):
+        """Запись объекта в момент удаления (свежее последнего снимка)"""
+        if len(self.deleted) >= 1000:
+            self.deleted.pop(next(iter(self.deleted)))
+        self.deleted[(kind, object_id)] = payload
+
+    def forget(self, keys):
+        """Удаление записей объектов, учтенных при удалении (после восстановления)"""
+        for key in keys:
+            self.deleted.pop(key, None)
+
+    def role_ids(self):
+        return {object_id for kind, object_id in self.last_known if kind == ROLE}
+
+    def compact(self, keep_removed):
+        """Перезапись журнала: текущая версия и недавно удаленные объекты
+
+        Возвращает новый индекс, прочитанный из сжатого журнала, без
+        объектов из deleted; подменяет индекс вызывающий (SnapshotStore.swap).
+        """
+        threshold = time.time() - keep_removed
+        keep = dict(self.current)
+        for key, removed_at in self.removed_at.items():
+            if removed_at >= threshold and key in self.last_known:
+                keep[key] = self.last_known[key]
+        with open(self.path, "rb") as file:
+            data = file.read()
+        chunks = []
+        for digest in set(keep.values()):
+            start, length = self.offsets[digest]
+            chunks.append(RECORD_HEADER.pack(RECORD_OBJECT, length, digest) + data[start:start + length])
+        # Полный манифест (версия 0) — текущее состояние; удаленные объекты
+        # остаются в журнале записями, на которые ссылается второй манифест
+        removed = [key for key in keep if key not in self.current]
+        full = MANIFEST_STRUCT.pack(0, time.time(), len(keep), 0)
+        full += b"".join(ENTRY_STRUCT.pack(kind, object_id, digest) for (kind, object_id), digest in keep.items())
+        chunks.append(RECORD_HEADER.pack(RECORD_MANIFEST, len(full), bytes(16)) + full)
+        if removed:
+            tail = MANIFEST_STRUCT.pack(1, min(self.removed_at[key] for key in removed), 0, len(removed))
+            tail += b"".join(REMOVED_STRUCT.pack(kind, object_id) for kind, object_id in removed)
+            chunks.append(RECORD_HEADER.pack(RECORD_MANIFEST, len(tail), bytes(16)) + tail)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(b"".join(chunks))
+        os.replace(temporary, self.path)
+        return GuildHistory(self.path)
+
+
+class SnapshotStore:
+    """Снимки серверов в каталоге directory (один журнал на сервер)
+
+    max_versions — число версий в журнале, после которого он сжимается;
+    удаленные объекты хранятся keep_removed секунд.
+    """
+
+    def __init__(self, directory="snapshots", max_versions=100, keep_removed=7 * 86400):
+        self.directory = directory
+        self.max_versions = max_versions
+        self.keep_removed = keep_removed
+        self.histories = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, guild_id):
+        return os.path.join(self.directory, f"{guild_id}.snap")
+
+    def history(self, guild_id):
+        """Индекс журнала сервера; журнал читается с диска при первом обращении"""
+        history = self.histories.get(guild_id)
+        if history is None:
+            history = self.histories[guild_id] = GuildHistory(self.path(guild_id))
+        return history
+
+    async def load(self, guild_id):
+        """То же, что history(), но журнал читается в потоке, а не в цикле событий"""
+        history = self.histories.get(guild_id)
+        if history is None:
+            loop = asyncio.get_running_loop()
+            loaded = await loop.run_in_executor(None, GuildHistory, self.path(guild_id))
+            history = self.histories.setdefault(guild_id, loaded)
+        return history
+
+    def snapshot(self, guild):
+        """Снимок сервера; возвращает число записанных байт (0 — без изменений)"""
+        history = self.history(guild.id)
+        data = history.diff(capture(guild))
+        if data is None:
+            return 0
+        self.swap(guild.id, history, self.write(history, data))
+        return len(data)
+
+    def write(self, history, data):
+        """Дописывание версии в журнал и сжатие при переполнении
+
+        Возвращает индекс сжатого журнала или None; индекс сервера
+        подменяется в цикле событий через swap().
+        """
+        history.append(data)
+        if history.versions > self.max_versions:
+            return history.compact(self.keep_removed)
+        return None
+
+    def swap(self, guild_id, history, compacted):
+        """Замена индекса сервера индексом сжатого журнала"""
+        if compacted is None:
+            return
+        # Удаления, учтенные во время сжатия, переносятся в новый индекс
+        compacted.deleted = history.deleted
+        self.histories[guild_id] = compacted
+
+    def records(self, guild_id, keys):
+        return self.history(guild_id).records(keys)
+
+    def forget(self, guild_id, keys):
+        """Сброс записей, учтенных при удалении объектов keys (после восстановления)"""
+        history = self.histories.get(guild_id)
+        if history is not None:
+            history.forget(keys)
+
+    async def remember_role(self, guild, role):
+        """Учет удаленной роли по объекту из кэша (событие удаления)"""
+        if not (role.managed or role.is_default()):
+            history = await self.load(guild.id)
+            history.remember(ROLE, role.id, encode_role(role))
+
+    async def remember_channel(self, guild, channel):
+        """Учет удаленного канала по объекту из кэша (событие удаления)
+
+        Роли, удаленные раньше канала, уже не в кэше сервера — их ID
+        берутся из журнала снимков.
+        """
+        history = await self.load(guild.id)
+        role_ids = {role.id for role in guild.roles} | history.role_ids()
+        history.remember(CHANNEL, channel.id, encode_channel(channel, role_ids))
+
+
+class SnapshotTask:
+    """Периодические снимки защищенных серверов
+
+    guilds() возвращает серверы процесса, is_protected(guild_id) —
+    корутина проверки включенной защиты. Чтение и запись журналов идут
+    в потоке, чтобы не задерживать цикл событий на диске.
+    """
+
+    def __init__(self, store, guilds, is_protected, interval=600):
+        self.store = store
+        self.guilds = guilds
+        self.is_protected = is_protected
+        self.interval = interval
+        self.last_run_seconds = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run_once(self):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        written = 0
+        for guild in list(self.guilds()):
+            if not await self.is_protected(guild.id):
+                continue
+            history = await self.store.load(guild.id)
+            data = history.diff(capture(guild))
+            if data is not None:
+                compacted = await loop.run_in_executor(None, self.store.write, history, data)
+                self.store.swap(guild.id, history, compacted)
+                written += len(data)
+        self.last_run_seconds = time.perf_counter() - started
+        return written
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("Ошибка создания снимков серверов: %s", e)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import json
+import time
+import logging
+from metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+# Быстрый запуск: дерево команд синхронизируется с Discord только при
+# изменении (хэш хранится в базе), а загрузка счетчиков и прогрев кэша
+# идут в фоне параллельно с подключением к шлюзу. События, пришедшие
+# раньше, ждут в очереди конвейера. Время этапов — от запуска процесса.
+
+STARTUP_PHASE_SECONDS = Gauge(
+    "antiraid_startup_phase_seconds", "Время от запуска процесса до завершения этапа", ["phase"]
+)
+
+COMMAND_TREE_KEY = "command_tree_hash"
+
+
+def command_tree_hash(tree):
+    """Хэш объявленных команд в том виде, в каком они уходят в Discord"""
+    payload = [command.to_dict(tree) for command in tree.get_commands()]
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+async def sync_commands(tree, db, force=False):
+    """Синхронизация дерева команд, если оно изменилось с прошлой синхронизации
+
+    Хэш хранится отдельно для каждого приложения. Возвращает число
+    синхронизированных команд или None, если синхронизация не нужна.
+    """
+    digest = command_tree_hash(tree)
+    key = f"{COMMAND_TREE_KEY}:{tree.client.application_id}"
+    if not force and await db.get_meta(key) == digest:
+        return None
+    synced = await tree.sync()
+    await db.set_meta(key, digest)
+    return len(synced)
+
+
+class Startup:
+    """Этапы запуска и фоновая подготовка
+
+    mark(phase) отмечает завершение этапа (один раз); run(coro) запускает
+    подготовку в фоне, wait_ready() ждет ее завершения — ошибки подготовки
+    только записываются в журнал, чтобы не останавливать обработку событий.
+    run(coro, gate=False) — фоновая задача, которую события не ждут.
+    """
+
+    def __init__(self, started=None):
+        self.started = time.monotonic() if started is None else started
+        self.phases = {}
+        self._task = None
+        self._tasks = set()
+
+    def mark(self, phase):
+        if phase in self.phases:
+            return
+        seconds = time.monotonic() - self.started
+        self.phases[phase] = seconds
+        STARTUP_PHASE_SECONDS.labels(phase).set(seconds)
+        logger.info("Этап запуска %s: %.3f с", phase, seconds, extra={"phase": phase, "seconds": round(seconds, 3)})
+
+    def run(self, coro, phase="prepared", gate=True):
+        """Фоновая подготовка; по завершении отмечается этап phase"""
+        task = asyncio.create_task(self._run(coro, phase))
+        if gate:
+            self._task = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, coro, phase):
+        try:
+            await coro
+        except Exception as e:
+            logger.exception("Ошибка подготовки при запуске: %s", e)
+        self.mark(phase)
+
+    @property
+    def ready(self):
+        return self._task is None or self._task.done()
+
+    async def wait_ready(self):
+        if not self.ready:
+            await asyncio.shield(self._task)
+
+    def summary(self):
+        """Этапы по порядку завершения: {этап: секунды от запуска}"""
+        return {phase: round(seconds, 3) for phase, seconds in sorted(self.phases.items(), key=lambda item: item[1])}
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from array import array
+from actions import ACTION_CODES
+from counters import TimelineStore
+from policy import HORIZON
+
+# Хранилища истории действий для конвейера. timeline() возвращает отметки
+# времени и коды семейств пользователя по возрастанию времени за последние
+# HORIZON секунд — их разбирает политика (policy.py). Настройки серверов всегда
+# берутся из общей базы SQLite: события и команды сервера обрабатывает
+# только процесс с его шардом, поэтому кэш настроек остается локальным.
+
+
+EMPTY_TIMELINE = ((), ())
+
+
+class MemoryStateBackend:
+    """История действий в памяти процесса (режим одного процесса)
+
+    При запуске история читается из журнала событий (journal.py), если он
+    охватывает весь горизонт, иначе — из user_actions в базе.
+    """
+
+    def __init__(self, store=None, journal=None):
+        self.store = store or TimelineStore()
+        self.journal = journal
+
+    async def load(self, db):
+        """Восстановление истории при запуске"""
+        since = time.time() - self.store.horizon
+        if self.journal is not None and self.journal.covers(since):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._load_journal, since)
+        rows = await db.get_recent_actions(self.store.horizon / 3600)
+        return self.store.load_actions(rows)
+
+    def _load_journal(self, since):
+        return self.store.load_records(self.journal.scan(since))
+
+    async def record_many(self, guild_id, actions):
+        """Учет пачки действий (user_id, action_type, timestamp)"""
+        for user_id, action_type, ts in actions:
+            self.store.record(guild_id, user_id, action_type, ts=ts)
+
+    async def timeline(self, guild_id, user_id, now):
+        timeline = self.store.timeline(guild_id, user_id, now)
+        if timeline is None:
+            return EMPTY_TIMELINE
+        return timeline.timestamps, timeline.codes
+
+
+class SQLiteStateBackend:
+    """История по журналу user_actions в общей базе (WAL)
+
+    Подходит для нескольких процессов на одном хосте: после записи пачки
+    очередь сбрасывается на диск, и история читается по индексу
+    idx_user_actions_lookup, видимому всем процессам.
+    """
+
+    def __init__(self, db, horizon=HORIZON):
+        self.db = db
+        self.horizon = horizon
+
+    async def load(self, db):
+        return 0
+
+    async def record_many(self, guild_id, actions):
+        # Сами действия записывает конвейер, здесь только дожидаемся записи
+        await self.db.flush_actions()
+
+    async def timeline(self, guild_id, user_id, now):
+        rows = await self.db.get_user_actions(guild_id, user_id, now - self.horizon)
+        timestamps = array("d")
+        codes = array("b")
+        for ts, action_type in rows:
+            code = ACTION_CODES.get(action_type)
+            if code is not None:
+                timestamps.append(ts)
+                codes.append(code)
+        return timestamps, codes
+
+
+class RedisStateBackend:
+    """История в Redis (отсортированные множества), общая для нескольких хостов
+
+    Одно множество на (сервер, пользователь): элемент — «код:время:номер»,
+    вес — время действия. client — асинхронный клиент с методами zadd,
+    zremrangebyscore, zrangebyscore и expire (redis.asyncio.Redis или LocalRedis).
+    """
+
+    def __init__(self, client, horizon=HORIZON, prefix="antiraid"):
+        self.client = client
+        self.horizon = horizon
+        self.prefix = prefix
+        self._sequence = 0
+
+    def _key(self, guild_id, user_id):
+        return f"{self.prefix}:timeline:{guild_id}:{user_id}"
+
+    async def load(self, db):
+        return 0
+
+    async def record_many(self, guild_id, actions):
+        for user_id, action_type, ts in actions:
+            key = self._key(guild_id, user_id)
+            self._sequence += 1
+            await self.client.zadd(key, {f"{ACTION_CODES[action_type]}:{ts}:{self._sequence}": ts})
+            await self.client.expire(key, self.horizon)
+
+    async def timeline(self, guild_id, user_id, now):
+        key = self._key(guild_id, user_id)
+        await self.client.zremrangebyscore(key, "-inf", now - self.horizon)
+        timestamps = array("d")
+        codes = array("b")
+        for member, ts in await self.client.zrangebyscore(key, "-inf", "+inf", withscores=True):
+            if isinstance(member, bytes):
+                member = member.decode()
+            timestamps.append(ts)
+            codes.append(int(member.split(":", 1)[0]))
+        return timestamps, codes
+
+
+class LocalRedis:
+    """Redis-совместимая заглушка в памяти для тестов и локального запуска"""
+
+    def __init__(self):
+        self.sets = {}
+        self.expires = {}
+
+    def _expire_key(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.sets.pop(key, None)
+            self.expires.pop(key, None)
+
+    async def zadd(self, key, mapping):
+        self._expire_key(key)
+        zset = self.sets.setdefault(key, {})
+        added = sum(1 for member in mapping if member not in zset)
+        zset.update(mapping)
+        return added
+
+    async def zremrangebyscore(self, key, minimum, maximum):
+        self._expire_key(key)
+        zset = self.sets.get(key, {})
+        low = float(minimum)
+        high = float(maximum)
+        removed = [member for member, score in zset.items() if low <= score <= high]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    async def zrangebyscore(self, key, minimum, maximum, withscores=False):
+        self._expire_key(key)
+        low = float(minimum)
+        high = float(maximum)
+        items = sorted(
+            ((member, score) for member, score in self.sets.get(key, {}).items() if low <= score <= high),
+            key=lambda item: item[1],
+        )
+        return items if withscores else [member for member, _ in items]
+
+    async def expire(self, key, seconds):
+        if key not in self.sets:
+            return False
+        self.expires[key] = time.time() + seconds
+        return True
+
+
+def create_state_backend(name, db, redis_url=None, journal=None):
+    """Создание хранилища счетчиков по имени: memory, sqlite или redis
+
+    journal — журнал событий для восстановления истории в памяти (или None)
+    """
+    if name == "memory":
+        return MemoryStateBackend(journal=journal)
+    if name == "sqlite":
+        return SQLiteStateBackend(db)
+    if name == "redis":
+        # LocalRedis не общий для процессов — только для тестов и бенчмарков
+        if not redis_url:
+            raise ValueError("Для хранилища redis укажите адрес сервера (BOT_REDIS_URL)")
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("Для хранилища redis установите пакет redis: pip install redis")
+        return RedisStateBackend(redis.from_url(redis_url))
+    raise ValueError(f"Неизвестное хранилище состояния: {name}")